@@ -0,0 +1,222 @@
+"""
+A single-process, asyncio based engine for the desktop daemon.
+
+Does the same job as :py:func:`muro.muro.main`,
+but runs the receiver, the change detection and the seek timers in one event loop,
+instead of spawning an OS process for every handler.
+"""
+
+import asyncio
+import time
+
+from muro.backlight import BrightnessUpdater
+from muro.common import settings, unetwork
+from muro.flightlog import DEFAULT_MAX_SIZE, FlightRecorder
+from muro.muro import Router, Seeker
+from muro.player import get_player
+from muro.stats import stats
+from muro.util import Logger, rss_kib
+
+log = Logger()
+
+
+class Daemon:
+    def __init__(self, *, player=None, volume=None, brightness=None, recorder=None):
+        if volume is None:
+            # pulsectl loads libpulse on import.
+            from muro.volume import VolumeUpdater
+
+            volume = VolumeUpdater()
+
+        self.player = player if player is not None else get_player()
+        self.volume = volume
+        self.brightness = brightness if brightness is not None else BrightnessUpdater()
+
+        # (remote address, button) -> asyncio.Event, while the button is held.
+        self._released = {}
+        # (remote address, button) -> when the release frame was received.
+        self._released_at = {}
+
+        self.router = Router(on_forget=self.forget)
+        self.recorder = recorder
+
+        self.frame_count = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+    def on_frame(self, data: bytes, address, t_recv: float):
+        """Act on a frame. Returns the reply to send back to the remote, if any."""
+        stats.count("frames")
+        if self.recorder is not None:
+            self.recorder.append(data, address)
+
+        reply, changes = self.router.on_frame(data, address, t_recv)
+        stats.record("frame.unpack", t_recv)
+        if not changes:
+            return reply
+
+        for key, value in changes:
+            log.debug(address, key, value)
+            self.dispatch(key, value, t_recv, address)
+        stats.record("frame.update", t_recv)
+
+        latency = time.monotonic() - t_recv
+        self.frame_count += 1
+        self.latency_sum += latency
+        self.latency_max = max(self.latency_max, latency)
+        return reply
+
+    def dispatch(self, key, value, t_recv: float = None, address=None):
+        if key == "volume":
+            stats.record("volume.dispatch", t_recv)
+            self.volume.set(value, t_recv)
+        elif key == "brightness":
+            stats.record("brightness.dispatch", t_recv)
+            self.brightness.set(value, t_recv)
+        elif key == "pause":
+            stats.record("play-pause.dispatch", t_recv)
+            self.player.play_pause()
+            stats.record("play-pause.done", t_recv)
+        elif value:
+            stats.record(f"{key}.dispatch", t_recv)
+            # a press while held means the release got lost, end the last one.
+            held = self._released.get((address, key))
+            if held is not None:
+                held.set()
+            released = self._released[address, key] = asyncio.Event()
+            asyncio.ensure_future(self.seek_btn(key, key, released, address))
+        else:
+            released = self._released.pop((address, key), None)
+            if released is not None:
+                self._released_at[address, key] = t_recv
+                released.set()
+
+    def forget(self, address):
+        """Release the buttons held on a remote that's been forgotten."""
+        for held_address, key in list(self._released):
+            if held_address == address:
+                self._released.pop((address, key)).set()
+
+    async def seek_btn(self, key, cmd, released: asyncio.Event, address=None):
+        log.debug(f"{key} btn pressed")
+
+        try:
+            await asyncio.wait_for(released.wait(), settings.Buttons.seek_timeout)
+            getattr(self.player, cmd)()
+            stats.record(f"{cmd}.done", self._released_at.pop((address, key), None))
+        except asyncio.TimeoutError:
+            log.info("seek forward...")
+
+            # reading it takes D-Bus calls (or a playerctl process), off the loop.
+            start = time.monotonic()
+            track = await asyncio.get_running_loop().run_in_executor(
+                None, self.player.track
+            )
+            seeker = Seeker(self.player, cmd, start, track)
+            while not released.is_set() and not seeker.timed_out:
+                try:
+                    await asyncio.wait_for(released.wait(), 1 / settings.Seek.tick_rate)
+                except asyncio.TimeoutError:
+                    seeker.update()
+            if released.is_set():
+                # back to where it was when the button was released.
+                seeker.update(self._released_at.pop((address, key), None))
+            else:
+                log.info(f"{key} btn held for too long, stopped seeking")
+                if self._released.get((address, key)) is released:
+                    del self._released[address, key]
+
+        log.debug(f"{key} btn released")
+
+    async def report(self):
+        while True:
+            await asyncio.sleep(settings.Stats.report_interval)
+
+            if self.frame_count:
+                mean_ms = self.latency_sum / self.frame_count * 1000
+                latency = f"mean {mean_ms:.3f} ms, max {self.latency_max * 1000:.3f} ms"
+            else:
+                latency = "n/a"
+            log.info(
+                f"[asyncio] rss: {rss_kib()} KiB, processes: 1, "
+                f"remotes: {len(self.router.remotes)}, "
+                f"frames: {self.frame_count}, latency: {latency}, "
+                f"lost: {stats.counters.get('lost frames', 0)}, "
+                f"reordered: {stats.counters.get('reordered frames', 0)}"
+            )
+
+            self.frame_count, self.latency_sum, self.latency_max = 0, 0.0, 0.0
+
+
+class DaemonProtocol(asyncio.DatagramProtocol):
+    def __init__(self, daemon: Daemon, namespace: str = unetwork.DEFAULT_NAMESPACE):
+        self.daemon = daemon
+        self.namespace_bytes = namespace.encode("utf-8")
+        self.namespace_size = len(self.namespace_bytes)
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        t_recv = time.monotonic()
+        if not data.startswith(self.namespace_bytes):
+            return
+        frame = data[self.namespace_size :]
+
+        try:
+            reply = self.daemon.on_frame(frame, addr, t_recv)
+        except Exception as e:
+            log.err(repr(e))
+            return
+
+        if reply is not None:
+            self.transport.sendto(self.namespace_bytes + reply, addr)
+
+
+async def serve(daemon: Daemon = None, port: int = None):
+    stats.serve()
+    if daemon is None:
+        daemon = Daemon()
+    if port is None:
+        port = settings.udp_port
+
+    loop = asyncio.get_event_loop()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: DaemonProtocol(daemon), local_addr=(unetwork.LOCAL_HOST, port)
+    )
+    log.info(f"Listening on UDP port {port}...")
+    try:
+        await daemon.report()
+    finally:
+        transport.close()
+
+
+def main(
+    *,
+    make_player=get_player,
+    make_volume=None,
+    make_brightness=BrightnessUpdater,
+    record: str = None,
+    record_size: int = DEFAULT_MAX_SIZE,
+):
+    """
+    Run the daemon, with everything in one event loop.
+
+    The ``make_*`` arguments are factories for the backends.
+
+    :param record: (Optional) Path of a flight log to record the received frames to.
+    :param record_size: (Optional) Max size of the flight log, in bytes.
+    """
+
+    async def _main():
+        volume = make_volume() if make_volume is not None else None
+        daemon = Daemon(
+            player=make_player(),
+            volume=volume,
+            brightness=make_brightness(),
+            recorder=FlightRecorder(record, record_size) if record else None,
+        )
+        await serve(daemon)
+
+    asyncio.run(_main())
@@ -0,0 +1,138 @@
+"""
+Backlight (brightness) backends.
+
+The default backend writes straight to ``/sys/class/backlight/*/brightness``,
+through file descriptors that stay open for the lifetime of the process.
+
+"xbacklight" is kept around as a fallback,
+for setups where the sysfs files aren't writable by the current user.
+"""
+
+import os
+from pathlib import Path
+from typing import Union
+
+from muro.common import settings
+from muro.stats import stats
+from muro.util import Coalescer, Logger
+
+log = Logger("backlight")
+
+SYSFS_ROOT = "/sys/class/backlight"
+
+
+class XbacklightBacklight:
+    """Spawns an ``xbacklight`` process for every change."""
+
+    def set(self, value: Union[float, int]):
+        cmd = ["xbacklight", "-set", str(value)]
+        log.cmd_info(cmd)
+        # only imported by the fallback, since it's slow to import.
+        import subprocess
+
+        subprocess.run(cmd)
+
+    def close(self):
+        pass
+
+
+class SysfsBacklight:
+    """
+    Writes the brightness of every device under ``root``,
+    scaled to the device's own ``max_brightness``.
+
+    :param root: (Optional) The sysfs backlight class directory.
+        Point this at a fake directory tree for testing.
+    """
+
+    def __init__(self, root: Union[str, Path] = SYSFS_ROOT):
+        self.root = Path(root)
+        self.devices = []  # list of (fd, max_brightness)
+
+        try:
+            for device_dir in sorted(self.root.iterdir()):
+                max_brightness = int((device_dir / "max_brightness").read_text())
+                fd = os.open(device_dir / "brightness", os.O_WRONLY)
+                self.devices.append((fd, max_brightness))
+        except OSError:
+            self.close()
+            raise
+
+        if not self.devices:
+            raise FileNotFoundError(f"No backlight devices found in {str(self.root)!r}")
+
+    def set(self, value: Union[float, int]):
+        """Set brightness to ``value`` %."""
+        value = min(max(value, 0), 100)
+
+        for fd, max_brightness in self.devices:
+            data = str(round(value * max_brightness / 100)).encode()
+            os.pwrite(fd, data, 0)
+            try:
+                # sysfs ignores this, but regular files (fake trees) need it.
+                os.ftruncate(fd, len(data))
+            except OSError:
+                pass
+
+    def close(self):
+        for fd, _ in self.devices:
+            os.close(fd)
+        self.devices.clear()
+
+
+def get_backlight(backend: str = None, *, root: Union[str, Path] = None):
+    """
+    Create a backlight for the given backend (defaults to ``settings.Backlight.backend``).
+
+    Falls back to "xbacklight" if the sysfs files can't be opened.
+    """
+
+    if backend is None:
+        backend = settings.Backlight.backend
+    if root is None:
+        root = settings.Backlight.sysfs_root
+
+    if backend == "sysfs":
+        try:
+            return SysfsBacklight(root)
+        except OSError as e:
+            log.err(
+                f"Couldn't open sysfs backlight ({e!r}), falling back to xbacklight."
+            )
+            return XbacklightBacklight()
+    elif backend == "xbacklight":
+        return XbacklightBacklight()
+    else:
+        raise ValueError(
+            f'"backend" must be one of "sysfs" or "xbacklight", not {repr(backend)}'
+        )
+
+
+class BrightnessUpdater:
+    """
+    Applies brightness changes on a background thread.
+
+    Only the newest value is written, at most ``settings.Backlight.max_rate`` times a second.
+    Stale intermediate values are dropped.
+    """
+
+    def __init__(self, backlight=None):
+        if backlight is None:
+            backlight = get_backlight()
+        self.backlight = backlight
+        self._coalescer = Coalescer(
+            self._apply, 1 / settings.Backlight.max_rate, name="brightness"
+        )
+
+    def _apply(self, item):
+        value, t_recv = item
+        self.backlight.set(value)
+        stats.record("brightness.done", t_recv)
+        log.info(f"Set brightness: {value}%")
+
+    def set(self, value: Union[float, int], t_recv: float = None):
+        """
+        :param t_recv: (Optional) When the frame carrying this value was received,
+            for latency stats.
+        """
+        self._coalescer.put((value, t_recv))
@@ -0,0 +1,880 @@
+"""
+End-to-end benchmarks of the desktop daemon.
+
+The daemon runs in a subprocess, with fake backends standing in for the media player,
+PulseAudio & the backlight. Each of them logs a timestamp for every action it performs.
+
+Synthetic frames are then sent to it over loopback UDP, following scripted scenarios,
+so it all runs headless, without any audio or display hardware.
+"""
+
+import os
+import random
+import select
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Dict, List
+
+from muro.common import protocol, reliable, settings, unetwork
+from muro.micropython import dialmap
+from muro.micropython.dialmap import DialFilter, DialMap
+from muro.player import Track
+from muro.stats import merge, query_all
+from muro.util import Coalescer, tree_pids
+
+CLK_TCK = os.sysconf("SC_CLK_TCK")
+
+
+class ActionLog:
+    """Appends ``<action> <value> <monotonic time>`` lines to a file, from any process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT)
+
+    def write(self, action, value=None):
+        os.write(self._fd, f"{action} {value} {time.monotonic()}\n".encode())
+
+    @staticmethod
+    def read(path) -> List[tuple]:
+        entries = []
+        with open(path) as f:
+            for line in f:
+                action, value, t = line.split()
+                entries.append((action, value, float(t)))
+        return entries
+
+
+class FakePlayer:
+    """Plays a track of :py:attr:`LENGTH` sec, from :py:attr:`START` sec in."""
+
+    LENGTH = 600.0
+    START = 60.0
+
+    def __init__(self, log: ActionLog):
+        self.log = log
+        self._position = self.START
+        self._position_at = time.monotonic()
+
+    def play_pause(self):
+        self.log.write("play-pause")
+
+    def next(self):
+        self.log.write("next")
+
+    def previous(self):
+        self.log.write("previous")
+
+    def seek(self, offset: float):
+        self.log.write("seek", f"{offset:.2f}")
+        self.set_position(None, self.track().position + offset, log=False)
+
+    def track(self) -> Track:
+        now = time.monotonic()
+        position = min(self._position + now - self._position_at, self.LENGTH)
+        return Track(position, self.LENGTH)
+
+    def set_position(self, track: Track, position: float, *, log: bool = True):
+        if log:
+            self.log.write("seek", f"{position:.2f}")
+        self._position = min(max(position, 0.0), self.LENGTH)
+        self._position_at = time.monotonic()
+
+    def close(self):
+        pass
+
+
+class FakeUpdater:
+    """
+    Stands in for ``VolumeUpdater`` / ``BrightnessUpdater``, coalescing the same way.
+
+    :param delay: (Optional) Time in sec every change takes to apply,
+        like a slow PulseAudio would.
+    """
+
+    def __init__(self, log: ActionLog, name: str, max_rate: float, delay: float = 0.0):
+        self.log = log
+        self.name = name
+        self.delay = delay
+        self._coalescer = Coalescer(self._apply, 1 / max_rate, name=name)
+
+    def _apply(self, item):
+        value, _ = item
+        if self.delay:
+            time.sleep(self.delay)
+        self.log.write(self.name, value)
+
+    def set(self, value, t_recv: float = None):
+        self._coalescer.put((value, t_recv))
+
+
+def serve_daemon(engine: str, port: int, log_path: str, delay: float = 0.0):
+    """
+    Run the daemon with fake backends. This is the entry point of the subprocess.
+
+    :param delay: (Optional) Time in sec the volume & brightness take to apply.
+    """
+
+    settings.udp_port = port
+    log = ActionLog(log_path)
+
+    if engine == "asyncio":
+        from muro.aio import main
+    else:
+        from muro.muro import main
+
+    main(
+        make_player=lambda: FakePlayer(log),
+        make_volume=lambda: FakeUpdater(log, "volume", settings.Volume.max_rate, delay),
+        make_brightness=lambda: FakeUpdater(
+            log, "brightness", settings.Backlight.max_rate, delay
+        ),
+    )
+
+
+class ProcessSampler:
+    """Samples the process tree of the daemon, to count processes and CPU time."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.pids_seen = set()
+        self._cpu = {}  # pid -> last seen cpu ticks
+        self._stop = threading.Event()
+
+    def _sample(self):
+        for pid in tree_pids(self.pid):
+            self.pids_seen.add(pid)
+            try:
+                with open(f"/proc/{pid}/stat") as f:
+                    fields = f.read().rsplit(")", 1)[1].split()
+            except OSError:
+                continue
+            # utime, stime, cutime, cstime
+            self._cpu[pid] = sum(map(int, fields[11:15]))
+
+    def cpu_time(self) -> float:
+        return sum(self._cpu.values()) / CLK_TCK
+
+    def __enter__(self):
+        self._sample()
+        self.pids_seen.clear()
+        self._cpu_start = self.cpu_time()
+
+        def run():
+            while not self._stop.wait(self.interval):
+                self._sample()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        self.cpu = self.cpu_time() - self._cpu_start
+
+
+class Driver:
+    """
+    Sends synthetic frames to the daemon, remembering when each one was sent.
+
+    Like the board, it sends the dials as plain state frames,
+    and button presses & releases as events, retransmitting them from a background
+    thread until acked.
+
+    :param loss_rate: (Optional) Fraction of the frames & acks to drop,
+        inside :py:meth:`lossy`.
+    """
+
+    DIALS = ("volume", "brightness")
+    BUTTONS = ("pause", "next", "previous")
+
+    def __init__(self, port: int, loss_rate: float = 0.0):
+        self.port = port
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        self.namespace_bytes = unetwork.DEFAULT_NAMESPACE.encode("utf-8")
+
+        self.loss_rate = loss_rate
+        self.loss = 0.0
+
+        self.seq = 0
+        self.sent = 0
+        self.dropped = 0
+        self.state = dict.fromkeys(self.DIALS + self.BUTTONS, 0)
+
+        self._lock = threading.Lock()
+        self.sender = reliable.Sender(self._send_lossy)
+        self._poller = None
+
+    def _transmit(self, frame: bytes):
+        self.sock.sendto(self.namespace_bytes + frame, ("127.0.0.1", self.port))
+        self.sent += 1
+
+    def _send_lossy(self, frame: bytes):
+        if random.random() < self.loss:
+            self.dropped += 1
+        else:
+            self._transmit(frame)
+
+    def _poll_forever(self):
+        namespace_size = len(self.namespace_bytes)
+        while True:
+            select.select([self.sock], [], [], 0.002)
+            with self._lock:
+                while True:
+                    try:
+                        data = self.sock.recv(64)
+                    except BlockingIOError:
+                        break
+                    try:
+                        kind, seq, _ = protocol.check_header(data[namespace_size:])
+                    except ValueError:
+                        continue
+                    if kind == protocol.KIND_ACK and random.random() >= self.loss:
+                        self.sender.on_ack(seq)
+                self.sender.poll()
+
+    @contextmanager
+    def lossy(self):
+        """Drop frames & acks at random, at ``loss_rate``."""
+        self.loss = self.loss_rate
+        try:
+            yield
+        finally:
+            self.loss = 0.0
+
+    def settle(self, timeout: float = 5.0):
+        """Wait for every button frame to be acked."""
+        deadline = time.monotonic() + timeout
+        while self.sender.in_flight and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def send(self, **changes) -> float:
+        edges = [
+            (self.BUTTONS.index(key), value)
+            for key, value in changes.items()
+            if key in self.BUTTONS and value != self.state[key]
+        ]
+        self.state.update(changes)
+        t_send = time.monotonic()
+
+        with self._lock:
+            if any(key in self.DIALS for key in changes):
+                self.seq += 1
+                self._transmit(
+                    protocol.pack_state(
+                        protocol.VERSION,
+                        protocol.KIND_STATE,
+                        self.seq,
+                        int(t_send * 1000) & protocol.SEQ_MASK,
+                        *(self.state[key] for key in self.DIALS),
+                    )
+                )
+            if edges and self._poller is None:
+                self._poller = threading.Thread(target=self._poll_forever, daemon=True)
+                self._poller.start()
+            for button, pressed in edges:
+                self.sender.send(
+                    protocol.KIND_BUTTON_EVENT,
+                    protocol.pack_button_event_body(button, pressed),
+                )
+
+        return t_send
+
+
+def pace(rate: float, count: int):
+    """Yield ``count`` times, ``rate`` times a second, without drifting."""
+    start = time.monotonic()
+    for i in range(count):
+        delay = start + i / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield i
+
+
+#
+# Scenarios.
+# Each one returns the send times to match against the action log,
+# as a dict of action -> list of (value, send time).
+#
+
+
+def dial_sweep(driver: Driver, duration: float = 3.0, rate: float = 500.0):
+    """Turn both dials continuously. Every frame carries a unique volume & brightness."""
+    sends = {"volume": [], "brightness": []}
+    for _ in pace(rate, int(duration * rate)):
+        value = driver.seq + 1
+        t_send = driver.send(volume=value, brightness=value)
+        sends["volume"].append((str(value), t_send))
+        sends["brightness"].append((str(value), t_send))
+    return sends
+
+
+def seek_hold(driver: Driver, hold: float = 2.0):
+    """Hold the "next" button long enough to seek, then release it."""
+    t_press = driver.send(next=1)
+    time.sleep(hold)
+    t_release = driver.send(next=0)
+    time.sleep(0.5)
+    return {
+        # the first seek is due a tick after the seek timeout.
+        "seek": [
+            (
+                None,
+                t_press + settings.Buttons.seek_timeout + 1 / settings.Seek.tick_rate,
+            )
+        ],
+        "release": [(None, t_release)],
+    }
+
+
+def many_remotes(
+    driver: Driver, remotes: int = 32, duration: float = 3.0, rate: float = 100.0
+):
+    """
+    Turn the volume dial of many remotes at once, each from its own address.
+
+    Every frame carries a unique volume.
+    """
+    drivers = [driver] + [Driver(driver.port) for _ in range(remotes - 1)]
+    sends = {"volume": []}
+    for i in pace(rate, int(duration * rate)):
+        for n, remote in enumerate(drivers):
+            value = (n + 1) * 1_000_000 + i
+            sends["volume"].append((str(value), remote.send(volume=value)))
+    driver.sent += sum(remote.sent for remote in drivers[1:])
+    return sends
+
+
+def rapid_play_pause(driver: Driver, count: int = 50, rate: float = 20.0):
+    """Flip the play/pause switch back & forth."""
+    sends = {"play-pause": []}
+    for i in pace(rate, count):
+        sends["play-pause"].append((None, driver.send(pause=1 - driver.state["pause"])))
+    driver.settle()
+    return sends
+
+
+def lossy_play_pause(driver: Driver, count: int = 200, rate: float = 20.0):
+    """
+    Flip the play/pause switch back & forth, over a lossy link.
+
+    Every flip must still get through, within :py:data:`LOSS_LATENCY_BUDGET`.
+    """
+    with driver.lossy():
+        return rapid_play_pause(driver, count, rate)
+
+
+SCENARIOS = {
+    "dial-sweep": dial_sweep,
+    "seek-hold": seek_hold,
+    "rapid-play-pause": rapid_play_pause,
+    "lossy-play-pause": lossy_play_pause,
+    "many-remotes": many_remotes,
+}
+
+# p99 latency that button presses must stay within, over a lossy link.
+LOSS_LATENCY_BUDGET = 0.2
+
+
+def slow_backend_budget(delay: float) -> float:
+    """
+    p99 latency that the dials must stay within,
+    when the backends take ``delay`` sec to apply every change.
+
+    Only the latest value is waiting at any time, so that's the change being applied,
+    the pause between changes, and then the latest one, plus some slack.
+    """
+    max_rate = min(settings.Volume.max_rate, settings.Backlight.max_rate)
+    return 2 * delay + 1 / max_rate + 0.05
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+
+    result = {
+        f"p{p}": samples[min(int(len(samples) * p / 100), len(samples) - 1)]
+        for p in (50, 95, 99)
+    }
+    result["max"] = samples[-1]
+    return result
+
+
+def match_latencies(sends: dict, actions: List[tuple]) -> Dict[str, List[float]]:
+    latencies = {}
+
+    for action, sent in sends.items():
+        if action == "release":
+            continue
+
+        done = [(value, t) for a, value, t in actions if a == action]
+        if sent and sent[0][0] is None:
+            if action == "seek":
+                done = done[:1]
+            # match in order.
+            latencies[action] = [t - t_send for (_, t_send), (_, t) in zip(sent, done)]
+        else:
+            # match by value. (only the ones that weren't coalesced away)
+            t_sends = dict(sent)
+            latencies[action] = [
+                t - t_sends[value] for value, t in done if value in t_sends
+            ]
+
+    if "release" in sends:
+        t_release = sends["release"][0][1]
+        seeks_after = [
+            t - t_release for a, _, t in actions if a == "seek" and t > t_release
+        ]
+        latencies["seek-overshoot"] = seeks_after or [0.0]
+
+    return latencies
+
+
+def run_benchmark(
+    engine: str,
+    scenarios: List[str],
+    port: int = None,
+    loss: float = 0.2,
+    delay: float = 0.0,
+) -> dict:
+    """
+    :param loss: (Optional) Fraction of the frames & acks to drop,
+        in the ``lossy-*`` scenarios.
+    :param delay: (Optional) Time in sec the fake volume & brightness backends take
+        to apply a change.
+    """
+    if port is None:
+        port = settings.udp_port
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="muro-bench-"))
+    log_path = tmp_dir / "actions.log"
+    log_path.touch()
+
+    env = dict(os.environ, XDG_RUNTIME_DIR=str(tmp_dir))
+    daemon = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            f"from muro.bench import serve_daemon; "
+            f"serve_daemon({engine!r}, {port!r}, {str(log_path)!r}, {delay!r})",
+        ],
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+
+    def counters():
+        return merge(query_all(tmp_dir / "muro"))[0]
+
+    def count_updates(counters, outcome):
+        return sum(n for name, n in counters.items() if name.endswith(f" {outcome}"))
+
+    results = {}
+    try:
+        driver = Driver(port, loss)
+
+        # wait for the daemon to come up.
+        deadline = time.monotonic() + 30
+        while not any(a == "volume" for a, _, _ in ActionLog.read(log_path)):
+            if time.monotonic() > deadline or daemon.poll() is not None:
+                raise RuntimeError(f"The {engine!r} daemon didn't come up.")
+            driver.send(volume=driver.seq + 1)
+            time.sleep(0.1)
+        time.sleep(0.5)
+
+        for name in scenarios:
+            scenario = SCENARIOS[name]
+            offset = len(ActionLog.read(log_path))
+            sent_before = driver.sent
+            dropped_before = driver.dropped
+            retransmits_before = driver.sender.retransmits
+            counters_before = counters()
+
+            with ProcessSampler(daemon.pid) as sampler:
+                start = time.monotonic()
+                sends = scenario(driver)
+                time.sleep(0.2)  # let the stragglers through.
+                elapsed = time.monotonic() - start
+
+            actions = ActionLog.read(log_path)[offset:]
+            counters_after = counters()
+            results[name] = {
+                "frames": driver.sent - sent_before,
+                "dropped": driver.dropped - dropped_before,
+                "retransmits": driver.sender.retransmits - retransmits_before,
+                "expected_actions": sum(
+                    len(sent) for action, sent in sends.items() if action != "release"
+                ),
+                "frame_rate": (
+                    counters_after.get("frames", 0) - counters_before.get("frames", 0)
+                )
+                / elapsed,
+                "delay": delay,
+                "updates": {
+                    outcome: count_updates(counters_after, outcome)
+                    - count_updates(counters_before, outcome)
+                    for outcome in ("applied", "dropped")
+                },
+                "actions": len(actions),
+                "cpu": sampler.cpu,
+                "processes": len(sampler.pids_seen),
+                "latency": {
+                    action: percentiles(samples)
+                    for action, samples in match_latencies(sends, actions).items()
+                },
+            }
+    finally:
+        for pid in reversed(tree_pids(daemon.pid)):
+            try:
+                os.kill(pid, 9)
+            except OSError:
+                pass
+        daemon.wait()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    return results
+
+
+#
+# Startup.
+# `muro run` is started at every login, so it should be up (& listening) quickly.
+#
+
+# `muro run` must be listening within this long (in sec) of being started.
+STARTUP_BUDGET = 1.0
+# The modules `muro run` imports, by engine.
+ENGINE_MODULES = {"zproc": "muro.muro", "asyncio": "muro.aio"}
+
+
+def import_times(module: str) -> Dict[str, float]:
+    """
+    The time (in sec) it takes to import a module in a fresh interpreter,
+    and each of its direct imports, by ``python -X importtime``.
+    """
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        check=True,
+        encoding="utf-8",
+    ).stderr
+
+    # Lines are "import time: <self> | <cumulative> | <indent by depth><name>",
+    # printed once a module is done importing, so after the ones it imports.
+    times = {}
+    for line in stderr.splitlines():
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # the header.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+
+        if depth == 1:
+            times[name] = int(cumulative) / 1e6
+        elif depth == 0:
+            if name == module:
+                times[name] = int(cumulative) / 1e6
+                break
+            # imported at startup, before `module`.
+            times.clear()
+    return times
+
+
+def time_to_listen(engine: str, port: int = None, timeout: float = 30) -> float:
+    """
+    The time (in sec) from starting the daemon, to it listening for frames.
+
+    Like `muro run`, the CLI is imported first.
+    The backends are faked, as in :py:func:`run_benchmark`.
+    """
+    if port is None:
+        port = settings.udp_port
+
+    tmp_dir = Path(tempfile.mkdtemp(prefix="muro-bench-"))
+    env = dict(os.environ, XDG_RUNTIME_DIR=str(tmp_dir), PYTHONUNBUFFERED="1")
+    start = time.monotonic()
+    daemon = subprocess.Popen(
+        [
+            sys.executable,
+            "-c",
+            f"import muro.cli; from muro.bench import serve_daemon; "
+            f"serve_daemon({engine!r}, {port!r}, {str(tmp_dir / 'actions.log')!r})",
+        ],
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + timeout
+        while time.monotonic() < deadline:
+            if not select.select([daemon.stdout], [], [], 0.1)[0]:
+                continue
+            line = daemon.stdout.readline()
+            if not line:
+                raise RuntimeError(f"The {engine!r} daemon exited on startup.")
+            if b"Listening on UDP port" in line:
+                return time.monotonic() - start
+        raise RuntimeError(f"The {engine!r} daemon didn't come up.")
+    finally:
+        for pid in reversed(tree_pids(daemon.pid)):
+            try:
+                os.kill(pid, 9)
+            except OSError:
+                pass
+        daemon.wait()
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def bench_startup(
+    engines: List[str], runs: int = 5, budget: float = STARTUP_BUDGET
+) -> bool:
+    """Print the import & startup times of `muro run`, returns whether they're in budget."""
+    ok = True
+    for module in ["muro.cli"] + [ENGINE_MODULES[engine] for engine in engines]:
+        times = import_times(module)
+        total = times.pop(module)
+        slowest = sorted(times.items(), key=lambda item: -item[1])[:5]
+        print(
+            f"import {module}: {total * 1000:.1f} ms "
+            f"({', '.join(f'{name} {t * 1000:.1f}' for name, t in slowest)})"
+        )
+    print()
+
+    for engine in engines:
+        try:
+            startup = min(time_to_listen(engine) for _ in range(runs))
+        except RuntimeError as e:
+            print(f"{engine}: {e}")
+            ok = False
+            continue
+        in_budget = startup <= budget
+        ok = ok and in_budget
+        print(
+            f"{engine}: listening {startup * 1000:.0f} ms after start "
+            f"(best of {runs}), budget {budget * 1000:.0f} ms: "
+            + ("OK" if in_budget else "FAILED")
+        )
+    return ok
+
+
+#
+# Dial filtering.
+# Runs raw readings of a dial through the board's mapping, offline,
+# to count the frames it would send with & without filtering.
+#
+
+# The raw reading of a dial turned all the way, at 3.3 V and a gain of 1.
+FULL_SCALE = 26400
+
+
+def noise_traces(
+    seconds: float = 10.0,
+    rate: float = 32.0,
+    sigma: float = 40.0,
+    spikes: float = 0.01,
+    seed: int = 0,
+) -> Dict[str, List[int]]:
+    """
+    Synthetic raw readings of a dial, ``rate`` a second, with gaussian noise & spikes.
+
+    :param spikes: (Optional) Fraction of the readings that are way off.
+    """
+    rng = random.Random(seed)
+    count = int(seconds * rate)
+
+    parked = [FULL_SCALE * 0.3] * count
+    turning = [FULL_SCALE * i / count for i in range(count)]
+    return {
+        "parked": add_noise(parked, rng, sigma, spikes),
+        "turning": add_noise(turning, rng, sigma, spikes),
+        "turning (noise-free)": [int(value) for value in turning],
+    }
+
+
+def add_noise(
+    values: List[float], rng: random.Random, sigma: float = 40.0, spikes: float = 0.01
+) -> List[int]:
+    """Raw readings of ``values``, with gaussian noise & spikes. (see :py:func:`noise_traces`)"""
+    readings = []
+    for value in values:
+        if rng.random() < spikes:
+            value += rng.choice((-20, 20)) * sigma
+        readings.append(int(value + rng.gauss(0, sigma)))
+    return readings
+
+
+def read_trace(path) -> List[int]:
+    """Read a trace of raw readings, one per line."""
+    with open(path) as f:
+        return [int(line) for line in f if line.strip()]
+
+
+def make_dial_filter() -> DialFilter:
+    """A :py:class:`DialFilter`, set up as the board's. (see :py:class:`settings.Dials`)"""
+    return DialFilter(
+        settings.Dials.oversample,
+        settings.Dials.median,
+        settings.Dials.ema_shift,
+        settings.Dials.hysteresis,
+    )
+
+
+def dial_frames(trace: List[int], dial_filter: DialFilter = None) -> List[int]:
+    """The volumes the board would send for a trace of the volume dial, one per frame."""
+    # calibrated, as if the dial was turned all the way both ways.
+    dial = DialMap(
+        settings.Dials.volume_range, settings.Dials.deadzone, limits=(0, FULL_SCALE)
+    )
+
+    frames, old_value = [], None
+    for reading in trace:
+        if dial_filter is not None:
+            reading = dial_filter(reading)
+        value = dial[reading]
+        if value != old_value:
+            frames.append(value)
+            old_value = value
+    return frames
+
+
+def count_frames(trace: List[int], dial_filter: DialFilter = None) -> int:
+    """How many frames the board would send for a trace of the volume dial."""
+    return len(dial_frames(trace, dial_filter))
+
+
+def bench_dials(traces: Dict[str, List[int]]):
+    print(f"{'trace':<24}{'readings':>10}{'unfiltered':>12}{'filtered':>10}")
+    for name, trace in traces.items():
+        dial_filter = make_dial_filter()
+        print(
+            f"{name:<24}{len(trace):>10}{count_frames(trace):>12}"
+            f"{count_frames(trace, dial_filter):>10}"
+        )
+
+
+def reference_mapping(output_items, deadzone=0) -> dict:
+    """The dict of every dial point to its output, that :py:class:`DialMap` used to keep."""
+    count = len(output_items)
+    stop = count * 2 if count > 50 else 100
+    return dict(
+        dialmap._gen_dial_points(
+            dialmap._gen_dial_zones(0, stop, count, deadzone), output_items
+        )
+    )
+
+
+def check_dial_maps() -> int:
+    """
+    Check that :py:class:`DialMap` maps every dial point the same as the reference dict,
+    over a range of sizes & deadzones. Returns the number of combinations checked.
+    """
+    checked = 0
+    for count in [*range(2, 120), 166, 250, 500, 1000]:
+        output_items = range(count)
+        for deadzone in (0, 1, 10, 25, 33, 50, 75, 99, 100, 150):
+            expected = reference_mapping(output_items, deadzone)
+            dial = DialMap(output_items, deadzone)
+            for dial_point in range(-2, dial._nm.stop + 3):
+                i = dial._find_zone(dial_point)
+                actual = output_items[i] if i >= 0 else None
+                if actual != expected.get(dial_point):
+                    raise AssertionError(
+                        f"DialMap(range({count}), {deadzone}) maps {dial_point} "
+                        f"to {actual}, not {expected.get(dial_point)}"
+                    )
+            checked += 1
+    return checked
+
+
+def allocated(fn) -> int:
+    """Bytes allocated by ``fn()``, that are still in use."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = fn()
+        size = tracemalloc.get_traced_memory()[0] - before
+        del kept
+        return size
+    finally:
+        tracemalloc.stop()
+
+
+def bench_dial_maps():
+    print(f"{check_dial_maps()} dial maps checked against the reference mapping.")
+    print(f"{'range':<24}{'dict bytes':>12}{'tables bytes':>14}")
+    for name in ("volume_range", "brightness_range"):
+        output_items = getattr(settings.Dials, name)
+        reference = allocated(
+            lambda: reference_mapping(output_items, settings.Dials.deadzone)
+        )
+        tables = allocated(lambda: DialMap(output_items, settings.Dials.deadzone))
+        print(f"{name:<24}{reference:>12}{tables:>14}")
+
+
+def print_results(engine: str, results: dict) -> bool:
+    """Print the results of :py:func:`run_benchmark`, returns whether they're in budget."""
+    all_ok = True
+    print(f"engine: {engine}")
+    for name, result in results.items():
+        print(
+            f"  {name}: {result['frames']} frames sent, "
+            f"{result['frame_rate']:.0f}/s received, "
+            f"{result['actions']} actions, cpu {result['cpu']:.2f} s, "
+            f"{result['processes']} processes"
+        )
+        if result["dropped"]:
+            print(
+                f"    dropped {result['dropped']} frames, "
+                f"{result['retransmits']} retransmits"
+            )
+        for action, latency in result["latency"].items():
+            print(
+                f"    {action:<16}"
+                + "".join(f"{k} {v * 1000:>8.3f} ms  " for k, v in latency.items())
+            )
+        updates = result["updates"]
+        if updates["applied"] or updates["dropped"]:
+            print(
+                f"    updates applied {updates['applied']}, "
+                f"dropped {updates['dropped']} (stale)"
+            )
+        dials = [
+            latency["p99"]
+            for action, latency in result["latency"].items()
+            if action in Driver.DIALS and latency
+        ]
+        if result["delay"] and dials:
+            budget = slow_backend_budget(result["delay"])
+            ok = max(dials) <= budget
+            all_ok = all_ok and ok
+            print(
+                f"    backends take {result['delay'] * 1000:.0f} ms, "
+                f"p99 {max(dials) * 1000:.3f} ms, "
+                f"budget {budget * 1000:.0f} ms: " + ("OK" if ok else "FAILED")
+            )
+        if name.startswith("lossy-"):
+            p99 = max(latency["p99"] for latency in result["latency"].values())
+            ok = (
+                result["actions"] == result["expected_actions"]
+                and p99 <= LOSS_LATENCY_BUDGET
+            )
+            all_ok = all_ok and ok
+            print(
+                f"    {result['actions']}/{result['expected_actions']} delivered, "
+                f"p99 {p99 * 1000:.3f} ms, "
+                f"budget {LOSS_LATENCY_BUDGET * 1000:.0f} ms: "
+                + ("OK" if ok else "FAILED")
+            )
+    print()
+    return all_ok
@@ -1,23 +1,43 @@
 """A bunch of command-line utils to help you do the chores."""
 
-import shutil
-import subprocess
-import tempfile
+import os
+import sys
+import time
 from pathlib import Path
-from jinja2 import Template
 
 import click
-import mpy_cross
-import hashlib
-from typing import List
+from typing import List, Tuple
 
-COMPILE_DIR = Path.cwd() / ".compiled"
+# Only the modules needed by every command are imported up front,
+# so that `muro run` (at every login) starts fast. The rest are imported by the commands.
+
+# Compiled files, by the hash of their source & the mpy-cross version.
+CACHE_DIR = (
+    Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "muro" / "mpy"
+)
 AUTO_START_PATH = Path.home() / ".config" / "autostart" / "muro.desktop"
 THIS_DIR = Path(__file__).parent
 MPY_DIR = THIS_DIR / "micropython"
 CLI_WORKER_TEMPLATE = THIS_DIR / "cli_worker.py"
 COMMON_DIR = THIS_DIR / "common"
-PROJECT_FILES = [*MPY_DIR.rglob("*.py"), *COMMON_DIR.rglob("*.py")]
+# Written by the board itself, so they're kept across installs.
+BOARD_DATA_FILES = {"muro_host", "muro_calibration"}
+# The installed files, with their size & hash, one per line.
+MANIFEST_FILE = "muro_manifest"
+
+MAIN_PY = b"""\
+try:
+    # finish swapping in the files of an interrupted `muro deploy`.
+    from muro.micropython.ota import apply_journal
+
+    apply_journal()
+except ImportError:
+    pass
+
+from muro.micropython.muro import main
+
+main()
+"""
 
 AUTO_START_FILE = f"""\
 #!/usr/bin/env xdg-open
@@ -25,98 +45,453 @@ AUTO_START_FILE = f"""\
 Type=Application
 Name=muro
 Description=My short description for my project.
-Exec={subprocess.check_output(["which", "python"], encoding="utf-8").strip()} -m muro.cli run\
+Exec={sys.executable} -m muro.cli run\
 """
 
 
-def clean_compiled():
-    shutil.rmtree(COMPILE_DIR, ignore_errors=True)
+# Files are sent zlib compressed with this window size (as log2),
+# so that inflating them doesn't take more RAM than the board has.
+ZLIB_WBITS = 10
 
+# Defined on the board at the start of a session, to keep the code sent per chunk small.
+BOARD_HELPERS = """\
+import uos
+from ubinascii import a2b_base64
 
-clean_compiled()
+try:
+    from deflate import DeflateIO, ZLIB
 
+    def _inflater(f):
+        return DeflateIO(f, ZLIB, %(wbits)d)
 
-def run_ampy_cmd(port: str, cmd: list) -> str:
-    return subprocess.check_output(
-        ["/usr/bin/env", "ampy", "-p", port] + cmd, encoding="utf-8"
-    )
+except ImportError:
+    try:
+        from uzlib import DecompIO
 
+        def _inflater(f):
+            return DecompIO(f, %(wbits)d)
 
-def run_code_on_board(port: str, code_as_str: str) -> str:
-    with tempfile.NamedTemporaryFile(mode="w") as fp:
-        fp.write(code_as_str)
-        fp.flush()
-        return run_ampy_cmd(port, ["run", fp.name])
+    except ImportError:
+        _inflater = None
 
+_f = None
 
-def save_code_on_board(port: str, code_as_str: str, file_name_on_board: str) -> str:
-    with tempfile.NamedTemporaryFile(mode="w") as fp:
-        fp.write(code_as_str)
-        fp.flush()
-        return run_ampy_cmd(port, ["put", fp.name, file_name_on_board])
 
+def _open(path):
+    global _f
+    _f = open(path, "wb")
 
-def cross_compile(input_path: Path) -> Path:
-    output_path = COMPILE_DIR / (".".join(input_path.name.split(".")[:-1]) + ".mpy")
-    mpy_cross_process = mpy_cross.run(input_path, "-o", output_path)
 
-    if mpy_cross_process.wait() == 0:
-        return output_path
-    else:
-        exit("Something bad happened!")
+def _w(data):
+    _f.write(a2b_base64(data))
+
+
+def _close(tmp, path, compressed):
+    _f.close()
+    if compressed:
+        # into a temp file too, so that "path" is only ever replaced whole.
+        inflated = path + ".tmp"
+        with open(tmp, "rb") as src, open(inflated, "wb") as dst:
+            src = _inflater(src)
+            while True:
+                buf = src.read(256)
+                if not buf:
+                    break
+                dst.write(buf)
+        uos.remove(tmp)
+        tmp = inflated
+    uos.rename(tmp, path)
+
+
+print(_inflater is not None)
+""" % {"wbits": ZLIB_WBITS}
+
+
+class BoardError(Exception):
+    """The board didn't answer as expected, or the code run on it failed."""
+
+
+class RawRepl:
+    """
+    A single raw REPL session with a MicroPython board, over its serial port.
+
+    The port is opened, and the raw REPL entered, only once.
+    Code is sent with the raw-paste protocol (which has flow control) if the board
+    supports it, or in small, paced writes otherwise.
+
+    :param port: The serial port of the board.
+    :param chunk_size: (Optional) Max bytes of files to send per round trip.
+    :param compress: (Optional) Send files zlib compressed, to be inflated on the board.
+        (if it has ``deflate`` or ``uzlib``)
+    :param timeout: (Optional) Time in sec to wait for the board to answer.
+    """
+
+    # Without flow control, the UART buffer of the board can only take this much at once.
+    WRITE_SIZE = 256
+    WRITE_DELAY = 0.01
+
+    def __init__(
+        self,
+        port: str,
+        *,
+        chunk_size: int = 4096,
+        compress: bool = True,
+        timeout: float = 10,
+    ):
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self._raw_paste = True
+
+        import serial
+
+        self.serial = serial.Serial(port, baudrate=115200, timeout=timeout)
+        try:
+            self._enter()
+            self.can_inflate = self.exec(BOARD_HELPERS).strip() == "True"
+        except BaseException:
+            self.serial.close()
+            raise
+        self.compress = compress and self.can_inflate
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.serial.close()
+
+    def _read_until(self, ending: bytes, timeout: float = None) -> bytes:
+        self.serial.timeout = self.timeout if timeout is None else timeout
+        data = self.serial.read_until(ending)
+        if not data.endswith(ending):
+            raise BoardError(
+                f"Timed out waiting for {ending!r} from the board, got {data[-64:]!r}"
+            )
+        return data[: -len(ending)]
+
+    def _enter(self):
+        # interrupt whatever is running (i.e. muro), and get to a clean raw REPL.
+        self.serial.write(b"\r\x03\x03")
+        time.sleep(0.1)
+        self.serial.reset_input_buffer()
+        self.serial.write(b"\r\x01")
+        self._read_until(b"raw REPL; CTRL-B to exit\r\n>")
+        # soft reset, to free the memory of the interrupted program.
+        self.serial.write(b"\x04")
+        self._read_until(b"soft reboot\r\n")
+        self._read_until(b"raw REPL; CTRL-B to exit\r\n>")
+
+    def _write_code(self, code: bytes):
+        if self._raw_paste:
+            self.serial.write(b"\x05A\x01")
+            answer = self.serial.read(2)
+            if answer == b"R\x01":
+                self._write_raw_paste(code)
+                return
+            if answer != b"R\x00":
+                # an older board, that took it for code. Its prompt is repeated.
+                self._read_until(b"w REPL; CTRL-B to exit\r\n>")
+            self._raw_paste = False
+
+        for start in range(0, len(code), self.WRITE_SIZE):
+            self.serial.write(code[start : start + self.WRITE_SIZE])
+            time.sleep(self.WRITE_DELAY)
+        self.serial.write(b"\x04")
+        answer = self.serial.read(2)
+        if answer != b"OK":
+            raise BoardError(f"The board didn't take the code, got {answer!r}")
+
+    def _write_raw_paste(self, code: bytes):
+        increment = int.from_bytes(self.serial.read(2), "little")
+        window = increment
+
+        start = 0
+        while start < len(code):
+            while window == 0 or self.serial.in_waiting:
+                answer = self.serial.read(1)
+                if answer == b"\x01":
+                    window += increment
+                elif answer == b"\x04":
+                    # the board wants to end the transfer (e.g. a syntax error).
+                    self.serial.write(b"\x04")
+                    return
+                else:
+                    raise BoardError(f"Unexpected flow control byte: {answer!r}")
+
+            end = min(start + window, len(code))
+            self.serial.write(code[start:end])
+            window -= end - start
+            start = end
+
+        self.serial.write(b"\x04")
+        self._read_until(b"\x04")
+
+    def exec(self, code: str, timeout: float = None) -> str:
+        """
+        Run some code on the board, and return what it printed.
+
+        :param timeout: (Optional) Time in sec the code may take to run.
+        """
+        self._write_code(code.encode("utf-8"))
+        out = self._read_until(b"\x04", timeout)
+        err = self._read_until(b"\x04")
+        self._read_until(b">")
+        if err:
+            raise BoardError(err.decode("utf-8", "replace"))
+        return out.decode("utf-8", "replace")
+
+    def put(self, files: List[Tuple[str, bytes]]):
+        """
+        Write files on the board, batching as much of them in every round trip as fits.
+
+        Every file is written (& inflated) to a temp file first,
+        and moved in place once complete.
+
+        :param files: The ``(path on board, contents)`` of each file.
+        """
+        import base64
+        import zlib
+
+        statements = []
+        for path, data in files:
+            compressed = False
+            if self.compress:
+                compressor = zlib.compressobj(9, zlib.DEFLATED, ZLIB_WBITS)
+                packed = compressor.compress(data) + compressor.flush()
+                if len(packed) < len(data):
+                    data, compressed = packed, True
+
+            # compressed, it's inflated into the ".tmp" on the board.
+            tmp = path + (".z" if compressed else ".tmp")
+            statements.append(f"_open({tmp!r})")
+            for start in range(0, len(data), self.chunk_size):
+                chunk = base64.b64encode(data[start : start + self.chunk_size])
+                statements.append(f"_w({chunk.decode()!r})")
+            statements.append(f"_close({tmp!r}, {path!r}, {compressed})")
+
+        # ~4/3 for base64.
+        batch_size = self.chunk_size * 4 // 3 + 256
+        batch = []
+        for statement in statements:
+            if batch and sum(map(len, batch)) + len(statement) > batch_size:
+                self.exec("\n".join(batch))
+                batch = []
+            batch.append(statement)
+        if batch:
+            self.exec("\n".join(batch))
+
+    def hard_reset(self):
+        """Reset the board, which ends the session."""
+        self._write_code(b"import machine\nmachine.reset()")
+        self.close()
+
+
+def mpy_cross_version() -> str:
+    import subprocess
+
+    import mpy_cross
+
+    return subprocess.check_output(
+        [mpy_cross.mpy_cross, "--version"], encoding="utf-8"
+    ).strip()
 
 
 class File:
-    def __init__(self, file_path: Path):
-        self.path = file_path
-        self.path_compiled = cross_compile(file_path)
+    """
+    A project file, compiled with mpy-cross.
 
-        with open(self.path_compiled, "rb") as fp:
-            self.hash = hashlib.sha1(fp.read()).digest()
+    The compiled file lives in :py:data:`CACHE_DIR`, under a key made of its source,
+    its path on the board & the mpy-cross version, along with the hash of its contents.
+    So a file only ever gets compiled once.
+    """
+
+    def __init__(self, file_path: Path, compiler_version: str):
+        self.path = file_path
 
         self.path_on_board = str(
-            file_path.relative_to(THIS_DIR.parent).with_suffix(
-                self.path_compiled.suffix
-            )
+            file_path.relative_to(THIS_DIR.parent).with_suffix(".mpy")
         )
         self.dir_path_on_board = str(file_path.parent.relative_to(THIS_DIR.parent))
+        # the source name embedded in the compiled file, for tracebacks.
+        self.source_on_board = str(file_path.relative_to(THIS_DIR.parent))
+
+        import hashlib
+
+        key = hashlib.sha1(
+            f"{compiler_version}\0{self.source_on_board}\0".encode()
+            + file_path.read_bytes()
+        ).hexdigest()
+        self.path_compiled = CACHE_DIR / f"{key}.mpy"
+        self._path_hash = CACHE_DIR / f"{key}.sha1"
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._path_hash.exists()
+
+    @property
+    def hash(self) -> str:
+        return self._path_hash.read_text()
+
+    @property
+    def size(self) -> int:
+        return self.path_compiled.stat().st_size
+
+    def compile(self):
+        import mpy_cross
+
+        # write to temp files & move them in place, so that an interrupted compile
+        # (or a concurrent install) can't leave a broken file in the cache.
+        tmp_path = CACHE_DIR / f"{self.path_compiled.name}.{os.getpid()}.tmp"
+        result = mpy_cross.run(
+            "-s", self.source_on_board, "-o", tmp_path, self.path
+        ).wait()
+        if result != 0:
+            exit(f"Failed to compile {repr(str(self.path))}!")
+
+        import hashlib
+
+        tmp_hash_path = CACHE_DIR / f"{self._path_hash.name}.{os.getpid()}.tmp"
+        tmp_hash_path.write_text(hashlib.sha1(tmp_path.read_bytes()).hexdigest())
+
+        os.replace(tmp_path, self.path_compiled)
+        os.replace(tmp_hash_path, self._path_hash)
 
     def __repr__(self):
         return f"<File path: {self.path}>"
 
 
+def find_project_files() -> List[Path]:
+    return [*MPY_DIR.rglob("*.py"), *COMMON_DIR.rglob("*.py")]
+
+
+def compile_project(file_paths: List[Path]) -> List[File]:
+    """Compile the files that aren't in the cache already, in parallel."""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    compiler_version = mpy_cross_version()
+    files = [File(file_path, compiler_version) for file_path in file_paths]
+
+    to_compile = [file for file in files if not file.is_compiled]
+    if to_compile:
+        from concurrent.futures import ThreadPoolExecutor
+
+        print(f"Compiling {len(to_compile)} file(s)...")
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            # list() to re-raise any errors.
+            list(executor.map(File.compile, to_compile))
+
+    return files
+
+
 def create_mpy_code(project_files: List[File]) -> str:
+    from jinja2 import Template
+
     with open(CLI_WORKER_TEMPLATE, "r") as fp:
         return Template(fp.read()).render(
             required_dirs={file.dir_path_on_board for file in project_files},
-            required_files={file.path_on_board for file in project_files},
+            required_files={file.path_on_board for file in project_files}
+            | BOARD_DATA_FILES,
             files_to_check_for_change_with_hash=[
-                (file.path_on_board, file.hash) for file in project_files
+                (file.path_on_board, file.hash, file.size) for file in project_files
             ],
+            manifest_file=MANIFEST_FILE,
         )
 
 
+def create_manifest(project_files: List[File]) -> bytes:
+    return "".join(
+        f"{file.path_on_board} {file.size} {file.hash}\n" for file in project_files
+    ).encode()
+
+
 @click.group()
 def cli():
     pass
 
 
+def expand_ports(ports: List[str]) -> List[str]:
+    """Expand the globs among serial ports. (e.g. "/dev/ttyUSB*")"""
+    import glob
+
+    expanded = []
+    for port in ports:
+        if glob.has_magic(port):
+            matches = sorted(glob.glob(port))
+            if not matches:
+                exit(f"No serial ports match {repr(port)}!")
+        else:
+            matches = [port]
+        expanded += [match for match in matches if match not in expanded]
+    return expanded
+
+
+def install_board(
+    port: str,
+    project_files: List[File],
+    mpy_code: str,
+    force: bool,
+    compress: bool,
+    log=print,
+) -> int:
+    """Install the (compiled) project on the board at ``port``, return the files sent."""
+    log(f"Preparing board @ {repr(port)}...")
+    with RawRepl(port, compress=compress) as board:
+        code_output = board.exec(mpy_code)
+        code_output = map(int, code_output.strip().split())
+
+        to_put = []
+        for file, did_change in zip(project_files, code_output):
+            if did_change or force:
+                log(f"Transferring {repr(str(file.path))}...")
+                to_put.append((file.path_on_board, file.path_compiled.read_bytes()))
+        sent = len(to_put)
+
+        log("Configuring 'main.py'...")
+        to_put.append(("main.py", MAIN_PY))
+        # last, so that it only lists the files once they're all in place.
+        to_put.append((MANIFEST_FILE, create_manifest(project_files)))
+        board.put(to_put)
+
+        log("Performing a hard-reset...")
+        board.hard_reset()
+
+    return sent
+
+
 @click.command(short_help="Install muro")
 @click.option(
-    "--port", default="/dev/ttyUSB0", help="USB serial port for connected board"
+    "--port",
+    default=["/dev/ttyUSB0"],
+    multiple=True,
+    show_default=True,
+    help="USB serial port for connected board, or a glob (e.g. '/dev/ttyUSB*'). "
+    "Can be given more than once.",
 )
 @click.option(
     "--force", is_flag=True, help="Transfer files whether they have changed or not."
 )
-def install(port, force):
+@click.option(
+    "--compress/--no-compress",
+    default=True,
+    show_default=True,
+    help="Send the files compressed, if the board can inflate them.",
+)
+def install(port, force, compress):
     """
     Puts the required code for muro to function
-    on the MicroPython chip, using "ampy".
+    on the MicroPython chip, over its serial port.
 
     By default, it uses /dev/ttyUSB0 as the port.
+    With several ports (or a glob), all the boards are installed at once.
 
     It also uses the `mpy-cross` utility to cross compile the files,
     which helps when the files are big.
+    Compiled files are cached (in ~/.cache/muro), so only changed files get compiled.
+
+    Everything is done in a single raw REPL session per board,
+    and the files are sent compressed, in as few round trips as possible.
 
     It also configures the application to be run at boot,
     using the `muro run` command.
@@ -129,30 +504,44 @@ def install(port, force):
         (except "boot.py")
     """
 
-    try:
-        COMPILE_DIR.mkdir()
-
-        project_files = [File(file_path) for file_path in PROJECT_FILES]
-        mpy_code = create_mpy_code(project_files)
-
-        print(f"Preparing board @ {repr(port)}...")
-        code_output = run_code_on_board(port, mpy_code)
-        code_output = map(int, code_output.strip().split())
-
-        for file, did_change in zip(project_files, code_output):
-            if int(did_change) or force:
-                print(f"Transferring {repr(str(file.path))}...")
-                run_ampy_cmd(port, ["put", file.path_compiled, file.path_on_board])
-    finally:
-        clean_compiled()
-
-    print("Configuring 'main.py'...")
-    save_code_on_board(
-        port, "from muro.micropython.muro import main\nmain()", "main.py"
-    )
+    ports = expand_ports(port)
+    project_files = compile_project(find_project_files())
+    mpy_code = create_mpy_code(project_files)
 
-    print("Performing a hard-reset...")
-    run_ampy_cmd(port, ["reset", "--hard"])
+    if len(ports) == 1:
+        install_board(ports[0], project_files, mpy_code, force, compress)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        def run(port):
+            start = time.monotonic()
+            try:
+                sent = install_board(
+                    port,
+                    project_files,
+                    mpy_code,
+                    force,
+                    compress,
+                    log=lambda msg: print(f"[{port}] {msg}"),
+                )
+            except (BoardError, OSError) as e:
+                return None, time.monotonic() - start, e
+            return sent, time.monotonic() - start, None
+
+        print(f"Installing on {len(ports)} boards...")
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            results = list(executor.map(run, ports))
+
+        print()
+        print(f"{'port':<24}{'files sent':>12}{'time (s)':>10}  result")
+        for board_port, (sent, seconds, error) in zip(ports, results):
+            result = "ok" if error is None else f"failed: {error}"
+            sent = "-" if sent is None else sent
+            print(f"{board_port:<24}{sent:>12}{seconds:>10.2f}  {result}")
+
+        failed = sum(error is not None for _, _, error in results)
+        if failed:
+            exit(f"Failed to install on {failed} of {len(ports)} boards!")
 
     if click.confirm("Add `muro run` to auto-start?", default=False):
         print(f"Adding to auto-start... ({AUTO_START_PATH})")
@@ -167,12 +556,362 @@ def install(port, force):
 
 
 @click.command()
-def run():
+@click.option(
+    "--port", default="/dev/ttyUSB0", help="USB serial port for connected board"
+)
+@click.option(
+    "--seconds",
+    default=10,
+    show_default=True,
+    help="How long to sample the dials for.",
+)
+def calibrate(port, seconds):
+    """
+    Calibrate the dials of the board, over its serial port.
+
+    Samples both dials while you turn them all the way, both ways,
+    and saves their limits on the board,
+    so that they map right from the first frame after a reboot.
+    """
+
+    click.confirm(
+        f"Turn both dials all the way, both ways, for {seconds} sec. Ready?",
+        default=True,
+        abort=True,
+    )
+
+    print(f"Sampling the dials of the board @ {repr(port)}...")
+    with RawRepl(port) as board:
+        output = board.exec(
+            "from muro.micropython.muro import init_adc\n"
+            "from muro.micropython.calibration import calibrate\n"
+            f"calibrate(init_adc(), {seconds})\n",
+            timeout=seconds + board.timeout,
+        )
+
+        for line in output.strip().splitlines():
+            name, low, high = line.split()
+            print(f"{name}: {low} - {high}")
+
+        print("Performing a hard-reset...")
+        board.hard_reset()
+
+    print("Done!")
+
+
+def parse_board_address(address: str):
+    host, _, port = address.partition(":")
+    return host, int(port) if port else None
+
+
+@click.command(short_help="Deploy muro over the network")
+@click.argument("boards", nargs=-1)
+@click.option(
+    "--discover",
+    is_flag=True,
+    help="Also deploy to every board that answers a broadcast probe.",
+)
+@click.option(
+    "--window", default=8, show_default=True, help="Max chunks in flight per board."
+)
+@click.option(
+    "--timeout",
+    default=0.25,
+    show_default=True,
+    help="Time in sec to wait for a reply from a board, before resending.",
+)
+def deploy(boards, discover, window, timeout):
+    """
+    Update the code of running boards over the network,
+    given as HOST[:PORT] (port from the settings by default).
+
+    Only the compiled files that changed are sent.
+    The boards stage them aside, and only swap them in (& reboot) once they've all
+    arrived, so a board never runs a mix of old & new code.
+    A deploy that fails half way (e.g. a board went offline) resumes where it left off,
+    when run again.
+
+    The boards must have been set up with `muro install` first,
+    with `Deploy.enabled` on in the settings.
+    """
+
+    from muro.deploy import deploy as deploy_boards, discover as discover_boards
+
+    addresses = [parse_board_address(board) for board in boards]
+    if discover:
+        print("Looking for boards...")
+        found = discover_boards()
+        print(f"Found {len(found)} board(s).")
+        addresses += [address for address in found if address not in addresses]
+    if not addresses:
+        exit("No boards to deploy to.")
+
+    project_files = compile_project(find_project_files())
+    files = [
+        (file.path_on_board, file.path_compiled.read_bytes()) for file in project_files
+    ]
+    # last, so that it only lists the files once they're all in place.
+    files.append((MANIFEST_FILE, create_manifest(project_files)))
+
+    print(f"Deploying to {len(addresses)} board(s)...")
+    failed = 0
+    for (host, port), (board, error) in zip(
+        addresses, deploy_boards(addresses, files, window=window, timeout=timeout)
+    ):
+        name = host if port is None else f"{host}:{port}"
+        if error is not None:
+            failed += 1
+            print(f"{name}: failed! ({error})")
+        elif board.rebooted:
+            print(
+                f"{name}: sent {board.sent} file(s), {board.staged - board.sent} resumed, "
+                f"{board.retransmits} retransmits, rebooted."
+            )
+        else:
+            print(f"{name}: up to date.")
+
+    if failed:
+        exit(f"Failed to deploy to {failed} board(s), run again to resume.")
+    print("Done!")
+
+
+@click.command()
+@click.option(
+    "--engine",
+    type=click.Choice(["zproc", "asyncio"]),
+    default="zproc",
+    show_default=True,
+    help="zproc runs every handler in its own process, asyncio runs everything in one.",
+)
+@click.option(
+    "--record",
+    type=click.Path(dir_okay=False),
+    help="Also record the received frames to this flight log.",
+)
+@click.option(
+    "--record-size",
+    default=1024 * 1024,
+    show_default=True,
+    help="Max size of the flight log in bytes, the oldest frames are overwritten.",
+)
+def run(engine, record, record_size):
     """Run muro"""
 
-    from muro.muro import main
+    if engine == "asyncio":
+        from muro.aio import main
+    else:
+        from muro.muro import main
+
+    main(record=record, record_size=record_size)
+
+
+@click.command()
+@click.argument("path", type=click.Path(dir_okay=False))
+@click.option(
+    "--size",
+    default=1024 * 1024,
+    show_default=True,
+    help="Max size of the flight log in bytes, the oldest frames are overwritten.",
+)
+def record(path, size):
+    """
+    Record the frames from remotes to a flight log, without acting on them.
+
+    To record while muro is running, use `muro run --record` instead.
+    """
+
+    from muro.flightlog import record
+
+    record(path, size)
+
+
+@click.command()
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--speed", default=1.0, show_default=True, help="Replay N times faster.")
+@click.option("--fast", is_flag=True, help="Replay as fast as possible.")
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option(
+    "--port", type=int, help="UDP port of the daemon (default from settings)."
+)
+def replay(path, speed, fast, host, port):
+    """
+    Feed a flight log back into a (freshly started) daemon.
+    """
+
+    from muro.flightlog import replay
+
+    count = replay(path, None if fast else speed, host=host, port=port)
+    print(f"Replayed {count} frames.")
+
+
+@click.command("stats")
+@click.option(
+    "--interval",
+    default=1.0,
+    show_default=True,
+    help="Time in sec to sample for, when measuring packets per second.",
+)
+def show_stats(interval):
+    """
+    Show latency stats of the running daemon.
+
+    The latencies of every stage are measured from the moment a frame is received.
+    """
+
+    from time import sleep
+
+    from muro.stats import merge, query_all
+
+    before = merge(query_all())[0].get("frames", 0)
+    sleep(interval)
+    dumps = query_all()
+    if not dumps:
+        exit("muro doesn't seem to be running.")
+
+    counters, histograms = merge(dumps)
+    pps = (counters.get("frames", 0) - before) / interval
+
+    print(f"processes: {len(dumps)}")
+    print(f"packets/sec: {pps:.1f}")
+    for name, value in sorted(counters.items()):
+        print(f"{name}: {value}")
+    print()
+
+    print(f"{'stage':<24}{'count':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for name, histogram in sorted(histograms.items()):
+        p50, p95, p99 = (histogram.percentile(p) * 1000 for p in (50, 95, 99))
+        print(f"{name:<24}{histogram.total:>10}{p50:>10.3f}{p95:>10.3f}{p99:>10.3f}")
+
+
+# Same as `muro.bench.SCENARIOS`, without importing it up front.
+SCENARIO_NAMES = [
+    "dial-sweep",
+    "seek-hold",
+    "rapid-play-pause",
+    "lossy-play-pause",
+    "many-remotes",
+]
+
+
+@click.command()
+@click.option(
+    "--engine",
+    type=click.Choice(["zproc", "asyncio"]),
+    multiple=True,
+    default=["zproc", "asyncio"],
+    show_default=True,
+    help="The engine(s) to benchmark.",
+)
+@click.option(
+    "--scenario",
+    type=click.Choice(SCENARIO_NAMES),
+    multiple=True,
+    default=SCENARIO_NAMES,
+    show_default=True,
+    help="The scenario(s) to run.",
+)
+@click.option(
+    "--port", type=int, help="UDP port for the daemon (default from settings)."
+)
+@click.option(
+    "--loss",
+    type=click.FloatRange(0, 1),
+    default=0.2,
+    show_default=True,
+    help="Fraction of the frames & acks to drop, in the lossy scenarios.",
+)
+@click.option(
+    "--backend-delay",
+    type=click.FloatRange(0),
+    default=0.0,
+    show_default=True,
+    help="Time in sec the fake volume & brightness backends take to apply a change.",
+)
+def bench(engine, scenario, port, loss, backend_delay):
+    """
+    Benchmark the daemon end-to-end.
+
+    Drives the daemon with synthetic frames over loopback UDP,
+    using fake player, volume and brightness backends.
+    Runs headless, no audio or display required.
+
+    The lossy scenarios drop frames at random,
+    and check that every button press still gets through, within a latency budget.
+
+    With a backend delay, the dials are checked to stay within a latency budget,
+    by dropping the stale changes, rather than falling behind.
+
+    Exits with an error if any check fails.
+    """
+
+    from muro.bench import print_results, run_benchmark
+
+    ok = True
+    for name in engine:
+        results = run_benchmark(name, list(scenario), port, loss, backend_delay)
+        ok = print_results(name, results) and ok
+    if not ok:
+        exit(1)
+
+
+@click.command("bench-dials")
+@click.option(
+    "--trace",
+    type=click.Path(exists=True, dir_okay=False),
+    multiple=True,
+    help="A trace of raw dial readings, one per line (default: synthetic noise).",
+)
+def bench_dials(trace):
+    """
+    Count the frames sent for noisy dial readings, with & without filtering.
+
+    Runs the traces through the board's dial mapping & filter, on this machine.
+    The filter is configured in the settings (Dials).
+
+    Also checks the dial mapping against the reference one, and compares their sizes.
+    """
+
+    from muro import bench
+
+    if trace:
+        traces = {Path(path).name: bench.read_trace(path) for path in trace}
+    else:
+        traces = bench.noise_traces()
+    bench.bench_dials(traces)
+    print()
+    bench.bench_dial_maps()
+
+
+@click.command("bench-startup")
+@click.option(
+    "--engine",
+    type=click.Choice(["zproc", "asyncio"]),
+    multiple=True,
+    default=["zproc", "asyncio"],
+    show_default=True,
+    help="The engine(s) to benchmark.",
+)
+@click.option(
+    "--runs", default=5, show_default=True, help="Start the daemon this many times."
+)
+@click.option(
+    "--budget",
+    default=1.0,
+    show_default=True,
+    help="Time in sec `muro run` may take to start listening.",
+)
+def bench_startup(engine, runs, budget):
+    """
+    Measure how long `muro run` takes to start.
+
+    Shows what takes longest to import (with `python -X importtime`),
+    and checks that the daemon is listening for frames within the budget.
+    """
+
+    from muro.bench import bench_startup
 
-    main()
+    if not bench_startup(list(engine), runs, budget):
+        exit(1)
 
 
 ###########################################
@@ -184,7 +923,15 @@ def run():
 
 
 cli.add_command(install)
+cli.add_command(calibrate)
+cli.add_command(deploy)
 cli.add_command(run)
+cli.add_command(record)
+cli.add_command(replay)
+cli.add_command(show_stats)
+cli.add_command(bench)
+cli.add_command(bench_dials)
+cli.add_command(bench_startup)
 
 if __name__ == "__main__":
     cli()
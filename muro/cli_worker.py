@@ -2,24 +2,64 @@
 A worker that runs on a Micropython board.
 
 The data within "{{" & "}}" is populated by a Jinja2 template engine.
+
+The board keeps a manifest of the installed files, with their size & hash,
+so that finding what changed (or what must go) takes reading one small file,
+rather than hashing every file & walking the whole filesystem.
 """
 
 import uos as os
 import uhashlib as hashlib
+from ubinascii import hexlify
+
+MANIFEST_FILE = {{manifest_file | tojson}}
+CHUNK_SIZE = 512
+
+_buf = bytearray(CHUNK_SIZE)
 
 
 def get_parent_path(path: str) -> str:
     return "/".join(path.split("/")[:-1])
 
 
-def did_it_change(file_to_check: str, file_hash: bytes) -> int:
+def read_manifest() -> dict:
+    """Returns ``{path: (size, hash)}``, or ``None`` if there's no manifest."""
+    manifest = {}
     try:
-        with open(file_to_check, "rb") as fp:
-            file_data = fp.read()
+        with open(MANIFEST_FILE, "r") as fp:
+            for line in fp:
+                path, size, file_hash = line.split()
+                manifest[path] = (int(size), file_hash)
+    except OSError:
+        return None
+    return manifest
+
+
+def hash_file(path: str) -> str:
+    # in chunks, since the file might not fit in RAM.
+    sha1 = hashlib.sha1()
+    view = memoryview(_buf)
+    with open(path, "rb") as fp:
+        while True:
+            size = fp.readinto(_buf)
+            if not size:
+                break
+            sha1.update(view[:size])
+    return hexlify(sha1.digest()).decode()
+
+
+def did_it_change(file_to_check: str, file_hash: str, file_size: int) -> int:
+    try:
+        size = os.stat(file_to_check)[6]
     except OSError:
         return 1
-    else:
-        return int(hashlib.sha1(file_data).digest() != file_hash)
+    if size != file_size:
+        return 1
+
+    if manifest is not None and file_to_check in manifest:
+        return int(manifest[file_to_check] != (file_size, file_hash))
+    # not installed by muro (yet), so it must be hashed.
+    return int(hash_file(file_to_check) != file_hash)
 
 
 def mkdir_p(dir: str) -> None:
@@ -83,14 +123,38 @@ def remove_unwanted(dir_or_file: str):
             remove_unwanted(dir_or_file + "/" + child)  # pass the full path.
 
 
+def remove_uninstalled() -> None:
+    """Remove the files of the last install that aren't needed anymore, and their dirs."""
+    dirs = set()
+    for file in manifest:
+        if file not in required_files:
+            rm_if_not_required(file)
+            dirs.add(get_parent_path(file))
+
+    # deepest first, so that parents are empty by the time they're reached.
+    for dir in sorted(dirs, key=len, reverse=True):
+        while dir and dir not in required_dirs:
+            try:
+                os.rmdir(dir)
+            except OSError:
+                break  # not empty, or already gone.
+            dir = get_parent_path(dir)
+
+
 # gather required files / dirs.
 required_files = {{required_files}}
 required_files.add("boot.py")  # avoid fucking up the boot.py.
+required_files.add(MANIFEST_FILE)
 required_dirs = {{required_dirs}}
 
+manifest = read_manifest()
 
 # Remove unwanted files / dirs.
-remove_unwanted(os.getcwd())
+if manifest is None:
+    # not installed with a manifest before, so anything might be lying around.
+    remove_unwanted(os.getcwd())
+else:
+    remove_uninstalled()
 
 # create necessary dirs.
 for dir in required_dirs:
@@ -0,0 +1,224 @@
+"""
+The wire protocol, shared between the board and the host.
+
+Every frame starts with a header of:
+    version (u8), kind (u8), sequence number (u32), device tick in ms (u32)
+
+followed by a body, whose layout depends on the kind.
+
+Reliable frames (with :py:data:`FLAG_RELIABLE` set on their kind) have one more field
+between the header and the body:
+    the sequence number of the oldest frame the sender hasn't had acked (u32)
+so that a receiver that just started knows where the stream starts.
+"""
+
+try:
+    import ustruct as struct
+except ImportError:
+    import struct
+
+VERSION = 2
+
+# board -> host, the positions of the dials.
+KIND_STATE = 0
+# board -> host, to discover a host. (header only)
+KIND_HELLO = 1
+# host -> board, in reply to a hello, with the same sequence number. (header only)
+KIND_HELLO_ACK = 2
+# board -> host, the positions of the buttons. (always sent reliably)
+KIND_BUTTONS = 3
+# host -> board, cumulatively acks every reliable frame up to its sequence number.
+KIND_ACK = 4
+# board -> host, a button was pressed or released, at the tick in the header.
+# (always sent reliably)
+KIND_BUTTON_EVENT = 5
+
+# Over-the-air deployment (see `muro.deploy`), sent to the board's own port.
+# Every request is answered with a KIND_DEPLOY_REPLY, with the same sequence number.
+# host -> board, start (or resume) staging a file. body: size, sha1, then the path.
+KIND_DEPLOY_FILE = 6
+# host -> board, a piece of the file being staged. body: offset, then the data.
+KIND_DEPLOY_CHUNK = 7
+# host -> board, check the hash of the file being staged. (header only)
+KIND_DEPLOY_VERIFY = 8
+# host -> board, swap in the staged files, and reboot. (header only)
+KIND_DEPLOY_COMMIT = 9
+# host -> boards (usually broadcast), to find them. (header only)
+KIND_DEPLOY_PROBE = 10
+# board -> host. body: status (u8)
+KIND_DEPLOY_REPLY = 11
+
+# The statuses of a KIND_DEPLOY_REPLY.
+DEPLOY_OK = 0
+# the file is installed already, so there's nothing to stage.
+DEPLOY_INSTALLED = 1
+# the file is staged, and its hash checks out.
+DEPLOY_STAGED = 2
+DEPLOY_FAILED = 3
+
+# Set on the kind of frames sent reliably.
+# These have a sequence of their own, and are acked by the host.
+FLAG_RELIABLE = 0x80
+
+HEADER_FMT = ">BBII"
+# the oldest unacked sequence number, in reliable frames.
+RELIABLE_FMT = ">I"
+# volume, brightness
+STATE_BODY_FMT = ">ii"
+# pause, next, previous
+BUTTONS_BODY_FMT = ">BBB"
+# button (0: pause, 1: next, 2: previous), pressed
+BUTTON_EVENT_BODY_FMT = ">BB"
+# size, sha1 (followed by the path, in utf-8)
+DEPLOY_FILE_BODY_FMT = ">I20s"
+# offset (followed by the data)
+DEPLOY_CHUNK_BODY_FMT = ">I"
+
+STATE_FMT = HEADER_FMT + STATE_BODY_FMT[1:]
+BUTTONS_FMT = HEADER_FMT + BUTTONS_BODY_FMT[1:]
+BUTTON_EVENT_FMT = HEADER_FMT + BUTTON_EVENT_BODY_FMT[1:]
+
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+RELIABLE_SIZE = struct.calcsize(RELIABLE_FMT)
+
+SEQ_MASK = 0xFFFFFFFF
+
+# A frame this far behind the newest one is taken as a rebooted device,
+# rather than an out-of-order frame.
+REORDER_WINDOW = 1024
+
+
+if hasattr(struct, "Struct"):
+    # CPython: precompile the formats.
+    _header = struct.Struct(HEADER_FMT)
+    _reliable = struct.Struct(RELIABLE_FMT)
+    _state = struct.Struct(STATE_FMT)
+    _buttons = struct.Struct(BUTTONS_FMT)
+    _buttons_body = struct.Struct(BUTTONS_BODY_FMT)
+    _button_event = struct.Struct(BUTTON_EVENT_FMT)
+    _button_event_body = struct.Struct(BUTTON_EVENT_BODY_FMT)
+    _deploy_file_body = struct.Struct(DEPLOY_FILE_BODY_FMT)
+    _deploy_chunk_body = struct.Struct(DEPLOY_CHUNK_BODY_FMT)
+
+    pack_header = _header.pack
+    unpack_header = _header.unpack_from
+    pack_state = _state.pack
+    unpack_state = _state.unpack
+    pack_buttons_body = _buttons_body.pack
+    unpack_buttons = _buttons.unpack
+    pack_button_event_body = _button_event_body.pack
+    unpack_button_event = _button_event.unpack
+    pack_deploy_file_body = _deploy_file_body.pack
+    unpack_deploy_file_body = _deploy_file_body.unpack_from
+    pack_deploy_chunk_body = _deploy_chunk_body.pack
+    unpack_deploy_chunk_body = _deploy_chunk_body.unpack_from
+
+    def pack_reliable_into(buf, first):
+        _reliable.pack_into(buf, HEADER_SIZE, first)
+
+    def unpack_reliable(buf):
+        return _reliable.unpack_from(buf, HEADER_SIZE)[0]
+
+else:
+    # MicroPython's (u)struct has no Struct objects.
+
+    def pack_header(*args):
+        return struct.pack(HEADER_FMT, *args)
+
+    def unpack_header(buf):
+        return struct.unpack_from(HEADER_FMT, buf)
+
+    def pack_reliable_into(buf, first):
+        struct.pack_into(RELIABLE_FMT, buf, HEADER_SIZE, first)
+
+    def unpack_reliable(buf):
+        return struct.unpack_from(RELIABLE_FMT, buf, HEADER_SIZE)[0]
+
+    def pack_state(*args):
+        return struct.pack(STATE_FMT, *args)
+
+    def unpack_state(buf):
+        return struct.unpack(STATE_FMT, buf)
+
+    def pack_buttons_body(*args):
+        return struct.pack(BUTTONS_BODY_FMT, *args)
+
+    def unpack_buttons(buf):
+        return struct.unpack(BUTTONS_FMT, buf)
+
+    def pack_button_event_body(*args):
+        return struct.pack(BUTTON_EVENT_BODY_FMT, *args)
+
+    def unpack_button_event(buf):
+        return struct.unpack(BUTTON_EVENT_FMT, buf)
+
+    def pack_deploy_file_body(*args):
+        return struct.pack(DEPLOY_FILE_BODY_FMT, *args)
+
+    def unpack_deploy_file_body(buf, offset=0):
+        return struct.unpack_from(DEPLOY_FILE_BODY_FMT, buf, offset)
+
+    def pack_deploy_chunk_body(*args):
+        return struct.pack(DEPLOY_CHUNK_BODY_FMT, *args)
+
+    def unpack_deploy_chunk_body(buf, offset=0):
+        return struct.unpack_from(DEPLOY_CHUNK_BODY_FMT, buf, offset)
+
+
+def seq_lte(a, b):
+    """``a <= b``, for sequence numbers that wrap around."""
+    return ((b - a) & SEQ_MASK) < (SEQ_MASK >> 1)
+
+
+def check_header(buf):
+    """Return the ``(kind, seq, tick)`` of a frame, or raise ``ValueError`` if it can't be read."""
+    if len(buf) < HEADER_SIZE:
+        raise ValueError("Frame too short ({} bytes)".format(len(buf)))
+    version, kind, seq, tick = unpack_header(buf)
+    if version != VERSION:
+        raise ValueError(
+            "Unsupported protocol version: {} (expected {})".format(version, VERSION)
+        )
+    return kind, seq, tick
+
+
+class SeqTracker:
+    """
+    Keeps track of the sequence numbers received from a single device.
+
+    :py:meth:`accept` tells whether a frame is new, or a stale (duplicated / reordered) one,
+    that must be discarded.
+    """
+
+    def __init__(self):
+        self.last_seq = None
+        self.received = 0
+        self.lost = 0
+        self.reordered = 0
+        self.duplicates = 0
+
+    def accept(self, seq):
+        if self.last_seq is not None:
+            delta = (seq - self.last_seq) & SEQ_MASK
+
+            if delta == 0:
+                self.duplicates += 1
+                return False
+            if delta > SEQ_MASK - REORDER_WINDOW:
+                # older than the newest frame, so it was counted as lost already.
+                self.reordered += 1
+                if self.lost:
+                    self.lost -= 1
+                return False
+            if delta <= REORDER_WINDOW:
+                self.lost += delta - 1
+            # else, the device restarted (or was silent for too long), start afresh.
+
+        self.last_seq = seq
+        self.received += 1
+        return True
+
+    def __repr__(self):
+        return "<SeqTracker received: {} lost: {} reordered: {} duplicates: {}>".format(
+            self.received, self.lost, self.reordered, self.duplicates
+        )
@@ -0,0 +1,283 @@
+"""
+Pipelined reliable delivery, on top of plain UDP frames.
+
+The :py:class:`Sender` keeps several frames in flight,
+and the :py:class:`Receiver` acks them cumulatively by sequence number.
+
+Retransmit timeouts adapt to the measured round-trip time (as in TCP, RFC 6298),
+and nothing ever blocks waiting for an ack.
+
+Every frame carries the sequence number of the oldest one still unacked,
+so that a receiver that (re)started midway knows where the stream starts,
+rather than taking the first frame it happens to get for it.
+Frames that go unacked for too long are given up on, e.g. while the host is down,
+so that a button pressed then isn't acted on whenever it's back.
+"""
+
+try:
+    from utime import ticks_diff, ticks_ms
+    from urandom import getrandbits
+except ImportError:
+    from random import getrandbits
+    from time import monotonic
+
+    def ticks_ms():
+        return int(monotonic() * 1000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+
+from muro.common import protocol
+
+
+class Sender:
+    """
+    :param send: Called with every frame (bytes) to (re)transmit.
+    :param window: Max frames in flight at once.
+    :param queue_size: Max frames waiting for room in the window.
+        When full, the oldest waiting frame is dropped.
+    :param initial_rto: Retransmit timeout in ms, until the RTT has been measured.
+    :param min_rto: Lower bound of the retransmit timeout in ms.
+    :param max_rto: Upper bound of the retransmit timeout in ms.
+    :param dup_acks: Retransmit the oldest frame right away after this many duplicate acks,
+        rather than waiting for the timeout (as TCP's fast retransmit).
+    :param linear_timeouts: Only back off after this many timeouts in a row.
+        Button presses are a thin stream, with too few frames in flight for dup acks,
+        so this keeps their latency down on a lossy link (as Linux' thin stream mode).
+    :param lifetime: Give up on a frame this long (in ms) after it was queued,
+        if it's still unacked by then.
+    """
+
+    def __init__(
+        self,
+        send,
+        *,
+        window=8,
+        queue_size=16,
+        initial_rto=100,
+        min_rto=10,
+        max_rto=1000,
+        dup_acks=2,
+        linear_timeouts=4,
+        lifetime=5000,
+    ):
+        self._send = send
+        self.window = window
+        self.queue_size = queue_size
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.dup_acks = dup_acks
+        self.linear_timeouts = linear_timeouts
+        self.lifetime = lifetime
+
+        # Start at a random point, so that the host doesn't take the frames
+        # of a rebooted board for duplicates.
+        self._next_seq = getrandbits(30) + 1
+
+        # [seq, frame, sent at, retransmitted?, queued at], oldest first.
+        self._in_flight = []
+        # when the retransmit timer was last (re)started.
+        self._timer = 0
+        self._dup_acks = 0
+        self._timeouts = 0
+        # (kind, body, tick, queued at) waiting for room in the window.
+        self._queue = []
+
+        self.srtt = None
+        self.rttvar = 0
+        self.rto = initial_rto
+
+        self.sent = 0
+        self.retransmits = 0
+        self.dropped = 0
+        self.expired = 0
+
+    @property
+    def in_flight(self):
+        return len(self._in_flight)
+
+    def send(self, kind, body, tick=None):
+        """
+        Queue a frame for reliable delivery. Never blocks.
+
+        :param tick: (Optional) The tick (in ms) to put in the header,
+            the time of sending by default.
+        """
+        self._queue.append((kind, body, tick, ticks_ms()))
+        if len(self._queue) > self.queue_size:
+            self._queue.pop(0)
+            self.dropped += 1
+        self._fill_window()
+
+    def _fill_window(self):
+        while self._queue and len(self._in_flight) < self.window:
+            kind, body, tick, queued_at = self._queue.pop(0)
+
+            seq = self._next_seq
+            self._next_seq = (seq + 1) & protocol.SEQ_MASK
+
+            now = ticks_ms()
+            if not self._in_flight:
+                self._timer = now
+            # the oldest unacked sequence number is filled in on every transmission.
+            frame = bytearray(
+                protocol.pack_header(
+                    protocol.VERSION,
+                    kind | protocol.FLAG_RELIABLE,
+                    seq,
+                    (now if tick is None else tick) & protocol.SEQ_MASK,
+                )
+            )
+            frame.extend(bytes(protocol.RELIABLE_SIZE))
+            frame.extend(body)
+            entry = [seq, frame, now, False, queued_at]
+            self._in_flight.append(entry)
+            self._transmit(entry)
+            self.sent += 1
+
+    def _transmit(self, entry):
+        protocol.pack_reliable_into(entry[1], self._in_flight[0][0])
+        self._send(entry[1])
+
+    def on_ack(self, ack_seq):
+        now = ticks_ms()
+        acked = 0
+        ambiguous = False
+
+        while self._in_flight and protocol.seq_lte(self._in_flight[0][0], ack_seq):
+            _, _, sent_at, retransmitted, _ = self._in_flight.pop(0)
+            acked += 1
+            # Karn's algorithm: the RTT is ambiguous if the ack may be for a retransmit.
+            # (the ack of a fresh frame that waited on a retransmitted one is, too.)
+            ambiguous = ambiguous or retransmitted
+        if not acked:
+            if self._in_flight:
+                # the receiver got a later frame, so the oldest one is likely lost.
+                self._dup_acks += 1
+                if self._dup_acks == self.dup_acks:
+                    self._retransmit(now)
+            return
+
+        self._timer = now
+        self._dup_acks = self._timeouts = 0
+        if not ambiguous:
+            rtt = ticks_diff(now, sent_at)
+            if self.srtt is None:
+                self.srtt, self.rttvar = rtt, rtt // 2
+            else:
+                self.rttvar = (3 * self.rttvar + abs(self.srtt - rtt)) // 4
+                self.srtt = (7 * self.srtt + rtt) // 8
+        if self.srtt is not None:
+            # the link works again, undo the back off.
+            self.rto = min(max(self.srtt + 4 * self.rttvar, self.min_rto), self.max_rto)
+
+        self._fill_window()
+
+    def _retransmit(self, now):
+        # The oldest unacked frame holds back the cumulative ack of all the others,
+        # which have most likely arrived already.
+        entry = self._in_flight[0]
+        entry[3] = True
+        self._transmit(entry)
+        self.retransmits += 1
+        self._timer = now
+
+    def _expire(self, now):
+        expired = 0
+        while self._queue and ticks_diff(now, self._queue[0][3]) >= self.lifetime:
+            self._queue.pop(0)
+            expired += 1
+        while (
+            self._in_flight and ticks_diff(now, self._in_flight[0][4]) >= self.lifetime
+        ):
+            self._in_flight.pop(0)
+            expired += 1
+        if not expired:
+            return
+
+        self.expired += expired
+        self._dup_acks = self._timeouts = 0
+        if self._in_flight:
+            # so that the receiver skips ahead, to the new oldest one, right away.
+            self._retransmit(now)
+        self._fill_window()
+
+    def poll(self):
+        """
+        Retransmit the oldest frame if its ack is overdue, and give up on the ones
+        that outlived their lifetime. Call this often.
+        """
+        now = ticks_ms()
+        self._expire(now)
+        if not self._in_flight:
+            return
+
+        if ticks_diff(now, self._timer) >= self.rto:
+            self._retransmit(now)
+            self._timeouts += 1
+            if self._timeouts > self.linear_timeouts:
+                # back off, in case the network is congested.
+                self.rto = min(self.rto * 2, self.max_rto)
+
+
+class Receiver:
+    """
+    Puts the reliable frames from a single sender back in order, dropping duplicates.
+
+    Starts at the oldest frame the sender still has unacked, which the first frame
+    it gets tells. The frames the sender gave up on are skipped.
+
+    :param window: Max frames to buffer ahead of a missing one.
+    """
+
+    def __init__(self, window=64):
+        self.window = window
+        self.expected = None
+        self._buffer = {}
+
+        self.duplicates = 0
+
+    def accept(self, seq, item, first=None):
+        """
+        Returns the sequence number to ack (cumulatively),
+        and the list of items that are now deliverable, in order.
+
+        :param first: (Optional) The oldest sequence number the sender has unacked,
+            as in the frame. (defaults to ``seq``)
+        """
+        if first is None or ((seq - first) & protocol.SEQ_MASK) >= self.window:
+            first = seq
+
+        if self.expected is None:
+            self.expected = first
+        delta = (seq - self.expected) & protocol.SEQ_MASK
+        if self.window <= delta <= protocol.SEQ_MASK - self.window:
+            # a new sender (e.g. a rebooted board), start afresh.
+            self._buffer.clear()
+            self.expected = first
+            delta = (seq - first) & protocol.SEQ_MASK
+
+        deliverable = []
+        skip = (first - self.expected) & protocol.SEQ_MASK
+        if 0 < skip < self.window:
+            # the sender gave up on the ones before, so don't wait for them.
+            for _ in range(skip):
+                if self.expected in self._buffer:
+                    deliverable.append(self._buffer.pop(self.expected))
+                self.expected = (self.expected + 1) & protocol.SEQ_MASK
+            delta = (seq - self.expected) & protocol.SEQ_MASK
+
+        if delta == 0:
+            self._buffer.pop(seq, None)
+            deliverable.append(item)
+            self.expected = (self.expected + 1) & protocol.SEQ_MASK
+            while self.expected in self._buffer:
+                deliverable.append(self._buffer.pop(self.expected))
+                self.expected = (self.expected + 1) & protocol.SEQ_MASK
+        elif delta < self.window:
+            self._buffer[seq] = item
+        else:
+            self.duplicates += 1
+
+        return (self.expected - 1) & protocol.SEQ_MASK, deliverable
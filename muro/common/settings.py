@@ -8,8 +8,79 @@ class Wifi:
     enable_ap = False
 
 
+class Stats:
+    report_interval = 60  # seconds between RSS / latency reports in the log
+
+
+class Player:
+    # "mpris" talks to players directly over D-Bus,
+    # "playerctl" spawns a `playerctl` process for every action.
+    backend = "mpris"
+
+
+class Volume:
+    # "sink-inputs" sets the volume of every playing stream,
+    # "default-sink" sets the master volume of the default sink.
+    target = "sink-inputs"
+
+    max_rate = 60  # max volume changes applied per second
+
+
+class Backlight:
+    # "sysfs" writes to /sys/class/backlight directly,
+    # "xbacklight" spawns an `xbacklight` process for every change.
+    backend = "sysfs"
+    sysfs_root = "/sys/class/backlight"
+
+    max_rate = 30  # max brightness changes applied per second
+
+
+class Remotes:
+    # The actions driven by each remote, by its IP address. e.g.
+    #   {"192.168.1.20": ("volume", "pause"), "192.168.1.21": ("brightness",)}
+    # A remote routed to no actions is ignored, and its hellos aren't acked,
+    # so that it finds (and gets routed to) another host that has it.
+    routes = {}
+    # The actions driven by remotes that aren't listed in `routes`.
+    default_route = ("volume", "brightness", "pause", "next", "previous")
+
+    # Forget about a remote after this long without a frame from it (in sec).
+    idle_timeout = 600
+
+
+class Discovery:
+    # The board says hello to its host this often (in sec),
+    # and goes back to broadcasting if the host hasn't replied for `timeout` sec.
+    hello_interval = 2
+    timeout = 7
+
+
+class Deploy:
+    # Accept `muro deploy` over the network. Off by default, as there's no
+    # authentication: anyone on the network could replace the code on the board.
+    # Only turn it on for boards on a network you trust. (and `muro install` them again)
+    enabled = False
+    # The board checks for deploy requests this often (in sec), when not deploying.
+    poll_interval = 0.2
+
+
+class Seek:
+    # How the seek speed (in sec of the track per sec held) grows, while a button is
+    # held: from `start_speed` to `max_speed`, over `ramp` sec.
+    # "exponential" multiplies it by the same factor every sec, "linear" adds to it.
+    curve = "exponential"
+    start_speed = 20
+    max_speed = 100
+    ramp = 5
+
+    tick_rate = 20  # positions set per second, while seeking
+    # A seek stops after this long (in sec), even if the release never came through.
+    max_hold = 30
+
+
 class Buttons:
     seek_timeout = 0.25  # timeout for switching to seek mode
+    debounce = 20  # ms for a button to settle, after a press or release
 
     next = 14  # D5
     prev = 12  # D6
@@ -18,10 +89,23 @@ class Buttons:
 
 class Dials:
     read_speed = 3  # between 1 and 7 (3 seems to be a sweet spot)
+    # ms between reads of the dials. Buttons are interrupt driven,
+    # so this can be raised to save power, without missing presses.
+    sample_interval = 0
 
     # The deadzone for the dial in %.
     deadzone = 25
 
+    # Filtering of the raw readings (see `dialmap.DialFilter`).
+    oversample = 1  # readings averaged per sample
+    median = 3  # window of the median filter, against spikes
+    ema_shift = 1  # new samples weigh 1 / 2**ema_shift in the moving average
+    hysteresis = 32  # raw units the average must move by, to change the output
+
+    # The limits of the dials are saved to flash at most this often (in sec),
+    # as they widen. `muro calibrate` sets them up front.
+    calibration_save_interval = 300
+
     # sda/scl for I2C
     sda = 4  # D2
     scl = 5  # D1
@@ -22,6 +22,7 @@ else:
 
 BCAST_HOST = "255.255.255.255"
 LOCAL_HOST = "0.0.0.0"
+DEFAULT_NAMESPACE = ":)"
 
 
 def micropython_only(fn):
@@ -41,9 +42,10 @@ class Peer:
         passwd: str = None,
         enable_ap: bool = False,
         buffer_size: int = 1024,
-        namespace: str = ":)",
+        namespace: str = DEFAULT_NAMESPACE,
         retry_for: tuple = (),
         retry_delay: float = 5.0,
+        listen: bool = True,
     ):
         """
         :param ssid: (Optional) SSID of a WIFI connection.
@@ -52,6 +54,9 @@ class Peer:
         :param network_wait: (Optional) Time in sec to wait for a network connection.
         :param retry_for: (Optional) Retry if any of these Exceptions occur.
         :param retry_delay: (Optional) Time in sec to wait for, before retrying.
+        :param listen: (Optional) Receive messages on ``port``.
+            A peer that only sends (and reads the replies) doesn't need to,
+            so it can run alongside another one on the same host.
         """
 
         self.port = port
@@ -64,6 +69,7 @@ class Peer:
         self.retry_delay = retry_delay
         self.namespace_bytes = namespace.encode("utf-8")
         self.namespace_size = len(self.namespace_bytes)
+        self.listen = listen
         self.send_sock, self.recv_sock = None, None
         self.connect()
 
@@ -146,8 +152,9 @@ class Peer:
         self.disconnect()
         self._connect_network()
 
-        self.recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.recv_sock.bind((LOCAL_HOST, self.port))
+        if self.listen:
+            self.recv_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.recv_sock.bind((LOCAL_HOST, self.port))
 
         self.send_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.send_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
@@ -211,6 +218,39 @@ class Peer:
                 self._handle_error(e)
                 self.connect()
 
+    def reply(self, msg_bytes, address):
+        """Reply to a message received from ``address``."""
+        return self.recv_sock.sendto(self.namespace_bytes + msg_bytes, address)
+
+    def _poll(self, sock, timeout):
+        sock.settimeout(timeout)
+        try:
+            while True:
+                msg, address = sock.recvfrom(self.buffer_size)
+                if msg.startswith(self.namespace_bytes):
+                    return msg[self.namespace_size :], address
+        except OSError:
+            return None
+        finally:
+            sock.settimeout(None)
+
+    def poll_reply(self, timeout=0):
+        """
+        Return the next reply to a sent message, as ``(msg, address)``.
+
+        :param timeout: (Optional) Time in sec to wait for one.
+            By default, doesn't block; returns ``None`` if there are no replies waiting.
+        """
+        return self._poll(self.send_sock, timeout)
+
+    def poll_recv(self):
+        """
+        Return the next message received on ``port``, as ``(msg, address)``.
+
+        Doesn't block; returns ``None`` if there are no messages waiting.
+        """
+        return self._poll(self.recv_sock, 0)
+
     def send_str(self, msg_str, *args, **kwargs):
         return self.send(msg_str.encode("utf-8"), *args, **kwargs)
 
@@ -0,0 +1,257 @@
+"""
+Over-the-air deployment of the compiled code to boards, over UDP.
+
+Every board is sent the files one at a time, each as a window of chunks in flight
+(resent until acked), and then asked to check its hash.
+The board stages them aside, skipping the files it has installed or staged already,
+so a deploy that was cut short resumes where it left off.
+Once all are staged, the board swaps them in atomically, and reboots.
+
+Boards are deployed to concurrently, each from a socket of its own.
+
+See :py:mod:`muro.micropython.ota` for the board's side.
+"""
+
+import hashlib
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from muro.common import protocol, settings, unetwork
+
+# Bytes of a file per chunk, so that a frame fits in the board's receive buffer.
+CHUNK_SIZE = 512
+
+
+class DeployError(Exception):
+    """A board failed, or stopped answering."""
+
+
+class BoardDeploy:
+    """
+    Deploys files to a single board.
+
+    :param host: The address of the board.
+    :param port: (Optional) The port of the board. (default from settings)
+    :param window: (Optional) Max chunks in flight at once.
+    :param timeout: (Optional) Time in sec to wait for a reply, before resending.
+    :param retries: (Optional) Give up after resending this many times in a row,
+        without a reply.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int = None,
+        *,
+        window: int = 8,
+        timeout: float = 0.25,
+        retries: int = 20,
+    ):
+        self.host = socket.gethostbyname(host)
+        self.port = settings.udp_port if port is None else port
+        self.window = window
+        self.timeout = timeout
+        self.retries = retries
+
+        self.peer = unetwork.Peer(self.port, listen=False)
+        self._seq = 0
+
+        self.sent = 0
+        self.skipped = 0
+        self.staged = 0
+        self.frames = 0
+        self.retransmits = 0
+        self.rebooted = False
+
+    def __repr__(self):
+        return f"<BoardDeploy {self.host}:{self.port}>"
+
+    def close(self):
+        self.peer.disconnect()
+
+    def _frame(self, kind: int, body: bytes = b"") -> Tuple[int, bytes]:
+        self._seq = (self._seq + 1) & protocol.SEQ_MASK
+        return (
+            self._seq,
+            protocol.pack_header(protocol.VERSION, kind, self._seq, 0) + body,
+        )
+
+    def _send(self, frame: bytes):
+        self.peer.send(frame, self.host)
+        self.frames += 1
+
+    def _recv(self, timeout: float) -> Optional[Tuple[int, int]]:
+        """Return the ``(seq, status)`` of the next reply of the board, or ``None``."""
+        deadline = time.monotonic() + timeout
+        while True:
+            reply = self.peer.poll_reply(max(deadline - time.monotonic(), 0))
+            if reply is None:
+                return None
+
+            msg, address = reply
+            if address[0] != self.host:
+                continue
+            try:
+                kind, seq, _ = protocol.check_header(msg)
+            except ValueError:
+                continue
+            if kind == protocol.KIND_DEPLOY_REPLY and len(msg) > protocol.HEADER_SIZE:
+                return seq, msg[protocol.HEADER_SIZE]
+
+    def request(self, kind: int, body: bytes = b"") -> int:
+        """Send a request until it's answered, and return the status."""
+        seq, frame = self._frame(kind, body)
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self.retransmits += 1
+            self._send(frame)
+
+            deadline = time.monotonic() + self.timeout
+            while True:
+                reply = self._recv(deadline - time.monotonic())
+                if reply is None:
+                    break
+                if reply[0] == seq:
+                    return reply[1]
+
+        raise DeployError(f"{self.host} stopped answering.")
+
+    def _send_chunks(self, data: bytes):
+        offsets = list(reversed(range(0, len(data), CHUNK_SIZE)))
+        # {seq: [frame, sent at]}
+        in_flight = {}
+        timeouts = 0
+
+        while offsets or in_flight:
+            while offsets and len(in_flight) < self.window:
+                offset = offsets.pop()
+                seq, frame = self._frame(
+                    protocol.KIND_DEPLOY_CHUNK,
+                    protocol.pack_deploy_chunk_body(offset)
+                    + data[offset : offset + CHUNK_SIZE],
+                )
+                self._send(frame)
+                in_flight[seq] = [frame, time.monotonic()]
+
+            oldest = min(sent_at for _, sent_at in in_flight.values())
+            reply = self._recv(oldest + self.timeout - time.monotonic())
+            if reply is not None:
+                seq, status = reply
+                if seq in in_flight:
+                    if status != protocol.DEPLOY_OK:
+                        # e.g. it rebooted, and lost the open file.
+                        raise DeployError(f"{self.host} failed to write a chunk.")
+                    del in_flight[seq]
+                    timeouts = 0
+                continue
+
+            timeouts += 1
+            if timeouts > self.retries:
+                raise DeployError(f"{self.host} stopped answering.")
+            now = time.monotonic()
+            for entry in in_flight.values():
+                if now - entry[1] >= self.timeout:
+                    self._send(entry[0])
+                    entry[1] = now
+                    self.retransmits += 1
+
+    def send_file(self, path: str, data: bytes):
+        """Stage a file on the board, unless it has it already."""
+        sha1 = hashlib.sha1(data).digest()
+        body = protocol.pack_deploy_file_body(len(data), sha1) + path.encode()
+
+        # once more, if it got corrupted on the way.
+        for _ in range(2):
+            status = self.request(protocol.KIND_DEPLOY_FILE, body)
+            if status == protocol.DEPLOY_INSTALLED:
+                self.skipped += 1
+                return
+            if status == protocol.DEPLOY_STAGED:
+                self.staged += 1
+                return
+            if status != protocol.DEPLOY_OK:
+                raise DeployError(f"{self.host} failed to stage {path!r}.")
+
+            self._send_chunks(data)
+            if self.request(protocol.KIND_DEPLOY_VERIFY) == protocol.DEPLOY_STAGED:
+                self.sent += 1
+                self.staged += 1
+                return
+
+        raise DeployError(
+            f"{path!r} keeps getting corrupted on its way to {self.host}."
+        )
+
+    def deploy(self, files: List[Tuple[str, bytes]]):
+        """
+        Stage every file, and if any changed, swap them in & reboot the board.
+
+        :param files: The ``(path on board, contents)`` of each file.
+        """
+        for path, data in files:
+            self.send_file(path, data)
+        if not self.staged:
+            return
+
+        if self.request(protocol.KIND_DEPLOY_COMMIT) != protocol.DEPLOY_OK:
+            raise DeployError(f"{self.host} failed to swap in the new files.")
+        self.rebooted = True
+
+
+def deploy(
+    boards: List[Tuple[str, Optional[int]]], files: List[Tuple[str, bytes]], **kwargs
+) -> List[Tuple[BoardDeploy, Optional[Exception]]]:
+    """
+    Deploy the files to every board at once.
+
+    :param boards: The ``(host, port)`` of each board. (``None`` for the default port)
+    :param files: The ``(path on board, contents)`` of each file.
+    :param kwargs: Passed on to :py:class:`BoardDeploy`.
+
+    Returns the :py:class:`BoardDeploy` of each board, with the error it failed with.
+    (or ``None``)
+    """
+
+    def run(board):
+        host, port = board
+        try:
+            board = BoardDeploy(host, port, **kwargs)
+        except OSError as e:
+            return None, e
+        try:
+            board.deploy(files)
+        except (DeployError, OSError) as e:
+            return board, e
+        finally:
+            board.close()
+        return board, None
+
+    with ThreadPoolExecutor(max_workers=max(min(len(boards), 32), 1)) as executor:
+        return list(executor.map(run, boards))
+
+
+def discover(timeout: float = 1.0, port: int = None) -> List[Tuple[str, int]]:
+    """Broadcast a probe, and return the ``(host, port)`` of every board that answers."""
+    peer = unetwork.Peer(settings.udp_port if port is None else port, listen=False)
+    try:
+        peer.send(
+            protocol.pack_header(protocol.VERSION, protocol.KIND_DEPLOY_PROBE, 0, 0)
+        )
+
+        found = set()
+        deadline = time.monotonic() + timeout
+        while True:
+            reply = peer.poll_reply(max(deadline - time.monotonic(), 0))
+            if reply is None:
+                return sorted(found)
+            msg, address = reply
+            try:
+                kind, _, _ = protocol.check_header(msg)
+            except ValueError:
+                continue
+            if kind == protocol.KIND_DEPLOY_REPLY:
+                found.add(address)
+    finally:
+        peer.disconnect()
@@ -0,0 +1,266 @@
+"""
+A fake MicroPython board, to try `muro install` & co. without any hardware.
+
+It speaks the raw REPL (and raw-paste) protocol on a pseudo-terminal,
+and runs the code it gets with CPython, in a directory standing in for the flash.
+The MicroPython-only modules that muro uses on the board
+(``uos``, ``uhashlib``, ``ubinascii``, ``uzlib``, ``utime``, ``machine``) are shimmed.
+
+Usage:
+    python -m muro.fakeboard ROOT
+
+prints the path of the pty to pass as `--port`, and serves until interrupted.
+
+    python -m muro.fakeboard ROOT --ota-port PORT [--loss 0.2]
+
+runs the board's side of `muro deploy` instead, on loopback UDP.
+(`muro deploy 127.0.0.1:PORT`) Several can run at once, on different ports.
+"""
+
+import argparse
+import binascii
+import contextlib
+import hashlib
+import io
+import os
+import pty
+import random
+import sys
+import time
+import traceback
+import tty
+import types
+import zlib
+
+# Bytes the host may send in raw-paste mode, before waiting for more room.
+PASTE_WINDOW = 128
+
+RAW_REPL_BANNER = b"raw REPL; CTRL-B to exit\r\n>"
+
+
+class Reset(Exception):
+    """Raised by ``machine.reset()``."""
+
+
+class DecompIO:
+    """``uzlib.DecompIO``, on top of :py:mod:`zlib`."""
+
+    def __init__(self, stream, wbits=0):
+        self.stream = stream
+        self._decompressor = zlib.decompressobj(wbits)
+        self._buffer = b""
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            data = self.stream.read(256)
+            if not data:
+                self._buffer += self._decompressor.flush()
+                break
+            self._buffer += self._decompressor.decompress(data)
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def make_uos(root: str) -> types.ModuleType:
+    """``uos``, with paths from the board's point of view. (``root`` is its "/")"""
+    uos = types.ModuleType("uos")
+
+    def getcwd():
+        path = os.path.relpath(os.getcwd(), root)
+        return "/" if path == "." else "/" + path
+
+    def listdir(path=""):
+        return os.listdir(path or ".")
+
+    uos.getcwd = getcwd
+    uos.listdir = listdir
+    for name in ("chdir", "mkdir", "remove", "rename", "rmdir", "stat"):
+        setattr(uos, name, getattr(os, name))
+    return uos
+
+
+def make_utime() -> types.ModuleType:
+    utime = types.ModuleType("utime")
+    utime.ticks_ms = lambda: int(time.monotonic() * 1000)
+    utime.ticks_add = lambda ticks, delta: ticks + delta
+    utime.ticks_diff = lambda a, b: a - b
+    utime.sleep_ms = lambda ms: time.sleep(ms / 1000)
+    return utime
+
+
+def make_machine() -> types.ModuleType:
+    machine = types.ModuleType("machine")
+
+    def reset():
+        raise Reset
+
+    machine.reset = reset
+    return machine
+
+
+def make_modules(root: str) -> dict:
+    """The shims of the MicroPython-only modules, by name, for ``sys.modules``."""
+    uzlib = types.ModuleType("uzlib")
+    uzlib.DecompIO = DecompIO
+    return dict(
+        uos=make_uos(root),
+        uhashlib=hashlib,
+        ubinascii=binascii,
+        uzlib=uzlib,
+        utime=make_utime(),
+        machine=make_machine(),
+    )
+
+
+class FakeBoard:
+    """
+    Serves the raw REPL on a new pty. (:py:attr:`port` is its path)
+
+    Code is run in the current directory, which is taken for the root of the flash.
+    """
+
+    def __init__(self):
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+
+        self.resets = 0
+        self._reset()
+
+    def _reset(self):
+        self.namespace = {"__name__": "__main__"}
+        self._raw = False
+        self._paste = False
+        self._paste_received = 0
+        self._code = bytearray()
+
+    def _write(self, data: bytes):
+        os.write(self._master, data)
+
+    def _run(self):
+        code, self._code = bytes(self._code), bytearray()
+        out, err = io.StringIO(), io.StringIO()
+        try:
+            with contextlib.redirect_stdout(out):
+                exec(compile(code, "<stdin>", "exec"), self.namespace)
+        except Reset:
+            self.resets += 1
+            self._reset()
+            return
+        except BaseException:
+            err.write(traceback.format_exc())
+
+        self._write(
+            out.getvalue().encode() + b"\x04" + err.getvalue().encode() + b"\x04>"
+        )
+
+    def _feed(self, byte: int):
+        if self._paste:
+            if byte == 0x04:
+                # end of the code, acked before running it.
+                self._paste = False
+                self._write(b"\x04")
+                self._run()
+            else:
+                self._code.append(byte)
+                self._paste_received += 1
+                if self._paste_received == PASTE_WINDOW:
+                    self._paste_received = 0
+                    self._write(b"\x01")
+            return
+
+        if byte == 0x01:  # ctrl-A
+            self._raw = True
+            self._code.clear()
+            self._write(b"\r\n" + RAW_REPL_BANNER)
+        elif not self._raw:
+            if byte == 0x03:  # ctrl-C
+                self._write(b"\r\n>>> ")
+        elif byte == 0x02:  # ctrl-B
+            self._raw = False
+            self._write(b"\r\n>>> ")
+        elif byte == 0x03:
+            self._code.clear()
+        elif byte == 0x04:
+            if self._code:
+                self._write(b"OK")
+                self._run()
+            else:
+                self.namespace = {"__name__": "__main__"}
+                self._write(b"OK\r\nMPY: soft reboot\r\n" + RAW_REPL_BANNER)
+        else:
+            self._code.append(byte)
+            if self._code == b"\x05A\x01":
+                self._code.clear()
+                self._paste = True
+                self._paste_received = 0
+                self._write(b"R\x01" + PASTE_WINDOW.to_bytes(2, "little"))
+
+    def serve_forever(self):
+        while True:
+            for byte in os.read(self._master, 4096):
+                self._feed(byte)
+
+
+def serve_ota(port: int, loss: float = 0.0):
+    """Answer `muro deploy` on a UDP port, dropping a ``loss`` fraction of the frames."""
+    from muro.common import unetwork
+    from muro.micropython import ota
+
+    class LossyPeer(unetwork.Peer):
+        def poll_recv(self):
+            while True:
+                msg = super().poll_recv()
+                if msg is None or random.random() >= loss:
+                    return msg
+
+        def reply(self, msg_bytes, address):
+            if random.random() >= loss:
+                return super().reply(msg_bytes, address)
+
+    with LossyPeer(port) as peer:
+        receiver = ota.Receiver(peer)
+        while True:
+            try:
+                receiver.poll()
+            except Reset:
+                # what main.py does at boot.
+                ota.apply_journal()
+                receiver = ota.Receiver(peer)
+                print("Rebooted.", flush=True)
+            time.sleep(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("root", help="The directory standing in for the flash.")
+    parser.add_argument("--ota-port", type=int, help="Serve `muro deploy` on it.")
+    parser.add_argument(
+        "--loss", type=float, default=0.0, help="Fraction of UDP frames to drop."
+    )
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    os.makedirs(root, exist_ok=True)
+    os.chdir(root)
+
+    sys.modules.update(make_modules(root))
+
+    try:
+        if args.ota_port is not None:
+            serve_ota(args.ota_port, args.loss)
+        else:
+            board = FakeBoard()
+            print(board.port, flush=True)
+            board.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
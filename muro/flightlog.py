@@ -0,0 +1,183 @@
+"""
+A flight recorder for the frames received from remotes.
+
+Frames are stored with their receive timestamps in a fixed-size ring buffer file,
+so it can be left running indefinitely; the oldest frames get overwritten first.
+
+Layout:
+    header (32 bytes): magic, slot size (u16), slot count (u32), next slot (u32), wrapped (u8)
+    slots: receive time (f64, unix time), sender IPv4 address (4 bytes), sender port (u16),
+        frame length (u16), frame (padded to the slot size)
+
+Logs of the first version (``MUROLOG1``) have no sender address in their slots,
+they're read as coming from a single remote.
+"""
+
+import os
+import socket
+import struct
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
+
+from muro.common import settings, unetwork
+
+MAGIC = b"MUROLOG2"
+MAGIC_V1 = b"MUROLOG1"
+
+_header = struct.Struct(">8sHIIB")
+_slot_header = struct.Struct(">d4sHH")
+_slot_header_v1 = struct.Struct(">dH")
+
+HEADER_SIZE = 32
+SLOT_SIZE = 64
+MAX_FRAME_SIZE = SLOT_SIZE - _slot_header.size
+
+DEFAULT_MAX_SIZE = 1024 * 1024
+
+
+class FlightRecorder:
+    """
+    Appends frames to a ring buffer file, that never grows beyond ``max_size`` bytes.
+
+    An existing log is appended to, if it has the same slot size.
+    """
+
+    def __init__(self, path: Union[str, Path], max_size: int = DEFAULT_MAX_SIZE):
+        self.path = Path(path)
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+
+        header = os.pread(self.fd, _header.size, 0)
+        if len(header) == _header.size and header.startswith(MAGIC):
+            _, slot_size, self.slot_count, self.next_slot, self.wrapped = (
+                _header.unpack(header)
+            )
+            if slot_size != SLOT_SIZE:
+                raise ValueError(f"{str(self.path)!r} has an unsupported slot size.")
+        else:
+            self.slot_count = max((max_size - HEADER_SIZE) // SLOT_SIZE, 1)
+            self.next_slot, self.wrapped = 0, False
+            os.ftruncate(self.fd, 0)
+            self._write_header()
+
+    def _write_header(self):
+        os.pwrite(
+            self.fd,
+            _header.pack(
+                MAGIC, SLOT_SIZE, self.slot_count, self.next_slot, self.wrapped
+            ),
+            0,
+        )
+
+    def append(self, frame: bytes, address: Tuple[str, int], t_recv: float = None):
+        """
+        :param address: The ``(host, port)`` the frame was received from.
+        """
+        if t_recv is None:
+            t_recv = time.time()
+        frame = frame[:MAX_FRAME_SIZE]
+        host, port = address
+
+        os.pwrite(
+            self.fd,
+            _slot_header.pack(t_recv, socket.inet_aton(host), port, len(frame)) + frame,
+            HEADER_SIZE + self.next_slot * SLOT_SIZE,
+        )
+
+        self.next_slot += 1
+        if self.next_slot >= self.slot_count:
+            self.next_slot, self.wrapped = 0, True
+        self._write_header()
+
+    def close(self):
+        os.close(self.fd)
+
+
+def read_log(
+    path: Union[str, Path],
+) -> Iterator[Tuple[float, Optional[Tuple[str, int]], bytes]]:
+    """
+    Yield the ``(receive time, sender address, frame)`` of every frame in a log,
+    oldest first.
+
+    The address is ``None`` in logs of the first version, which didn't store it.
+    """
+    with open(path, "rb") as f:
+        magic, slot_size, slot_count, next_slot, wrapped = _header.unpack(
+            f.read(HEADER_SIZE)[: _header.size]
+        )
+        if magic not in (MAGIC, MAGIC_V1):
+            raise ValueError(f"{str(path)!r} is not a muro flight log.")
+
+        order = range(next_slot, slot_count) if wrapped else range(0)
+        for slots in (order, range(0, next_slot)):
+            for slot in slots:
+                f.seek(HEADER_SIZE + slot * slot_size)
+                data = f.read(slot_size)
+                if magic == MAGIC_V1:
+                    t_recv, size = _slot_header_v1.unpack_from(data)
+                    address, start = None, _slot_header_v1.size
+                else:
+                    t_recv, host, port, size = _slot_header.unpack_from(data)
+                    address, start = (socket.inet_ntoa(host), port), _slot_header.size
+                yield t_recv, address, data[start : start + size]
+
+
+def record(path: Union[str, Path], max_size: int = DEFAULT_MAX_SIZE):
+    """Record the frames from remotes, without acting on them."""
+    recorder = FlightRecorder(path, max_size)
+    with unetwork.Peer(settings.udp_port) as peer:
+        while True:
+            recorder.append(*peer.recv())
+
+
+def replay(
+    path: Union[str, Path],
+    speed: float = 1.0,
+    *,
+    host: str = "127.0.0.1",
+    port: int = None,
+    namespace: str = unetwork.DEFAULT_NAMESPACE,
+):
+    """
+    Send the frames in a log to a daemon.
+
+    Every remote in the log is replayed from a socket of its own,
+    so that the daemon tells them apart, as it did when they were recorded.
+
+    :param speed: How many times faster than the original to go,
+        ``None`` for as fast as possible.
+
+    Note:
+        The daemon discards frames with sequence numbers older than the ones it has seen,
+        so replay into a freshly started daemon.
+    """
+    if port is None:
+        port = settings.udp_port
+    namespace_bytes = namespace.encode("utf-8")
+
+    # sender address -> the socket replaying it.
+    socks = {}
+    count = 0
+    start, first_t_recv = time.monotonic(), None
+
+    try:
+        for t_recv, address, frame in read_log(path):
+            if speed is not None:
+                if first_t_recv is None:
+                    first_t_recv = t_recv
+                delay = start + (t_recv - first_t_recv) / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+            try:
+                sock = socks[address]
+            except KeyError:
+                sock = socks[address] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.sendto(namespace_bytes + frame, (host, port))
+            count += 1
+    finally:
+        for sock in socks.values():
+            sock.close()
+
+    return count
@@ -0,0 +1,97 @@
+from machine import Pin, disable_irq, enable_irq
+from utime import ticks_diff, ticks_ms
+
+from muro.common import settings
+
+# In the order of the buttons on the wire.
+PINS = (settings.Buttons.pause, settings.Buttons.next, settings.Buttons.prev)
+
+
+class Buttons:
+    """
+    Watches the buttons with pin interrupts, so that no press is missed,
+    even while the main loop is busy reading the dials.
+
+    Edges are debounced in software, and queued with their ``ticks_ms()`` time,
+    for :py:meth:`get` to hand out, oldest first.
+
+    :param pins: (Optional) The pin numbers of the buttons. (pulled up, active low)
+    :param debounce_ms: (Optional) How long a button takes to settle, after an edge.
+    :param queue_size: (Optional) Max edges queued. When full, the oldest is dropped.
+    """
+
+    def __init__(self, pins=PINS, debounce_ms=None, queue_size=16):
+        if debounce_ms is None:
+            debounce_ms = settings.Buttons.debounce
+        self.debounce_ms = debounce_ms
+
+        self.pins = [Pin(number, Pin.IN, Pin.PULL_UP) for number in pins]
+        # the debounced state of every button, and when it last changed.
+        self.pressed = [not pin.value() for pin in self.pins]
+        self._changed_at = [ticks_ms()] * len(self.pins)
+
+        # A ring buffer of [button, pressed, tick].
+        # Allocated up front, since it's filled from interrupt handlers.
+        self._queue = [[0, False, 0] for _ in range(queue_size)]
+        self._head = 0
+        self._tail = 0
+        self.overflows = 0
+
+        for index, pin in enumerate(self.pins):
+            pin.irq(
+                trigger=Pin.IRQ_FALLING | Pin.IRQ_RISING, handler=self._handler(index)
+            )
+
+    def _handler(self, index):
+        edge = self._edge
+        pressed = self.pressed
+
+        def handler(pin):
+            level = not pin.value()
+            if level != pressed[index]:
+                edge(index, level, ticks_ms())
+
+        return handler
+
+    def _edge(self, index, pressed, now):
+        if ticks_diff(now, self._changed_at[index]) < self.debounce_ms:
+            # still bouncing. If it was a real edge, poll() catches it once settled.
+            return
+        self.pressed[index] = pressed
+        self._changed_at[index] = now
+
+        entry = self._queue[self._tail]
+        entry[0], entry[1], entry[2] = index, pressed, now
+
+        size = len(self._queue)
+        self._tail = (self._tail + 1) % size
+        if self._tail == self._head:
+            self._head = (self._head + 1) % size
+            self.overflows += 1
+
+    def poll(self):
+        """
+        Queue the edges that were taken for bounces, but turned out to be real.
+        (e.g. a tap shorter than the debounce time) Call this often.
+        """
+        now = ticks_ms()
+        for index, pin in enumerate(self.pins):
+            pressed = not pin.value()
+            if pressed != self.pressed[index]:
+                state = disable_irq()
+                try:
+                    self._edge(index, pressed, now)
+                finally:
+                    enable_irq(state)
+
+    def get(self):
+        """Return the oldest queued edge as ``(button, pressed, tick)``, or ``None``."""
+        state = disable_irq()
+        try:
+            if self._head == self._tail:
+                return None
+            index, pressed, tick = self._queue[self._head]
+            self._head = (self._head + 1) % len(self._queue)
+        finally:
+            enable_irq(state)
+        return index, pressed, tick
@@ -0,0 +1,91 @@
+import uos as os
+from utime import ticks_add, ticks_diff, ticks_ms
+
+from muro.common import settings
+from muro.micropython.sampler import Sampler
+
+# The limits of the dials are kept here, across reboots.
+# Each line is: <dial> <min> <max>
+CALIBRATION_FILE = "muro_calibration"
+
+# (name, ADC channel) of the dials.
+DIALS = (("volume", settings.Dials.volume), ("brightness", settings.Dials.brigtness))
+
+
+def load_limits():
+    """Return the saved limits, as a dict of dial -> ``(min, max)``."""
+    limits = {}
+    try:
+        with open(CALIBRATION_FILE) as f:
+            for line in f:
+                name, low, high = line.split()
+                limits[name] = (int(low), int(high))
+    except (OSError, ValueError):
+        pass
+    return limits
+
+
+def save_limits(limits):
+    # write a new file & swap it in, so that a power cut can't leave half a file.
+    tmp_file = CALIBRATION_FILE + ".tmp"
+    try:
+        with open(tmp_file, "w") as f:
+            for name, (low, high) in limits.items():
+                f.write("{} {} {}\n".format(name, low, high))
+        os.rename(tmp_file, CALIBRATION_FILE)
+    except OSError:
+        pass
+
+
+class Calibration:
+    """
+    Saves the limits of the dials, as they widen while in use.
+
+    Flash wears out with writes, so it saves at most every
+    ``settings.Dials.calibration_save_interval`` sec, and only if the limits changed.
+
+    :param dials: A dict of name -> :py:class:`DialMap`.
+    """
+
+    def __init__(self, dials):
+        self.dials = dials
+        self._saved = {name: dial.limits for name, dial in dials.items()}
+
+        self._interval_ms = int(settings.Dials.calibration_save_interval * 1000)
+        self._checked_at = ticks_ms()
+
+    def poll(self):
+        now = ticks_ms()
+        if ticks_diff(now, self._checked_at) < self._interval_ms:
+            return
+        self._checked_at = now
+
+        limits = {name: dial.limits for name, dial in self.dials.items()}
+        if limits != self._saved:
+            save_limits(limits)
+            self._saved = limits
+
+
+def calibrate(adc, seconds=10):
+    """
+    Sample the dials for ``seconds``, while they're turned all the way both ways,
+    then save (and print) their limits.
+    """
+    sampler = Sampler(adc, settings.Dials.read_speed, [channel for _, channel in DIALS])
+    lows = [None] * len(DIALS)
+    highs = [None] * len(DIALS)
+
+    end = ticks_add(ticks_ms(), int(seconds * 1000))
+    while ticks_diff(end, ticks_ms()) > 0:
+        if not sampler.poll():
+            continue
+        for i, value in enumerate(sampler.values):
+            if lows[i] is None or value < lows[i]:
+                lows[i] = value
+            if highs[i] is None or value > highs[i]:
+                highs[i] = value
+
+    limits = {name: (lows[i], highs[i]) for i, (name, _) in enumerate(DIALS)}
+    save_limits(limits)
+    for name, (low, high) in limits.items():
+        print(name, low, high)
@@ -1,11 +1,28 @@
+try:
+    from array import array
+except ImportError:
+    from uarray import array
+
+
 class Normalizer:
-    def __init__(self, start=0, stop=100):
+    """
+    Scales the raw readings of a dial to ``start`` - ``stop``,
+    learning the range of the readings as they come.
+
+    :param limits: (Optional) The ``(min, max)`` learned before, e.g. in a calibration.
+    """
+
+    def __init__(self, start=0, stop=100, limits=None):
         self.start, self.stop = start, stop
         self.min, self.max = 0, 0
 
         self._width = self.stop - self.start
         self._nm_ratio = 0
 
+        if limits is not None and limits[1] > limits[0]:
+            self.min, self.max = limits
+            self._refresh_nm_ratio()
+
     def _refresh_nm_ratio(self):
         self._nm_ratio = self._width / (self.max - self.min)
 
@@ -22,6 +39,86 @@ class Normalizer:
         return (input_value - self.min) * self._nm_ratio + self.start
 
 
+class DialFilter:
+    """
+    Smooths the raw readings of a dial, so that noise doesn't turn into frames.
+
+    Readings go through, in order:
+        - oversampling: the mean of every ``oversample`` readings makes one sample.
+        - a median of the last ``median`` samples, against spikes.
+        - an exponential moving average, against noise.
+        - a hysteresis band: the output only moves once the average has moved
+          more than ``hysteresis`` away from it.
+
+    Only uses integer math and fixed buffers, so it doesn't allocate.
+
+    :param oversample: (Optional) Readings per sample.
+    :param median: (Optional) Window of the median filter, ``1`` to turn it off.
+    :param ema_shift: (Optional) New samples are weighed by ``1 / 2**ema_shift``,
+        ``0`` to turn it off.
+    :param hysteresis: (Optional) Width of the hysteresis band, in raw units.
+    """
+
+    def __init__(self, oversample=1, median=3, ema_shift=1, hysteresis=0):
+        if oversample < 1 or median < 1 or ema_shift < 0 or hysteresis < 0:
+            raise ValueError("DialFilter parameters must be positive.")
+        self.oversample = oversample
+        self.ema_shift = ema_shift
+        self.hysteresis = hysteresis
+
+        self._sum = 0
+        self._count = 0
+
+        self._window = [0] * median
+        self._sorted = [0] * median
+        self._pos = 0
+        self._filled = 0
+
+        self._ema = None  # scaled up by 2**ema_shift
+        self.value = None
+
+    def _median(self, sample):
+        window = self._window
+        size = len(window)
+        window[self._pos] = sample
+        self._pos = (self._pos + 1) % size
+        if self._filled < size:
+            self._filled += 1
+
+        # insertion sort the filled part of the window into the scratch buffer.
+        ordered = self._sorted
+        n = self._filled
+        for i in range(n):
+            ordered[i] = window[i]
+            j = i
+            while j and ordered[j - 1] > ordered[j]:
+                ordered[j - 1], ordered[j] = ordered[j], ordered[j - 1]
+                j -= 1
+        return ordered[n // 2]
+
+    def __call__(self, reading):
+        """Feed a raw reading, and return the filtered value."""
+        self._sum += reading
+        self._count += 1
+        if self._count < self.oversample:
+            return reading if self.value is None else self.value
+        sample = self._sum // self._count
+        self._sum = self._count = 0
+
+        sample = self._median(sample)
+
+        if self._ema is None:
+            self._ema = sample << self.ema_shift
+        else:
+            self._ema += sample - (self._ema >> self.ema_shift)
+        average = self._ema >> self.ema_shift
+
+        value = self.value
+        if value is None or abs(average - value) > self.hysteresis:
+            self.value = average
+        return self.value
+
+
 def linspace(start, stop, num):
     delta = (stop - start) / (num - 1)
     return [start + (delta * i) for i in range(num)]
@@ -52,25 +149,58 @@ def _gen_dial_points(dial_zones, output_items):
 
 
 class DialMap:
-    def __init__(self, output_items, deadzone=0, autosort=False):
+    """
+    Maps the raw readings of a dial to ``output_items``, in zones with deadzones between.
+
+    Zones are kept as tables of their bounds, and found arithmetically,
+    rather than with a dict of every dial point, to save heap on the board.
+
+    :param limits: (Optional) The ``(min, max)`` of the raw readings, as calibrated.
+    """
+
+    def __init__(self, output_items, deadzone=0, autosort=False, limits=None):
         self._store = output_items[0]
 
         count = len(output_items)
-        self._nm = Normalizer(stop=count * 2 if count > 50 else 100)
+        self._nm = Normalizer(stop=count * 2 if count > 50 else 100, limits=limits)
         if autosort:
             output_items = sorted(output_items)
-        self.mapping = {
-            dial_point: output_item
-            for dial_point, output_item in _gen_dial_points(
-                _gen_dial_zones(self._nm.start, self._nm.stop, count, deadzone),
-                output_items,
-            )
-        }
+        self._output_items = output_items
+
+        typecode = "H" if self._nm.stop < 0xFFFF else "I"
+        self._starts, self._stops = array(typecode), array(typecode)
+        for zone in _gen_dial_zones(self._nm.start, self._nm.stop, count, deadzone):
+            self._starts.append(zone.start)
+            self._stops.append(max(zone.stop, zone.start))
+        # dial points per zone, to guess the zone of a point.
+        self._zone_width = (self._nm.stop - self._nm.start) / count
+
+    @property
+    def limits(self):
+        """The ``(min, max)`` of the raw readings seen so far."""
+        return self._nm.min, self._nm.max
+
+    def _find_zone(self, dial_point):
+        """The index of the zone containing ``dial_point``, or ``-1``."""
+        starts = self._starts
+        last = len(starts) - 1
+        if last < 0 or dial_point < starts[0]:
+            return -1
+
+        # the guess is off by one at most, because of rounding.
+        i = int((dial_point - self._nm.start) / self._zone_width)
+        if i > last:
+            i = last
+        while starts[i] > dial_point:
+            i -= 1
+        while i < last and starts[i + 1] <= dial_point:
+            i += 1
+
+        return i if dial_point < self._stops[i] else -1
 
     def __getitem__(self, dial_input):
         dial_point = int(self._nm.normalize(dial_input))
-        try:
-            self._store = self.mapping[dial_point]
-        except KeyError:
-            pass
+        i = self._find_zone(dial_point)
+        if i >= 0:
+            self._store = self._output_items[i]
         return self._store
@@ -0,0 +1,86 @@
+from utime import ticks_diff, ticks_ms
+
+from muro.common import protocol, settings
+
+# The address of the last known host is kept here, across reboots.
+HOST_FILE = "muro_host"
+
+
+def load_host():
+    try:
+        with open(HOST_FILE) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def save_host(host):
+    try:
+        with open(HOST_FILE, "w") as f:
+            f.write(host)
+    except OSError:
+        pass
+
+
+class Discovery:
+    """
+    Finds a host to send frames to, so that they can be unicast.
+
+    A hello is sent every ``settings.Discovery.hello_interval`` sec,
+    (broadcast, until a host is known) and the hosts reply to it.
+
+    If the host stops replying, :py:attr:`host` goes back to ``None``, i.e. broadcast.
+
+    The replies are read by the caller, and passed on to :py:meth:`on_ack`.
+    """
+
+    def __init__(self, peer):
+        self.peer = peer
+        self.host = load_host()
+
+        self._seq = 0
+        self._last_hello = None
+        self._last_ack = ticks_ms()
+        self.awaiting_ack = False
+
+        self._interval_ms = int(settings.Discovery.hello_interval * 1000)
+        self._timeout_ms = int(settings.Discovery.timeout * 1000)
+
+    def poll(self):
+        now = ticks_ms()
+
+        if (
+            self._last_hello is None
+            or ticks_diff(now, self._last_hello) >= self._interval_ms
+        ):
+            self._seq = (self._seq + 1) & protocol.SEQ_MASK
+            self.peer.send(
+                protocol.pack_header(
+                    protocol.VERSION, protocol.KIND_HELLO, self._seq, now
+                ),
+                self.host,
+            )
+            self._last_hello = now
+            self.awaiting_ack = True
+
+        if (
+            self.host is not None
+            and ticks_diff(now, self._last_ack) >= self._timeout_ms
+        ):
+            print("Host {} stopped replying, back to broadcast.".format(self.host))
+            self.host = None
+
+    def on_ack(self, seq, address):
+        # every host acks a broadcast hello, the first one wins the round.
+        if not self.awaiting_ack or seq != self._seq:
+            return
+
+        self.awaiting_ack = False
+        self._last_ack = ticks_ms()
+
+        host = address[0]
+        if host != self.host:
+            print("Found host:", host)
+            if host != load_host():
+                save_host(host)
+            self.host = host
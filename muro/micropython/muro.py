@@ -1,23 +1,46 @@
-import ustruct as struct
 from machine import I2C, Pin
+from urandom import getrandbits
+from utime import ticks_diff, ticks_ms
 
-from muro.common import settings, unetwork
+from muro.common import protocol, reliable, settings, unetwork
 from muro.micropython import ads1x15, dialmap
+from muro.micropython.buttons import Buttons
+from muro.micropython.calibration import Calibration, load_limits
+from muro.micropython.discovery import Discovery
+from muro.micropython.sampler import Sampler
+
+
+def init_adc():
+    i2c = I2C(scl=Pin(settings.Dials.scl), sda=Pin(settings.Dials.sda), freq=40000)
+    return ads1x15.ADS1115(i2c, address=72, gain=1)
 
 
 def main():
     # init Dials
-    i2c = I2C(scl=Pin(settings.Dials.scl), sda=Pin(settings.Dials.sda), freq=40000)
-    adc = ads1x15.ADS1115(i2c, address=72, gain=1)
+    sampler = Sampler(
+        init_adc(),
+        settings.Dials.read_speed,
+        (settings.Dials.volume, settings.Dials.brigtness),
+    )
+    raw = sampler.values
 
     # init buttons
-    get_pause_btn = Pin(settings.Buttons.pause, Pin.IN, Pin.PULL_UP).value
-    get_next_btn = Pin(settings.Buttons.next, Pin.IN, Pin.PULL_UP).value
-    get_prev_btn = Pin(settings.Buttons.prev, Pin.IN, Pin.PULL_UP).value
+    buttons = Buttons()
+
+    limits = load_limits()
+    vol_map = dialmap.DialMap(
+        settings.Dials.volume_range,
+        settings.Dials.deadzone,
+        limits=limits.get("volume"),
+    )
+    bright_map = dialmap.DialMap(
+        settings.Dials.brightness_range,
+        settings.Dials.deadzone,
+        limits=limits.get("brightness"),
+    )
+    calibration = Calibration({"volume": vol_map, "brightness": bright_map})
 
-    _tf_vol = dialmap.DialMap(
-        settings.Dials.volume_range, settings.Dials.deadzone
-    ).__getitem__
+    _tf_vol = vol_map.__getitem__
 
     def tf_vol(raw):
         volume = _tf_vol(raw)
@@ -25,22 +48,20 @@ def main():
             volume = 0
         return volume
 
-    tf_bright = dialmap.DialMap(
-        settings.Dials.brightness_range, settings.Dials.deadzone
-    ).__getitem__
-    adcread = adc.read
-
-    structfmt = ">" + "i" * 2 + "B" * 3
-
-    def read():
-        return struct.pack(
-            structfmt,
-            tf_vol(adcread(settings.Dials.read_speed, settings.Dials.volume)),
-            tf_bright(adcread(settings.Dials.read_speed, settings.Dials.brigtness)),
-            not get_pause_btn(),
-            not get_next_btn(),
-            not get_prev_btn(),
+    tf_bright = bright_map.__getitem__
+
+    filter_vol, filter_bright = (
+        dialmap.DialFilter(
+            settings.Dials.oversample,
+            settings.Dials.median,
+            settings.Dials.ema_shift,
+            settings.Dials.hysteresis,
         )
+        for _ in range(2)
+    )
+
+    def read_dials():
+        return tf_vol(filter_vol(raw[0])), tf_bright(filter_bright(raw[1]))
 
     with unetwork.Peer(
         settings.udp_port,
@@ -50,10 +71,76 @@ def main():
         retry_for=(OSError,),
     ) as peer:
         send = peer.send
+        poll_reply = peer.poll_reply
+        pack_state = protocol.pack_state
+        discovery = Discovery(peer)
+        # button presses must not get lost, so they're sent reliably.
+        sender = reliable.Sender(lambda frame: send(frame, discovery.host))
+        # `muro deploy`
+        if settings.Deploy.enabled:
+            # only then, it costs heap.
+            from muro.micropython import ota
+
+            poll_deploy = ota.Receiver(peer).poll
+        else:
+            poll_deploy = lambda: None
+
+        def handle_replies():
+            while True:
+                reply = poll_reply()
+                if reply is None:
+                    return
+                msg, address = reply
+                try:
+                    kind, seq, _ = protocol.check_header(msg)
+                except ValueError:
+                    continue
+                if kind == protocol.KIND_ACK:
+                    sender.on_ack(seq)
+                elif kind == protocol.KIND_HELLO_ACK:
+                    discovery.on_ack(seq, address)
 
-        old = None
+        def send_button_events():
+            buttons.poll()
+            while True:
+                edge = buttons.get()
+                if edge is None:
+                    return
+                button, pressed, tick = edge
+                sender.send(
+                    protocol.KIND_BUTTON_EVENT,
+                    protocol.pack_button_event_body(button, pressed),
+                    tick,
+                )
+
+        # Start at a random point, so that the host doesn't take the frames of a
+        # rebooted board (which likely gets the same port) for reordered ones.
+        seq = getrandbits(30)
+        old_dials = None
+        read_at = ticks_ms()
         while True:
-            new = read()
-            if old != new:
-                send(new)
-                old = new
+            discovery.poll()
+            if discovery.awaiting_ack or sender.in_flight:
+                handle_replies()
+            sender.poll()
+            send_button_events()
+            calibration.poll()
+            poll_deploy()
+
+            if ticks_diff(ticks_ms(), read_at) < settings.Dials.sample_interval:
+                continue
+            # the conversions run in the background, between polls.
+            if not sampler.poll():
+                continue
+            read_at = ticks_ms()
+
+            dials = read_dials()
+            if old_dials != dials:
+                seq = (seq + 1) & protocol.SEQ_MASK
+                send(
+                    pack_state(
+                        protocol.VERSION, protocol.KIND_STATE, seq, ticks_ms(), *dials
+                    ),
+                    discovery.host,
+                )
+                old_dials = dials
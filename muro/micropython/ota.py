@@ -0,0 +1,305 @@
+"""
+Receives code over the network, from `muro deploy`. (see :py:mod:`muro.deploy`)
+
+Files are staged in :py:data:`STAGING_DIR` first, and only swapped in (by renaming them)
+once they've all arrived, and their hashes check out.
+The renames are written to a journal up front, which is replayed at boot,
+so that a reboot halfway through the swap can't leave a mix of old & new code.
+"""
+
+import uhashlib
+import uos
+from machine import reset
+from ubinascii import hexlify
+from utime import sleep_ms, ticks_add, ticks_diff, ticks_ms
+
+from muro.common import protocol, settings
+
+# Written by `muro install` & `muro deploy`, one "path size sha1" line per file.
+MANIFEST_FILE = "muro_manifest"
+# One "<staged path> <path>" line per rename, or "<path>" per removal.
+JOURNAL_FILE = "muro_ota_journal"
+STAGING_DIR = "muro_ota"
+
+# Where the path / data start, in a file / chunk request.
+_FILE_PATH_AT = protocol.HEADER_SIZE + 24
+_CHUNK_DATA_AT = protocol.HEADER_SIZE + 4
+
+# A deploy is taken to be going on for this long (in ms) after a request.
+DEPLOYING_MS = 1000
+
+_buf = bytearray(512)
+
+
+def get_parent_path(path):
+    return "/".join(path.split("/")[:-1])
+
+
+def mkdir_p(dir):
+    if dir:
+        mkdir_p(get_parent_path(dir))
+        try:
+            uos.mkdir(dir)
+        except OSError:
+            pass
+
+
+def hash_file(path):
+    """The sha1 of a file (read in chunks), or ``None`` if there's no such file."""
+    sha1 = uhashlib.sha1()
+    view = memoryview(_buf)
+    try:
+        with open(path, "rb") as fp:
+            while True:
+                size = fp.readinto(_buf)
+                if not size:
+                    break
+                sha1.update(view[:size])
+    except OSError:
+        return None
+    return sha1.digest()
+
+
+def is_valid_path(path):
+    """
+    Whether a deploy may write to ``path``: relative, and within the project's
+    directory, without whitespace (the manifest & journal are split on it),
+    and not in the way of the deploy itself.
+    """
+    parts = path.split("/")
+    return (
+        path.split() == [path]
+        and "" not in parts
+        and "." not in parts
+        and ".." not in parts
+        and parts[0] not in (STAGING_DIR, JOURNAL_FILE, JOURNAL_FILE + ".tmp")
+    )
+
+
+def read_manifest(path=MANIFEST_FILE):
+    """Returns ``{path: (size, sha1 in hex)}``, of the files in a manifest."""
+    manifest = {}
+    try:
+        with open(path) as fp:
+            for line in fp:
+                file, size, file_hash = line.split()
+                manifest[file] = (int(size), file_hash)
+    except OSError:
+        pass
+    return manifest
+
+
+def apply_journal():
+    """Finish swapping in the staged files, if it was interrupted. Call this at boot."""
+    try:
+        fp = open(JOURNAL_FILE)
+    except OSError:
+        return
+
+    with fp:
+        for line in fp:
+            paths = line.split()
+            try:
+                if len(paths) == 2:
+                    uos.rename(paths[0], paths[1])
+                else:
+                    uos.remove(paths[0])
+            except OSError:
+                pass  # done already, before the reboot.
+    uos.remove(JOURNAL_FILE)
+
+
+class Receiver:
+    """
+    Answers the requests of `muro deploy`, read from the peer's own port.
+
+    While a deploy is going on, :py:meth:`poll` checks for requests every time,
+    otherwise only every ``settings.Deploy.poll_interval`` sec.
+
+    :param peer: The :py:class:`unetwork.Peer`.
+    """
+
+    def __init__(self, peer):
+        self.peer = peer
+        self._interval_ms = int(settings.Deploy.poll_interval * 1000)
+        self._polled_at = ticks_ms()
+        self._deploying_at = ticks_add(self._polled_at, -DEPLOYING_MS)
+
+        # the file being staged, and its (size, sha1).
+        self._file = None
+        self._path = None
+        self._expected = None
+        # {path: sha1 in hex} of the files staged (& verified) since the last commit.
+        self._staged = {}
+        self._manifest = None
+        self._reboot = False
+
+    def poll(self):
+        now = ticks_ms()
+        if ticks_diff(now, self._polled_at) < self._interval_ms:
+            return
+
+        while True:
+            msg = self.peer.poll_recv()
+            if msg is None:
+                break
+            if self._handle(*msg):
+                self._deploying_at = now
+
+        # while a deploy is going on, don't wait to check for the next request.
+        if ticks_diff(now, self._deploying_at) >= DEPLOYING_MS:
+            self._polled_at = now
+
+    def _handle(self, msg, address):
+        try:
+            kind, seq, _ = protocol.check_header(msg)
+        except ValueError:
+            return False
+
+        try:
+            if kind == protocol.KIND_DEPLOY_FILE:
+                status = self._on_file(msg)
+            elif kind == protocol.KIND_DEPLOY_CHUNK:
+                status = self._on_chunk(msg)
+            elif kind == protocol.KIND_DEPLOY_VERIFY:
+                status = self._on_verify()
+            elif kind == protocol.KIND_DEPLOY_COMMIT:
+                status = self._on_commit()
+            elif kind == protocol.KIND_DEPLOY_PROBE:
+                status = protocol.DEPLOY_OK
+            else:
+                return False
+        except OSError as e:
+            # e.g. the flash is full.
+            print("Deploy failed:", e)
+            self._close()
+            status = protocol.DEPLOY_FAILED
+
+        self.peer.reply(
+            protocol.pack_header(
+                protocol.VERSION,
+                protocol.KIND_DEPLOY_REPLY,
+                seq,
+                ticks_ms() & protocol.SEQ_MASK,
+            )
+            + bytes((status,)),
+            address,
+        )
+
+        if self._reboot:
+            print("Deployed, rebooting...")
+            sleep_ms(100)  # for the reply to get out.
+            reset()
+        return True
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _is_installed(self, path, size, sha1):
+        try:
+            if uos.stat(path)[6] != size:
+                return False
+        except OSError:
+            return False
+
+        if self._manifest is None:
+            self._manifest = read_manifest()
+        if path in self._manifest:
+            return self._manifest[path] == (size, hexlify(sha1).decode())
+        return hash_file(path) == sha1
+
+    def _on_file(self, msg):
+        size, sha1 = protocol.unpack_deploy_file_body(msg, protocol.HEADER_SIZE)
+        try:
+            path = msg[_FILE_PATH_AT:].decode()
+        except UnicodeError:
+            return protocol.DEPLOY_FAILED
+        if not is_valid_path(path):
+            print("Deploy refused:", repr(path))
+            return protocol.DEPLOY_FAILED
+
+        if self._file is not None and (path, (size, sha1)) == (
+            self._path,
+            self._expected,
+        ):
+            return protocol.DEPLOY_OK  # the reply got lost, it's open already.
+        self._close()
+
+        if self._staged.get(path) == hexlify(sha1).decode():
+            return protocol.DEPLOY_STAGED
+        if self._is_installed(path, size, sha1):
+            return protocol.DEPLOY_INSTALLED
+
+        staged = STAGING_DIR + "/" + path
+        if hash_file(staged) == sha1:
+            # by a deploy that got interrupted.
+            self._staged[path] = hexlify(sha1).decode()
+            return protocol.DEPLOY_STAGED
+
+        mkdir_p(get_parent_path(staged))
+        self._file = open(staged, "wb")
+        self._path, self._expected = path, (size, sha1)
+        return protocol.DEPLOY_OK
+
+    def _on_chunk(self, msg):
+        if self._file is None:
+            return protocol.DEPLOY_FAILED
+        offset = protocol.unpack_deploy_chunk_body(msg, protocol.HEADER_SIZE)[0]
+        # chunks may come out of order, or more than once.
+        self._file.seek(offset)
+        self._file.write(memoryview(msg)[_CHUNK_DATA_AT:])
+        return protocol.DEPLOY_OK
+
+    def _on_verify(self):
+        if self._file is None:
+            # the reply got lost, if it was verified already.
+            if self._path in self._staged:
+                return protocol.DEPLOY_STAGED
+            return protocol.DEPLOY_FAILED
+        self._close()
+
+        size, sha1 = self._expected
+        staged = STAGING_DIR + "/" + self._path
+        if uos.stat(staged)[6] != size or hash_file(staged) != sha1:
+            return protocol.DEPLOY_FAILED
+        self._staged[self._path] = hexlify(sha1).decode()
+        return protocol.DEPLOY_STAGED
+
+    def _on_commit(self):
+        self._close()
+        if not self._staged:
+            # nothing to swap in. (or the reply got lost, and it rebooted already)
+            return protocol.DEPLOY_OK
+
+        installed = read_manifest()
+        if MANIFEST_FILE in self._staged:
+            wanted = read_manifest(STAGING_DIR + "/" + MANIFEST_FILE)
+        else:
+            wanted = installed
+
+        lines = []
+        for path in self._staged:
+            if path != MANIFEST_FILE:
+                mkdir_p(get_parent_path(path))
+                lines.append(STAGING_DIR + "/" + path + " " + path)
+        for path in installed:
+            if path not in wanted and is_valid_path(path):
+                lines.append(path)
+        if MANIFEST_FILE in self._staged:
+            # last, so that it only lists the files once they're all in place.
+            lines.append(STAGING_DIR + "/" + MANIFEST_FILE + " " + MANIFEST_FILE)
+
+        # the journal is complete, or not there at all.
+        with open(JOURNAL_FILE + ".tmp", "w") as fp:
+            for line in lines:
+                fp.write(line)
+                fp.write("\n")
+        uos.rename(JOURNAL_FILE + ".tmp", JOURNAL_FILE)
+        apply_journal()
+
+        self._staged = {}
+        self._manifest = None
+        self._reboot = True
+        return protocol.DEPLOY_OK
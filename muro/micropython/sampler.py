@@ -0,0 +1,59 @@
+from utime import ticks_diff, ticks_ms
+
+# Samples per second of the ADS1115, by data rate index.
+DATA_RATES = (8, 16, 32, 64, 128, 250, 475, 860)
+
+
+class Sampler:
+    """
+    Samples several channels of an ADS1115 round-robin, without ever waiting on it.
+
+    Conversions are pipelined with :py:meth:`ADS1115.read_rev`:
+    reading the result of one conversion starts the next one, on the next channel,
+    so that it runs while the main loop does its other work.
+    Instead of polling the ADC until a conversion is done,
+    the result is read once it's due, going by the data rate.
+
+    :param adc: The :py:class:`ADS1115`.
+    :param rate: The data rate index, as for :py:meth:`ADS1115.read`.
+    :param channels: The channels to sample.
+    """
+
+    def __init__(self, adc, rate, channels):
+        self.adc = adc
+        self.values = [0] * len(channels)
+
+        # The data rate is only accurate to 10%, and then there's the I2C transfer.
+        self.conversion_ms = 11000 // (DATA_RATES[rate] * 10) + 1
+
+        # The config of every channel, so that switching doesn't allocate.
+        self._modes = []
+        for channel in channels:
+            adc.set_conv(rate, channel)
+            self._modes.append(adc.mode)
+
+        self._index = 0
+        adc.mode = self._modes[0]
+        adc.read_rev()  # starts the first conversion.
+        self._started_at = ticks_ms()
+
+    def poll(self):
+        """
+        Collect the conversion if it's due, and start the next one.
+
+        Returns ``True`` every time a new value of every channel is in :py:attr:`values`.
+        """
+        now = ticks_ms()
+        if ticks_diff(now, self._started_at) < self.conversion_ms:
+            return False
+
+        index = self._index
+        next_index = index + 1
+        if next_index == len(self._modes):
+            next_index = 0
+
+        self.adc.mode = self._modes[next_index]
+        self.values[index] = self.adc.read_rev()
+        self._started_at = now
+        self._index = next_index
+        return next_index == 0
@@ -1,131 +1,517 @@
+import math
 import struct
-import subprocess
-from pprint import pprint
-from time import sleep
-from typing import Iterable, Union
+from time import monotonic, sleep
+from typing import Iterable, List
 
-import numpy as np
-import pulsectl
-import zproc
-
-from muro.common import settings, unetwork
-from muro.util import Logger
+from muro.backlight import BrightnessUpdater
+from muro.common import protocol, reliable, settings, unetwork
+from muro.flightlog import DEFAULT_MAX_SIZE, FlightRecorder
+from muro.player import get_player
+from muro.stats import stats
+from muro.util import Logger, rss_kib, tree_pids
 
 log = Logger()
 
-structfmt = ">" + "i" * 2 + "B" * 3
+SEEK_DIRECTIONS = {"next": 1, "previous": -1}
+
+DIALS = ("volume", "brightness")
+BUTTONS = ("pause", "next", "previous")
+
+# Tells :py:class:`Seeker` to read the track itself.
+_UNREAD = object()
 
 
 def unpack(bytes_data):
-    data = struct.unpack(structfmt, bytes_data)
+    """
+    Returns the kind & sequence number of a frame, and its contents as a dict.
 
-    return {
-        "volume": data[0],
-        "brightness": data[1],
-        "pause": data[2],
-        "next": data[3],
-        "previous": data[4],
-    }
+    Raises ``ValueError`` if the frame can't be read.
+    """
+    kind, seq, _ = protocol.check_header(bytes_data)
+    base_kind = kind & ~protocol.FLAG_RELIABLE
 
+    try:
+        if kind & protocol.FLAG_RELIABLE:
+            # skip the oldest unacked seq, the bodies are unpacked along with the header.
+            bytes_data = (
+                bytes_data[: protocol.HEADER_SIZE]
+                + bytes_data[protocol.HEADER_SIZE + protocol.RELIABLE_SIZE :]
+            )
 
-def send_command_to_player(*cmd):
-    cmd = ["playerctl", "--all-players", *cmd]
-    log.cmd_info(cmd)
-    return subprocess.Popen(cmd)
+        if base_kind == protocol.KIND_STATE:
+            data = protocol.unpack_state(bytes_data)
+            contents = {"volume": data[4], "brightness": data[5]}
+        elif base_kind == protocol.KIND_BUTTONS:
+            data = protocol.unpack_buttons(bytes_data)
+            contents = {"pause": data[4], "next": data[5], "previous": data[6]}
+        elif base_kind == protocol.KIND_BUTTON_EVENT:
+            data = protocol.unpack_button_event(bytes_data)
+            if data[4] >= len(BUTTONS):
+                raise ValueError(f"Unknown button: {data[4]}")
+            contents = {BUTTONS[data[4]]: data[5]}
+        elif base_kind == protocol.KIND_HELLO:
+            contents = {}
+        else:
+            raise ValueError(f"Unexpected frame kind: {kind}")
+    except struct.error as e:
+        raise ValueError(e)
 
+    return kind, seq, contents
 
-def set_volume(pulse, value: Union[float, int]):
-    for source in pulse.sink_input_list():
-        try:
-            pulse.volume_set_all_chans(source, value / 100)
-        except pulsectl.PulseOperationFailed as e:
-            print(e)
-    log.info(f"Set volume: {value}%")
 
+class Remote:
+    """
+    Keeps track of the frames & state of a single remote.
+
+    :py:meth:`on_frame` returns the reply to send back to the remote (or ``None``),
+    and the list of ``(key, value)`` changes to act on, in order.
+
+    Buttons come either as snapshots of all of them (``KIND_BUTTONS``),
+    or as press / release events (``KIND_BUTTON_EVENT``) from interrupt driven boards.
+
+    :param actions: (Optional) The keys to report changes of. Changes of others are
+        only tracked. With no actions at all, the remote is ignored altogether.
+    """
+
+    def __init__(self, actions: Iterable[str] = DIALS + BUTTONS):
+        self.actions = frozenset(actions)
+        self.state = {}
+        self.last_seen = None
+
+        self.seq_tracker = protocol.SeqTracker()
+        self.receiver = reliable.Receiver()
+
+    def on_frame(self, bytes_data):
+        if not self.actions:
+            return None, []
+
+        reply, updates = self._receive(bytes_data)
+        if not updates:
+            return reply, []
+
+        changes = []
+        state, actions = self.state, self.actions
+        for kind, update in updates:
+            for key, value in update.items():
+                old_value = state.get(key)
+                if old_value == value:
+                    continue
+                state[key] = value
+
+                # The first snapshot only sets the initial position of the buttons,
+                # while button events are edges already.
+                if key in actions and (
+                    old_value is not None
+                    or key in DIALS
+                    or kind == protocol.KIND_BUTTON_EVENT
+                ):
+                    changes.append((key, value))
+
+        return reply, changes
+
+    def _receive(self, bytes_data):
+        kind, seq, contents = unpack(bytes_data)
+
+        if kind == protocol.KIND_HELLO:
+            ack = protocol.pack_header(
+                protocol.VERSION, protocol.KIND_HELLO_ACK, seq, 0
+            )
+            return ack, []
+
+        if kind & protocol.FLAG_RELIABLE:
+            duplicates = self.receiver.duplicates
+            ack_seq, updates = self.receiver.accept(
+                seq,
+                (kind & ~protocol.FLAG_RELIABLE, contents),
+                protocol.unpack_reliable(bytes_data),
+            )
+            stats.count("duplicate frames", self.receiver.duplicates - duplicates)
+
+            ack = protocol.pack_header(protocol.VERSION, protocol.KIND_ACK, ack_seq, 0)
+            return ack, updates
 
-def set_brightness(value: Union[float, int]):
-    cmd = ["xbacklight", "-set", str(value)]
-    log.cmd_info(cmd)
-    subprocess.Popen(cmd)
+        tracker = self.seq_tracker
+        lost, reordered = tracker.lost, tracker.reordered
+        accepted = tracker.accept(seq)
+        stats.count("lost frames", tracker.lost - lost)
+        stats.count("reordered frames", tracker.reordered - reordered)
 
+        if not accepted:
+            log.debug(f"Discarded stale frame #{seq}", tracker)
+            return None, []
+        return None, [(kind, contents)]
 
-class LastValueIterator:
-    def __init__(self, seq: Iterable):
-        super().__init__()
-        self._iter = iter(seq)
-        self._last_val = None
 
-    def __next__(self):
+class Router:
+    """
+    Keeps a :py:class:`Remote` for every device, by address,
+    routed to the actions given in :py:class:`settings.Remotes`.
+
+    This way, remotes sharing a network don't overwrite each other's state.
+
+    :param on_forget: (Optional) Called with the address of every remote forgotten.
+    """
+
+    def __init__(self, on_forget=None):
+        self.remotes = {}
+        self.on_forget = on_forget
+
+    def on_frame(self, bytes_data, address, t_recv: float):
+        """Same as :py:meth:`Remote.on_frame`, for the remote at ``address``."""
         try:
-            self._last_val = next(self._iter)
-        except StopIteration:
-            pass
+            remote = self.remotes[address]
+        except KeyError:
+            remote = self._add(address, t_recv)
+        remote.last_seen = t_recv
+        return remote.on_frame(bytes_data)
+
+    def _add(self, address, now: float):
+        self.forget_idle(now)
+
+        host = address[0]
+        actions = settings.Remotes.routes.get(host, settings.Remotes.default_route)
+        log.info(
+            f"New remote at {host}:{address[1]}, routed to: {', '.join(actions) or '-'}"
+        )
+
+        remote = self.remotes[address] = Remote(actions)
+        stats.counters["remotes"] = len(self.remotes)
+        return remote
+
+    def forget_idle(self, now: float):
+        """
+        Forget the remotes that have been silent for too long.
+
+        A board that reconnects gets a new port, and so a new :py:class:`Remote`.
+        """
+        for address, remote in list(self.remotes.items()):
+            if now - remote.last_seen > settings.Remotes.idle_timeout:
+                del self.remotes[address]
+                if self.on_forget is not None:
+                    self.on_forget(address)
+        stats.counters["remotes"] = len(self.remotes)
+
+
+class HeldButtons:
+    """
+    Merges the seek buttons of every remote into one of each, for the zproc engine,
+    where a single handler waits on a single field per button.
+
+    The latest press takes a button over: the hold of another remote (or a hold of
+    the same remote, whose release got lost) is ended by a release first,
+    and the release of a remote whose hold was taken over is ignored.
+    So presses & releases still alternate in the merged button, as its handler expects.
+    (the asyncio engine also ends the last hold on a new press, but keeps the holds
+    of different remotes apart)
+    """
+
+    def __init__(self):
+        # key -> the address of the remote holding it.
+        self.owners = {}
+
+    def update(self, address, key: str, value: int) -> List[int]:
+        """The values to set the merged button to, in order, for a change of a remote's."""
+        owner = self.owners.get(key)
+        if value:
+            self.owners[key] = address
+            return [1] if owner is None else [0, 1]
+        if owner != address:
+            return []
+        del self.owners[key]
+        return [0]
+
+    def forget(self, address) -> List[str]:
+        """The buttons to release, of a remote that's been forgotten."""
+        keys = [key for key, owner in self.owners.items() if owner == address]
+        for key in keys:
+            del self.owners[key]
+        return keys
+
+
+def seek_offset(held: float) -> float:
+    """
+    How far to seek (in sec of the track), once a button has been held for ``held`` sec,
+    going by the acceleration curve of :py:class:`settings.Seek`.
+    """
+    curve, ramp = settings.Seek.curve, settings.Seek.ramp
+    start, top = settings.Seek.start_speed, settings.Seek.max_speed
+
+    ramping = min(held, ramp)
+    if curve == "exponential":
+        growth = math.log(top / start) / ramp
+        if growth:
+            offset = start * math.expm1(growth * ramping) / growth
+        else:
+            offset = start * ramping
+    elif curve == "linear":
+        offset = start * ramping + (top - start) * ramping**2 / (2 * ramp)
+    else:
+        raise ValueError(
+            f'"curve" must be one of "exponential" or "linear", not {repr(curve)}'
+        )
+
+    # at full speed, once the ramp is over.
+    return offset + top * max(held - ramp, 0)
+
 
-        return self._last_val
+class Seeker:
+    """
+    Seeks a player while a button is held, along :py:func:`seek_offset`.
 
+    The position of the track is read once, up front. Every :py:meth:`update`
+    then sets the absolute position the curve is at (clamped to the track),
+    so a late or missed update doesn't add up, and the last one, at the release,
+    lands exactly where the button was let go.
+
+    If the player can't tell its position, it's seeked by the difference instead.
+
+    It stops after :py:attr:`settings.Seek.max_hold` sec, in case the release is lost.
+
+    :param player: The player.
+    :param cmd: "next" to seek forward, or "previous" to seek backward.
+    :param start: (Optional) When the seek started. (defaults to now)
+    :param track: (Optional) The track, if read with ``player.track()`` already.
+        (e.g. off the event loop)
+    """
+
+    def __init__(self, player, cmd: str, start: float = None, track=_UNREAD):
+        if cmd not in SEEK_DIRECTIONS:
+            raise ValueError(
+                f'"cmd" must be one of "next" or "previous", not {repr(cmd)}'
+            )
+
+        self.player = player
+        self.direction = SEEK_DIRECTIONS[cmd]
+        self.start = monotonic() if start is None else start
+        self.track = player.track() if track is _UNREAD else track
+
+        self.offset = 0.0
+        self.position = None if self.track is None else self.track.position
+
+    def update(self, now: float = None):
+        """Seek to where the curve is at ``now``. (defaults to the current time)"""
+        if now is None:
+            now = monotonic()
+        held = min(max(now - self.start, 0), settings.Seek.max_hold)
+        offset = seek_offset(held) * self.direction
+
+        if self.track is None:
+            if offset != self.offset:
+                self.player.seek(offset - self.offset)
+                self.offset = offset
+            return
+
+        position = max(self.track.position + offset, 0.0)
+        if self.track.length:
+            position = min(position, self.track.length)
+        # once it hits a boundary, there's nothing more to do.
+        if position != self.position:
+            self.player.set_position(self.track, position)
+            self.position = position
+            self.offset = offset
+
+    @property
+    def timed_out(self) -> bool:
+        """Whether it's been held for :py:attr:`settings.Seek.max_hold` sec."""
+        return monotonic() - self.start >= settings.Seek.max_hold
+
+
+def main(
+    *,
+    make_player=get_player,
+    make_volume=None,
+    make_brightness=BrightnessUpdater,
+    record: str = None,
+    record_size: int = DEFAULT_MAX_SIZE,
+):
+    """
+    Run the daemon, with every handler in its own process.
+
+    The ``make_*`` arguments are factories for the backends,
+    called inside the process that uses them.
+
+    :param record: (Optional) Path of a flight log to record the received frames to.
+    :param record_size: (Optional) Max size of the flight log, in bytes.
+    """
+
+    import zproc
+
+    from muro.sharedstate import SharedState
 
-def main():
     ctx = zproc.Context(wait=True, retry_for=(Exception,))
+    # The dials & buttons don't go through the zproc state, but a block of shared
+    # memory, created before the processes are forked. (see muro.sharedstate)
+    shared = SharedState(DIALS + BUTTONS)
 
-    ctx.state["volume"] = 100
-    ctx.state["brightness"] = 100
+    # Each handler runs in its own process, so backends are created
+    # inside the process that uses them (connections & fds can't be shared across a fork).
 
     @ctx.process
     def network(state):
+        stats.serve()
+        held = HeldButtons()
+        # zproc reruns it after an exception, the buttons held before are let go.
+        for key in SEEK_DIRECTIONS:
+            shared.set(key, 0, monotonic())
+
+        def forget(address):
+            for key in held.forget(address):
+                shared.set(key, 0, monotonic())
+
+        router = Router(on_forget=forget)
+        recorder = FlightRecorder(record, record_size) if record else None
+
         with unetwork.Peer(settings.udp_port) as peer:
+            log.info(f"Listening on UDP port {settings.udp_port}...")
             while True:
-                dict_data = unpack(peer.recv()[0])
-                log.debug(dict_data)
-                state.update(dict_data)
+                msg, address = peer.recv()
+                t_recv = monotonic()
+                stats.count("frames")
+                if recorder is not None:
+                    recorder.append(msg, address)
+
+                try:
+                    reply, changes = router.on_frame(msg, address, t_recv)
+                except ValueError as e:
+                    log.err(e)
+                    stats.count("bad frames")
+                    continue
+                stats.record("frame.unpack", t_recv)
+
+                if reply is not None:
+                    peer.reply(reply, address)
+                if not changes:
+                    continue
+
+                for key, value in changes:
+                    log.debug(address, key, value)
+                    if key == "pause":
+                        # the play/pause handler acts on every change, so flip it for
+                        # each remote's. (from the field, which outlives a rerun)
+                        values = [not shared["pause"].value]
+                    elif key in SEEK_DIRECTIONS:
+                        values = held.update(address, key, value)
+                    else:
+                        values = [value]
+                    # handlers in other processes measure their latency from t_recv.
+                    for value in values:
+                        shared.set(key, value, t_recv)
+                stats.record("frame.update", t_recv)
 
     @ctx.process
     def update_volume(state):
-        with pulsectl.Pulse("muro-volume") as pulse:
-            while True:
-                volume = state.get_when_change("volume")["volume"]
-                set_volume(pulse, volume)
-
-    @ctx.call_when_change("pause", stateful=False)
-    def play_pause(_):
-        send_command_to_player("play-pause")
-
-    @ctx.call_when_change("brightness", stateful=False)
-    def update_brightness(snapshot):
-        set_brightness(snapshot["brightness"])
-
-    def seek_btn_process_gen(key, cmd, seek_range):
-        if cmd == "next":
-            seek_cmds = [
-                f"{i:.2f}+" for i in np.geomspace(seek_range[0], seek_range[1], 50)
-            ]
-        elif cmd == "previous":
-            seek_cmds = [
-                f"{i:.2f}-" for i in np.geomspace(seek_range[0], seek_range[1], 50)
-            ]
+        stats.serve()
+        if make_volume is None:
+            # pulsectl loads libpulse on import.
+            from muro.volume import VolumeUpdater
+
+            volume = VolumeUpdater()
         else:
-            raise ValueError(
-                f'"cmd" must be one of "next" or "previous", not {repr(cmd)}'
-            )
+            volume = make_volume()
 
-        @ctx.call_when_equal(key, True)
-        def seek_btn_process(_, state):
-            log.debug(f"{key} btn pressed")
+        # from the current version, not 0: zproc reruns a handler after an exception,
+        # and the changes from before that were acted on already.
+        version = shared["volume"].version
+        while True:
+            field = shared.wait("volume", version)
+            # only the latest value is applied, the ones in between are dropped.
+            stats.count("volume dropped", field.version - version - 1)
+            version = field.version
+            stats.record("volume.dispatch", field.t_recv)
+            volume.set(field.value, field.t_recv)
 
-            try:
-                state.get_when_equal(key, False, timeout=settings.Buttons.seek_timeout)
-                send_command_to_player(cmd)
-            except TimeoutError as e:
-                log.debug(e)
-                log.info("seek forward...")
+    @ctx.process
+    def update_brightness(state):
+        stats.serve()
+        brightness = make_brightness()
 
-                seek_cmd_it = LastValueIterator(seek_cmds)
-                while state[key]:
-                    send_command_to_player("position", next(seek_cmd_it))
-                    sleep(0.1)
+        version = shared["brightness"].version
+        while True:
+            field = shared.wait("brightness", version)
+            stats.count("brightness dropped", field.version - version - 1)
+            version = field.version
+            stats.record("brightness.dispatch", field.t_recv)
+            brightness.set(field.value, field.t_recv)
+
+    @ctx.process
+    def play_pause(state):
+        stats.serve()
+        player = make_player()
 
-            log.debug(f"{key} btn released")
+        version = shared["pause"].version
+        while True:
+            field = shared.wait("pause", version)
+            # once per flip, even if several came in while it was busy.
+            for _ in range(field.version - version):
+                stats.record("play-pause.dispatch", field.t_recv)
+                player.play_pause()
+                stats.record("play-pause.done", field.t_recv)
+            version = field.version
 
-    seek_btn_process_gen("next", "next", (2, 10))
-    seek_btn_process_gen("previous", "previous", (3, 10))
+    def seek_btn_process_gen(key, cmd):
+        @ctx.process
+        def seek_btn_process(state):
+            stats.serve()
+            player = make_player()
+
+            # the version of the last release.
+            # (a button held already is taken for pressed just now)
+            field = shared[key]
+            version = field.version - field.value
+            while True:
+                field = shared.wait(key, version)
+                # presses & releases alternate, so a press that came in (and went)
+                # while it was busy is a tap.
+                taps, pressed = divmod(field.version - version, 2)
+                for _ in range(taps):
+                    getattr(player, cmd)()
+                if not pressed:
+                    version = field.version
+                    continue
+
+                log.debug(f"{key} btn pressed")
+                stats.record(f"{cmd}.dispatch", field.t_recv)
+
+                released = shared.wait(
+                    key, field.version, timeout=settings.Buttons.seek_timeout
+                )
+                if released is not None:
+                    getattr(player, cmd)()
+                    stats.record(f"{cmd}.done", released.t_recv)
+                else:
+                    log.info("seek forward...")
+
+                    seeker = Seeker(player, cmd)
+                    while released is None and not seeker.timed_out:
+                        released = shared.wait(
+                            key, field.version, timeout=1 / settings.Seek.tick_rate
+                        )
+                        if released is None:
+                            seeker.update()
+                    if released is None:
+                        log.info(f"{key} btn held for too long, stopped seeking")
+                    else:
+                        # back to where it was when the button was released.
+                        seeker.update(released.t_recv)
+
+                log.debug(f"{key} btn released")
+                # any presses after the release are handled next time around.
+                version = field.version + 1
+
+    seek_btn_process_gen("next", "next")
+    seek_btn_process_gen("previous", "previous")
+
+    from pprint import pprint
 
     pprint(ctx.process_list)
+
+    try:
+        while True:
+            sleep(settings.Stats.report_interval)
+            pids = tree_pids()
+            log.info(
+                f"[zproc] rss: {sum(map(rss_kib, pids))} KiB, processes: {len(pids)}"
+            )
+    finally:
+        shared.close()
+        shared.unlink()
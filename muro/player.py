@@ -0,0 +1,274 @@
+"""
+Media player backends.
+
+The default backend talks to MPRIS players directly over D-Bus,
+keeping a single connection open for the lifetime of the process.
+
+"playerctl" is kept around as a fallback,
+for setups where the session bus is not reachable.
+
+Besides the relative :py:meth:`seek`, players can tell the position of the track
+they're playing (:py:meth:`track`), and be set to an absolute one
+(:py:meth:`set_position`), for seeking without overshooting.
+"""
+
+import threading
+from typing import NamedTuple, Optional
+
+from muro.common import settings
+from muro.util import Logger
+
+log = Logger("player")
+
+MPRIS_PREFIX = "org.mpris.MediaPlayer2."
+MPRIS_PATH = "/org/mpris/MediaPlayer2"
+MPRIS_PLAYER_IFACE = "org.mpris.MediaPlayer2.Player"
+
+# Time in sec to wait for a player to tell its position.
+TRACK_TIMEOUT = 0.25
+
+
+class Track(NamedTuple):
+    """The track a player is playing, as read by :py:meth:`track`."""
+
+    position: float  # sec
+    length: float  # sec, or 0 if unknown (e.g. a stream)
+    player: str = None  # the MPRIS bus name of the player
+    id: str = None  # the MPRIS track id
+
+
+class PlayerctlPlayer:
+    """Spawns a ``playerctl`` process for every action."""
+
+    def _run(self, *cmd, all_players: bool = True):
+        cmd = (
+            ["playerctl", "--all-players", *cmd] if all_players else ["playerctl", *cmd]
+        )
+        log.cmd_info(cmd)
+        # only imported by the fallback, since it's slow to import.
+        import subprocess
+
+        return subprocess.Popen(cmd)
+
+    def play_pause(self):
+        self._run("play-pause")
+
+    def next(self):
+        self._run("next")
+
+    def previous(self):
+        self._run("previous")
+
+    def seek(self, offset: float):
+        """Seek by ``offset`` seconds, relative to the current position."""
+        if offset >= 0:
+            self._run("position", f"{offset:.2f}+")
+        else:
+            self._run("position", f"{-offset:.2f}-")
+
+    def track(self) -> Optional[Track]:
+        """The track of the first player, or ``None`` if it can't tell its position."""
+        import subprocess
+
+        cmd = ["playerctl", "metadata", "--format", "{{position}} {{mpris:length}}"]
+        log.cmd_debug(cmd)
+        try:
+            out = subprocess.run(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+                check=True,
+                encoding="utf-8",
+                timeout=TRACK_TIMEOUT * 4,
+            ).stdout.split()
+            position = int(out[0]) / 1e6
+            length = int(out[1]) / 1e6 if len(out) > 1 else 0.0
+        except (OSError, subprocess.SubprocessError, IndexError, ValueError):
+            return None
+        return Track(position, length)
+
+    def set_position(self, track: Track, position: float):
+        """Set the position of the first player, in sec."""
+        # not to --all-players, but the one :py:meth:`track` read.
+        self._run("position", f"{position:.2f}", all_players=False)
+
+    def close(self):
+        pass
+
+
+class MprisPlayer:
+    """
+    Talks to every MPRIS player on the session bus, over a single D-Bus connection.
+
+    The list of players is fetched once, and then kept up-to-date
+    by a background thread that listens for ``NameOwnerChanged``.
+
+    Actions are sent as fire-and-forget method calls,
+    so they never block on a slow player.
+    :py:meth:`track` waits for replies on a connection of its own,
+    so that it can run in another thread (e.g. off the event loop) than the actions.
+    """
+
+    def __init__(self):
+        from jeepney import DBusAddress, MatchRule, message_bus
+        from jeepney.io.blocking import Proxy, open_dbus_connection
+
+        self._DBusAddress = DBusAddress
+
+        self._conn = open_dbus_connection(bus="SESSION")
+        self._lock = threading.Lock()
+        # blocking connections can't be shared between threads.
+        self._track_conn = open_dbus_connection(bus="SESSION")
+        self._track_lock = threading.Lock()
+
+        names = Proxy(message_bus, self._conn).ListNames()[0]
+        self._players = {
+            name: self._address(name) for name in names if name.startswith(MPRIS_PREFIX)
+        }
+        log.debug("MPRIS players:", list(self._players))
+
+        self._watch_conn = open_dbus_connection(bus="SESSION")
+        self._watch_rule = MatchRule(
+            type="signal",
+            sender=message_bus.bus_name,
+            interface=message_bus.interface,
+            member="NameOwnerChanged",
+            path=message_bus.object_path,
+        )
+        self._watch_rule.add_arg_condition(0, MPRIS_PREFIX[:-1], kind="namespace")
+        Proxy(message_bus, self._watch_conn).AddMatch(self._watch_rule)
+
+        threading.Thread(target=self._watch_players, daemon=True).start()
+
+    def _address(self, name):
+        return self._DBusAddress(
+            MPRIS_PATH, bus_name=name, interface=MPRIS_PLAYER_IFACE
+        )
+
+    def _watch_players(self):
+        with self._watch_conn.filter(self._watch_rule) as queue:
+            while True:
+                try:
+                    msg = self._watch_conn.recv_until_filtered(queue)
+                except OSError:
+                    return  # connection closed.
+
+                name, _, new_owner = msg.body
+                with self._lock:
+                    if new_owner:
+                        self._players[name] = self._address(name)
+                        log.debug("MPRIS player appeared:", name)
+                    else:
+                        self._players.pop(name, None)
+                        log.debug("MPRIS player vanished:", name)
+
+    def _send(self, address, method, signature=None, body=()):
+        from jeepney import new_method_call
+        from jeepney.low_level import MessageFlag
+
+        msg = new_method_call(address, method, signature, body)
+        msg.header.flags |= MessageFlag.no_reply_expected
+        self._conn.send(msg)
+
+    def _call(self, method, signature=None, body=()):
+        with self._lock:
+            addresses = list(self._players.values())
+
+        for address in addresses:
+            self._send(address, method, signature, body)
+
+    def play_pause(self):
+        self._call("PlayPause")
+
+    def next(self):
+        self._call("Next")
+
+    def previous(self):
+        self._call("Previous")
+
+    def seek(self, offset: float):
+        """Seek by ``offset`` seconds, relative to the current position."""
+        self._call("Seek", "x", (int(offset * 1e6),))
+
+    def track(self) -> Optional[Track]:
+        """
+        The track of the player that's playing (or else of any player),
+        or ``None`` if none can seek.
+
+        Unlike the actions, this waits for the players to reply.
+        """
+        from jeepney import DBusErrorResponse, Properties
+        from jeepney.io.blocking import Proxy
+
+        with self._lock:
+            players = list(self._players.items())
+
+        found = None
+        for name, address in players:
+            try:
+                with self._track_lock:
+                    props = Proxy(
+                        Properties(address), self._track_conn, timeout=TRACK_TIMEOUT
+                    ).get_all()[0]
+            except (OSError, TimeoutError, DBusErrorResponse) as e:
+                log.debug(f"Couldn't get the position of {name}:", repr(e))
+                continue
+
+            # properties & metadata values are (signature, value) pairs.
+            metadata = props.get("Metadata", ("a{sv}", {}))[1]
+            if (
+                not props.get("CanSeek", ("b", False))[1]
+                or "Position" not in props
+                or "mpris:trackid" not in metadata
+            ):
+                continue
+            track = Track(
+                props["Position"][1] / 1e6,
+                metadata.get("mpris:length", ("x", 0))[1] / 1e6,
+                name,
+                metadata["mpris:trackid"][1],
+            )
+
+            if props.get("PlaybackStatus", ("s", None))[1] == "Playing":
+                return track
+            if found is None:
+                found = track
+        return found
+
+    def set_position(self, track: Track, position: float):
+        """Set the position of the player of ``track``, in sec."""
+        self._send(
+            self._address(track.player),
+            "SetPosition",
+            "ox",
+            (track.id, int(position * 1e6)),
+        )
+
+    def close(self):
+        self._conn.close()
+        self._track_conn.close()
+        self._watch_conn.close()
+
+
+def get_player(backend: str = None):
+    """
+    Create a player for the given backend (defaults to ``settings.Player.backend``).
+
+    Falls back to "playerctl" if the "mpris" backend can't reach the session bus.
+    """
+
+    if backend is None:
+        backend = settings.Player.backend
+
+    if backend == "mpris":
+        try:
+            return MprisPlayer()
+        except (ImportError, OSError, KeyError) as e:
+            log.err(f"Couldn't connect to D-Bus ({e!r}), falling back to playerctl.")
+            return PlayerctlPlayer()
+    elif backend == "playerctl":
+        return PlayerctlPlayer()
+    else:
+        raise ValueError(
+            f'"backend" must be one of "mpris" or "playerctl", not {repr(backend)}'
+        )
@@ -0,0 +1,160 @@
+"""
+The hot state of the remotes, shared between the processes of the zproc engine.
+
+The network process writes the dials & buttons straight into a block of shared memory,
+with a fixed layout, and the handlers read them from there.
+Nothing is pickled, or goes through the zproc state server, on the way.
+
+The block is a seqlock: a sequence number, odd while a write is in progress,
+so that readers retry rather than see a half-written value.
+There must only ever be a single writer.
+
+Every field also counts its changes (its version), so that a handler can wait for
+the next one, and tell how many it missed while busy.
+
+The writer wakes up the waiters of a field with a byte written to a pipe of its own,
+without blocking: it never waits on the handlers, even if one of them died mid-wait.
+(a full pipe means a wakeup is pending already, so the byte isn't needed)
+"""
+
+import os
+import select
+import struct
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Iterable, NamedTuple, Optional
+
+# The sequence number, odd while a write is in progress.
+SEQ_FMT = "<Q"
+SEQ_SIZE = struct.calcsize(SEQ_FMT)
+# value, version, t_recv.
+FIELD_FMT = "<qQd"
+FIELD_SIZE = struct.calcsize(FIELD_FMT)
+
+# Waiters check their field at least this often (in sec), whether woken up or not.
+# A field is meant to be waited on by a single process, this keeps more than that
+# (which can drain each other's wakeups) from waiting forever.
+POLL_INTERVAL = 1.0
+
+
+class Field(NamedTuple):
+    value: int
+    version: int  # the number of times it changed.
+    t_recv: float  # when the frame that changed it was received.
+
+
+class SharedState:
+    """
+    A block of shared memory, holding an int of each key.
+
+    Create it before forking the processes that use it,
+    so that they inherit the memory, and the pipes that wake them up.
+
+    :param keys: The keys of the fields.
+    """
+
+    def __init__(self, keys: Iterable[str]):
+        self.keys = tuple(keys)
+        self._offsets = {
+            key: SEQ_SIZE + i * FIELD_SIZE for i, key in enumerate(self.keys)
+        }
+
+        self.shm = SharedMemory(
+            create=True, size=SEQ_SIZE + len(self.keys) * FIELD_SIZE
+        )
+        self.shm.buf[:] = bytes(self.shm.size)
+        # key -> (read fd, write fd), both non-blocking.
+        self._pipes = {}
+        for key in self.keys:
+            fds = self._pipes[key] = os.pipe()
+            for fd in fds:
+                os.set_blocking(fd, False)
+
+        # the writer's own copy of the fields, to skip reading them back.
+        self._written = {}
+        self._seq = 0
+
+    def __repr__(self):
+        return f"<SharedState {self.shm.name} {dict(self.read())}>"
+
+    def set(self, key: str, value: int, t_recv: float):
+        """
+        Set a field, and wake up the processes waiting on it.
+
+        A value that's the same as the current one isn't a change, and is skipped.
+        """
+        value = int(value)
+        old = self._written.get(key)
+        if old is not None and old.value == value:
+            return
+        field = self._written[key] = Field(
+            value, 1 if old is None else old.version + 1, t_recv
+        )
+
+        buf = self.shm.buf
+        self._seq += 1
+        struct.pack_into(SEQ_FMT, buf, 0, self._seq)
+        struct.pack_into(FIELD_FMT, buf, self._offsets[key], *field)
+        self._seq += 1
+        struct.pack_into(SEQ_FMT, buf, 0, self._seq)
+
+        try:
+            os.write(self._pipes[key][1], b"\0")
+        except BlockingIOError:
+            pass  # full, with wakeups no one has read yet.
+
+    def __getitem__(self, key: str) -> Field:
+        offset = self._offsets[key]
+        buf = self.shm.buf
+        while True:
+            seq = struct.unpack_from(SEQ_FMT, buf, 0)[0]
+            if seq & 1:
+                continue  # being written.
+            field = struct.unpack_from(FIELD_FMT, buf, offset)
+            if struct.unpack_from(SEQ_FMT, buf, 0)[0] == seq:
+                return Field(*field)
+
+    def read(self):
+        """Yields the ``(key, field)`` of every field."""
+        for key in self.keys:
+            yield key, self[key]
+
+    def wait(self, key: str, version: int, timeout: float = None) -> Optional[Field]:
+        """
+        Wait for a field to change from ``version``, and return it.
+        (right away, if it has already)
+
+        Returns ``None`` if it didn't change within ``timeout`` sec.
+        """
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        fd = self._pipes[key][0]
+
+        while True:
+            field = self[key]
+            if field.version != version:
+                return field
+
+            if timeout is None:
+                remaining = POLL_INTERVAL
+            else:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+            if select.select([fd], [], [], min(remaining, POLL_INTERVAL))[0]:
+                # the wakeups are used up by the check above, on the next round.
+                try:
+                    os.read(fd, 4096)
+                except BlockingIOError:
+                    pass  # drained by another waiter.
+
+    def close(self):
+        """Release the block. (the process that created it should :py:meth:`unlink` it)"""
+        self.shm.close()
+        for fds in self._pipes.values():
+            for fd in fds:
+                os.close(fd)
+        self._pipes = {}
+
+    def unlink(self):
+        self.shm.unlink()
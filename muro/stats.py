@@ -0,0 +1,190 @@
+"""
+Latency histograms & counters of the running daemon.
+
+Every process of the daemon keeps its own :py:class:`Stats`,
+and serves it over a unix socket in :py:data:`STATS_DIR`.
+
+``muro stats`` queries all of them, and merges the results.
+"""
+
+import atexit
+import json
+import math
+import os
+import socket
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from muro.util import Logger
+
+log = Logger("stats")
+
+STATS_DIR = (
+    Path(os.environ.get("XDG_RUNTIME_DIR") or f"/tmp/muro-{os.getuid()}") / "muro"
+)
+
+# Buckets are spaced 4 per octave, starting at 1 µs.
+# The last one catches everything above ~1 sec.
+BUCKETS_PER_OCTAVE = 4
+BUCKET_COUNT = 20 * BUCKETS_PER_OCTAVE + 1
+
+
+def bucket_upper_bound(index: int) -> float:
+    """Upper bound of a bucket, in sec."""
+    return 2 ** ((index + 1) / BUCKETS_PER_OCTAVE) / 1e6
+
+
+class Histogram:
+    """A fixed-size, log-scaled latency histogram."""
+
+    def __init__(self, counts: List[int] = None):
+        if counts is None:
+            counts = [0] * BUCKET_COUNT
+        self.counts = counts
+
+    def record(self, seconds: float):
+        micros = seconds * 1e6
+        if micros <= 1:
+            index = 0
+        else:
+            index = min(int(math.log2(micros) * BUCKETS_PER_OCTAVE), BUCKET_COUNT - 1)
+        self.counts[index] += 1
+
+    def merge(self, other: "Histogram"):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, p: float) -> float:
+        """Upper bound of the bucket holding the ``p``-th percentile, in sec."""
+        target = self.total * p / 100
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return bucket_upper_bound(i)
+        return math.nan
+
+
+class Stats:
+    def __init__(self):
+        self.started_at = time.time()
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+        self._server_pid = None
+
+    def record(self, name: str, t_start: float):
+        """Record the time elapsed since ``t_start`` (a ``time.monotonic()`` value)."""
+        if t_start is None:
+            return
+        try:
+            histogram = self.histograms[name]
+        except KeyError:
+            histogram = self.histograms[name] = Histogram()
+        histogram.record(time.monotonic() - t_start)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def dump(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "time": time.time(),
+            "counters": dict(self.counters),
+            "histograms": {
+                name: list(histogram.counts)
+                for name, histogram in list(self.histograms.items())
+            },
+        }
+
+    def serve(self):
+        """
+        Start serving these stats over a unix socket, from a background thread.
+
+        Safe to call from every handler; only starts once per process.
+        """
+        if self._server_pid == os.getpid():
+            return
+        self._server_pid = os.getpid()
+
+        # stats inherited over a fork belong to the parent.
+        self.started_at = time.time()
+        self.histograms.clear()
+        self.counters.clear()
+
+        STATS_DIR.mkdir(parents=True, exist_ok=True)
+        path = STATS_DIR / f"stats-{os.getpid()}.sock"
+        if path.exists():
+            path.unlink()
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(str(path))
+        sock.listen(4)
+        atexit.register(_unlink, path)
+
+        threading.Thread(target=self._serve_forever, args=(sock,), daemon=True).start()
+
+    def _serve_forever(self, sock):
+        while True:
+            conn, _ = sock.accept()
+            with conn:
+                try:
+                    conn.sendall(json.dumps(self.dump()).encode())
+                except OSError as e:
+                    log.err(repr(e))
+
+
+def _unlink(path: Path):
+    try:
+        path.unlink()
+    except OSError:
+        pass
+
+
+def query_all(stats_dir: Path = STATS_DIR) -> List[dict]:
+    """Fetch the stats of every running daemon process, removing stale sockets on the way."""
+    dumps = []
+    for path in sorted(stats_dir.glob("stats-*.sock")):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(str(path))
+        except ConnectionRefusedError:
+            _unlink(path)
+            continue
+        except OSError:
+            continue
+
+        with sock:
+            chunks = []
+            while True:
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        dumps.append(json.loads(b"".join(chunks)))
+    return dumps
+
+
+def merge(dumps: List[dict]):
+    """Merge the stats of several processes into ``(counters, histograms)``."""
+    counters: Dict[str, int] = {}
+    histograms: Dict[str, Histogram] = {}
+
+    for dump in dumps:
+        for name, value in dump["counters"].items():
+            counters[name] = counters.get(name, 0) + value
+        for name, counts in dump["histograms"].items():
+            histograms.setdefault(name, Histogram()).merge(Histogram(counts))
+
+    return counters, histograms
+
+
+# The stats of the current process.
+stats = Stats()
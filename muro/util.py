@@ -1,3 +1,7 @@
+import os
+import threading
+from time import sleep
+
 import crayons
 
 
@@ -49,3 +53,104 @@ class Logger:
             self._log([*args, ": $", *cmd], "INFO")
         else:
             self._log(["$", *cmd], "INFO")
+
+
+def rss_kib(pid="self") -> int:
+    """Resident set size of a process, in KiB."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def tree_pids(pid: int = None) -> list:
+    """The pids of a process, and all of its descendants."""
+    if pid is None:
+        pid = os.getpid()
+
+    children = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces, so split after its closing paren.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    pids, queue = [], [pid]
+    while queue:
+        pid = queue.pop()
+        pids.append(pid)
+        queue.extend(children.get(pid, ()))
+    return pids
+
+
+_EMPTY = object()
+
+
+class Coalescer:
+    """
+    Applies values to ``fn`` on a background thread, dropping stale ones.
+
+    It's a mailbox with a single slot, where the latest value wins:
+    :py:meth:`put` never waits, it replaces the value that's waiting (if any),
+    and only once ``fn`` is done with one value is the newest one taken.
+    So a slow ``fn`` lags behind by one value at most, rather than a growing backlog.
+    Values are applied at most once every ``interval`` seconds.
+
+    The values applied & dropped are counted in :py:attr:`applied` & :py:attr:`dropped`,
+    and if it has a ``name``, in the stats as "<name> applied" & "<name> dropped".
+    """
+
+    def __init__(self, fn, interval: float = 0.0, *, name: str = None):
+        # muro.stats imports this module.
+        from muro.stats import stats
+
+        self.fn = fn
+        self.interval = interval
+        self.name = name
+
+        self.applied = 0
+        self.dropped = 0
+        self._stats = stats
+
+        self._cond = threading.Condition()
+        self._value = _EMPTY
+
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def put(self, value):
+        with self._cond:
+            if self._value is not _EMPTY:
+                if self.name is not None:
+                    self._stats.count(f"{self.name} dropped")
+                self.dropped += 1
+            self._value = value
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._value is _EMPTY:
+                    self._cond.wait()
+                value, self._value = self._value, _EMPTY
+
+            try:
+                self.fn(value)
+            except Exception as e:
+                Logger(self._thread.name).err(repr(e))
+            else:
+                if self.name is not None:
+                    self._stats.count(f"{self.name} applied")
+                self.applied += 1
+
+            if self.interval:
+                sleep(self.interval)
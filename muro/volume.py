@@ -0,0 +1,141 @@
+"""
+PulseAudio volume control.
+
+Instead of listing the sink inputs on every change,
+a cache is kept up-to-date from PulseAudio's subscribe events.
+"""
+
+import threading
+from typing import Union
+
+import pulsectl
+
+from muro.common import settings
+from muro.stats import stats
+from muro.util import Coalescer, Logger
+
+log = Logger("volume")
+
+
+class VolumeUpdater:
+    """
+    Applies volume changes on a background thread.
+
+    Only the newest value is applied, at most ``settings.Volume.max_rate`` times a second,
+    in one batch over all the cached sink inputs.
+
+    :param target: (Optional) "sink-inputs" sets the volume of every playing stream,
+        "default-sink" sets the master volume of the default sink, in a single call.
+        Defaults to ``settings.Volume.target``.
+    """
+
+    def __init__(self, target: str = None):
+        if target is None:
+            target = settings.Volume.target
+        if target not in ("sink-inputs", "default-sink"):
+            raise ValueError(
+                f'"target" must be one of "sink-inputs" or "default-sink", not {repr(target)}'
+            )
+        self.target = target
+
+        self._lock = threading.Lock()
+        self._sink_inputs = {}  # index -> channel count
+        self._default_sink = None  # (index, channel count)
+
+        self._events_pulse = pulsectl.Pulse("muro-volume-events")
+        self._refresh_all()
+
+        self._pulse = pulsectl.Pulse("muro-volume")
+        self._coalescer = Coalescer(
+            self._apply, 1 / settings.Volume.max_rate, name="volume"
+        )
+        threading.Thread(target=self._watch_events, daemon=True).start()
+
+    def _refresh_all(self):
+        pulse = self._events_pulse
+
+        sink_inputs = {
+            info.index: len(info.volume.values) for info in pulse.sink_input_list()
+        }
+        try:
+            sink = pulse.get_sink_by_name(pulse.server_info().default_sink_name)
+        except pulsectl.PulseIndexError:
+            default_sink = None
+        else:
+            default_sink = (sink.index, len(sink.volume.values))
+
+        with self._lock:
+            self._sink_inputs = sink_inputs
+            self._default_sink = default_sink
+
+    def _refresh_sink_input(self, index):
+        try:
+            info = self._events_pulse.sink_input_info(index)
+        except pulsectl.PulseIndexError:
+            with self._lock:
+                self._sink_inputs.pop(index, None)
+        else:
+            with self._lock:
+                self._sink_inputs[index] = len(info.volume.values)
+
+    def _watch_events(self):
+        pulse = self._events_pulse
+        facility = pulsectl.PulseEventFacilityEnum
+        event_type = pulsectl.PulseEventTypeEnum
+        events = []
+
+        def on_event(ev):
+            events.append(ev)
+            raise pulsectl.PulseLoopStop
+
+        pulse.event_mask_set("sink_input", "sink", "server")
+        pulse.event_callback_set(on_event)
+
+        while True:
+            # The connection can't be used for anything else while listening,
+            # so the events are collected first, and acted upon afterwards.
+            pulse.event_listen()
+
+            while events:
+                ev = events.pop(0)
+                if ev.facility == facility.sink_input:
+                    if ev.t == event_type.remove:
+                        with self._lock:
+                            self._sink_inputs.pop(ev.index, None)
+                    elif ev.t == event_type.new or ev.index not in self._sink_inputs:
+                        self._refresh_sink_input(ev.index)
+                    # Other "change" events are mostly caused by our own volume sets,
+                    # and the channel count of a stream doesn't change over its lifetime.
+                elif ev.facility == facility.server or ev.t != event_type.change:
+                    # the default sink changed, or a sink got (un)plugged.
+                    self._refresh_all()
+
+    def _apply(self, item):
+        value, t_recv = item
+        volume = value / 100
+
+        with self._lock:
+            if self.target == "default-sink":
+                targets = [self._default_sink] if self._default_sink else []
+            else:
+                targets = list(self._sink_inputs.items())
+
+        for index, channels in targets:
+            volume_info = pulsectl.PulseVolumeInfo(volume, channels)
+            try:
+                if self.target == "default-sink":
+                    self._pulse.sink_volume_set(index, volume_info)
+                else:
+                    self._pulse.sink_input_volume_set(index, volume_info)
+            except pulsectl.PulseOperationFailed as e:
+                print(e)
+
+        stats.record("volume.done", t_recv)
+        log.info(f"Set volume: {value}%")
+
+    def set(self, value: Union[float, int], t_recv: float = None):
+        """
+        :param t_recv: (Optional) When the frame carrying this value was received,
+            for latency stats.
+        """
+        self._coalescer.put((value, t_recv))
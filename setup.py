@@ -17,18 +17,18 @@ DESCRIPTION = "Generic & resilient network stack for MicroPython."
 URL = "https://github.com/pycampers/muro"
 EMAIL = "devxpy@gmail.com"
 AUTHOR = "devxpy"
-REQUIRES_PYTHON = ">=3.6.0"
+REQUIRES_PYTHON = ">=3.8.0"
 VERSION = "0.0.1"
 
 # What packages are required for this module to be executed?
 REQUIRED = [
     "click",
     "pulsectl",
+    "jeepney",
     "zproc",
     "jinja2",
     "mpy-cross",
-    "adafruit-ampy",
-    "numpy",
+    "pyserial",
 ]
 
 # The rest you shouldn't have to touch too much :)
@@ -113,7 +113,7 @@ setup(
         "License :: OSI Approved :: MIT License",
         "Programming Language :: Python",
         "Programming Language :: Python :: 3",
-        "Programming Language :: Python :: 3.5",
+        "Programming Language :: Python :: 3.8",
         "Programming Language :: Python :: Implementation :: CPython",
         "Programming Language :: Python :: Implementation :: PyPy",
         "Programming Language :: Python :: Implementation :: MicroPython",
@@ -0,0 +1,20 @@
+import sys
+
+import pytest
+
+from muro import fakeboard
+
+
+@pytest.fixture
+def flash(tmp_path, monkeypatch):
+    """
+    A directory standing in for the flash of a board (the current one),
+    with the MicroPython-only modules shimmed, so that the board's code can run.
+    """
+    monkeypatch.chdir(tmp_path)
+    for name, module in fakeboard.make_modules(str(tmp_path)).items():
+        monkeypatch.setitem(sys.modules, name, module)
+    # imported again, with the shims.
+    for name in ("muro.micropython.ota", "muro.micropython.discovery"):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+    return tmp_path
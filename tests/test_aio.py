@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import pytest
+
+from muro import aio
+from muro.common import settings
+from muro.muro import seek_offset
+from muro.player import Track
+
+
+class FakePlayer:
+    """A player of an endless stream, that logs the positions it's set to."""
+
+    def __init__(self):
+        self.positions = []
+        self.skips = []
+
+    def track(self):
+        return Track(position=0.0, length=0)
+
+    def set_position(self, track, position):
+        self.positions.append(position)
+
+    def next(self):
+        self.skips.append("next")
+
+    def previous(self):
+        self.skips.append("previous")
+
+
+class SlowPlayer(FakePlayer):
+    """A player that takes its time to tell the track, as over D-Bus."""
+
+    def track(self):
+        time.sleep(0.2)
+        return super().track()
+
+
+class Dummy:
+    def set(self, value, t_recv=None):
+        pass
+
+
+@pytest.fixture
+def daemon(monkeypatch):
+    monkeypatch.setattr(settings.Buttons, "seek_timeout", 0.02)
+    monkeypatch.setattr(settings.Seek, "tick_rate", 100)
+    monkeypatch.setattr(settings.Seek, "max_hold", 0.2)
+    return aio.Daemon(player=FakePlayer(), volume=Dummy(), brightness=Dummy())
+
+
+def seeks():
+    """The tasks of the buttons held."""
+    return [
+        task for task in asyncio.all_tasks() if task.get_coro().__name__ == "seek_btn"
+    ]
+
+
+def test_held_button_stops_seeking_after_max_hold(daemon):
+    async def run():
+        daemon.dispatch("next", 1, address=("10.0.0.1", 1))
+        await asyncio.wait_for(asyncio.gather(*seeks()), 1)
+
+    asyncio.run(run())
+
+    # the release never came, but the seek stopped at the cap.
+    assert daemon._released == {}
+    positions = daemon.player.positions
+    assert positions and positions == sorted(positions)
+    assert positions[-1] <= seek_offset(settings.Seek.max_hold) + 1e-9
+
+
+def test_press_while_held_ends_the_last_seek(daemon):
+    async def run():
+        address = ("10.0.0.1", 1)
+        daemon.dispatch("next", 1, address=address)
+        await asyncio.sleep(0.05)
+        first = seeks()
+
+        # the release got lost, and here's the next press.
+        daemon.dispatch("next", 1, address=address)
+        await asyncio.wait_for(asyncio.gather(*first), 0.1)
+
+        daemon.dispatch("next", 0, address=address)
+        await asyncio.wait_for(asyncio.gather(*seeks()), 0.1)
+
+    asyncio.run(run())
+    assert daemon._released == {}
+
+
+def test_forgotten_remote_releases_its_buttons(daemon):
+    async def run():
+        daemon.dispatch("previous", 1, address=("10.0.0.1", 1))
+        daemon.dispatch("next", 1, address=("10.0.0.2", 1))
+        await asyncio.sleep(0.05)
+        held = seeks()
+
+        daemon.forget(("10.0.0.1", 1))
+        assert list(daemon._released) == [(("10.0.0.2", 1), "next")]
+        daemon.dispatch("next", 0, address=("10.0.0.2", 1))
+        await asyncio.wait_for(asyncio.gather(*held), 0.1)
+
+    asyncio.run(run())
+    assert daemon._released == {}
+
+
+def test_reading_the_track_doesnt_block_the_loop(daemon, monkeypatch):
+    monkeypatch.setattr(settings.Seek, "max_hold", 1)
+    daemon.player = SlowPlayer()
+
+    async def run():
+        daemon.dispatch("next", 1, address=("10.0.0.1", 1))
+        # the other frames keep being handled, while the seek starts.
+        gaps, last = [], time.monotonic()
+        for _ in range(30):
+            await asyncio.sleep(0.01)
+            now = time.monotonic()
+            gaps.append(now - last)
+            last = now
+        daemon.dispatch("next", 0, address=("10.0.0.1", 1))
+        await asyncio.wait_for(asyncio.gather(*seeks()), 1)
+        return max(gaps)
+
+    assert asyncio.run(run()) < 0.1
+    # it seeked from when it was held, not from when the track was read.
+    assert daemon.player.positions[-1] >= seek_offset(0.25)
@@ -0,0 +1,37 @@
+import random
+
+import pytest
+
+from muro import bench
+from muro.bench import FULL_SCALE
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_filter_quiets_a_parked_dial(seed):
+    trace = bench.noise_traces(seed=seed)["parked"]
+    unfiltered = bench.count_frames(trace)
+    filtered = bench.count_frames(trace, bench.make_dial_filter())
+
+    assert filtered * 4 <= unfiltered
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize(
+    "start, stop", [(0.3, 1.0), (0.7, 0.0), (0.2, 0.6), (0.8, 0.4)]
+)
+def test_filter_reaches_the_final_value(seed, start, stop):
+    # turned for 5 sec, then left alone for 5 sec, at 32 readings a sec.
+    turn = [FULL_SCALE * (start + (stop - start) * i / 160) for i in range(161)]
+    values = turn + [FULL_SCALE * stop] * 160
+    noise_free = bench.dial_frames([int(value) for value in values])
+
+    readings = bench.add_noise(values, random.Random(seed))
+    readings = [min(max(reading, 0), FULL_SCALE) for reading in readings]
+    filtered = bench.dial_frames(readings, bench.make_dial_filter())
+
+    assert filtered[-1] == noise_free[-1]
+    # after the first (wherever the dial was), every frame is a step towards it,
+    # none is noise.
+    steps = filtered[1:]
+    assert steps == sorted(steps, reverse=stop < start)
+    assert len(set(steps)) == len(steps)
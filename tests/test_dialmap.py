@@ -0,0 +1,20 @@
+import pytest
+
+from muro import bench
+from muro.common import settings
+from muro.micropython.dialmap import DialMap
+
+
+def test_dial_map_matches_the_reference_mapping():
+    # raises on the first dial point mapped differently.
+    assert bench.check_dial_maps() > 0
+
+
+@pytest.mark.parametrize("name", ["volume_range", "brightness_range"])
+def test_dial_map_takes_less_memory_than_the_reference(name):
+    output_items = getattr(settings.Dials, name)
+    deadzone = settings.Dials.deadzone
+
+    reference = bench.allocated(lambda: bench.reference_mapping(output_items, deadzone))
+    tables = bench.allocated(lambda: DialMap(output_items, deadzone))
+    assert 0 < tables < reference
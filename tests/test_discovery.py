@@ -0,0 +1,25 @@
+import importlib
+
+
+class FakePeer:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, data, host=None):
+        self.sent.append((data, host))
+
+
+def test_first_host_to_ack_wins_the_round(flash):
+    discovery = importlib.import_module("muro.micropython.discovery")
+    finder = discovery.Discovery(FakePeer())
+    finder.poll()
+    assert finder.peer.sent[-1][1] is None
+
+    # both hosts ack the broadcast hello.
+    finder.on_ack(finder._seq, ("10.0.0.1", 4000))
+    (flash / discovery.HOST_FILE).write_text("written once")
+    finder.on_ack(finder._seq, ("10.0.0.2", 4000))
+
+    assert finder.host == "10.0.0.1"
+    assert not finder.awaiting_ack
+    assert (flash / discovery.HOST_FILE).read_text() == "written once"
@@ -0,0 +1,56 @@
+import socket
+
+import pytest
+
+from muro import flightlog
+from muro.common import unetwork
+
+
+@pytest.fixture
+def daemon():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.settimeout(1)
+    yield sock
+    sock.close()
+
+
+def test_replay_keeps_remotes_apart(tmp_path, daemon):
+    path = tmp_path / "flight.log"
+    remotes = [("192.168.1.20", 4001), ("192.168.1.21", 4001)]
+    recorder = flightlog.FlightRecorder(path)
+    for i in range(6):
+        recorder.append(bytes((i,)), remotes[i % 2], t_recv=i)
+    recorder.close()
+
+    assert [address for _, address, _ in flightlog.read_log(path)] == remotes * 3
+
+    count = flightlog.replay(path, None, port=daemon.getsockname()[1])
+    assert count == 6
+
+    namespace = unetwork.DEFAULT_NAMESPACE.encode("utf-8")
+    received = {}
+    for _ in range(count):
+        data, address = daemon.recvfrom(1024)
+        assert data.startswith(namespace)
+        received.setdefault(address, []).append(data[len(namespace) :])
+
+    # a socket of its own for every remote, with its frames in order.
+    assert sorted(received.values()) == [
+        [b"\x00", b"\x02", b"\x04"],
+        [b"\x01", b"\x03", b"\x05"],
+    ]
+
+
+def test_ring_buffer_wraps(tmp_path):
+    path = tmp_path / "flight.log"
+    recorder = flightlog.FlightRecorder(
+        path, flightlog.HEADER_SIZE + 3 * flightlog.SLOT_SIZE
+    )
+    for i in range(5):
+        recorder.append(bytes((i,)), ("10.0.0.1", 1234), t_recv=i)
+    recorder.close()
+
+    assert list(flightlog.read_log(path)) == [
+        (i, ("10.0.0.1", 1234), bytes((i,))) for i in (2, 3, 4)
+    ]
@@ -0,0 +1,83 @@
+import threading
+
+import pytest
+
+from muro import cli, fakeboard
+
+
+@pytest.fixture
+def board(flash):
+    board = fakeboard.FakeBoard()
+    threading.Thread(target=board.serve_forever, daemon=True).start()
+    return board
+
+
+@pytest.fixture
+def project_files(tmp_path_factory, monkeypatch):
+    monkeypatch.setattr(cli, "CACHE_DIR", tmp_path_factory.mktemp("mpy"))
+    return cli.compile_project(cli.find_project_files())
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_install_sends_only_what_changed(board, flash, project_files, compress):
+    mpy_code = cli.create_mpy_code(project_files)
+
+    def install():
+        return cli.install_board(
+            board.port, project_files, mpy_code, False, compress, log=lambda msg: None
+        )
+
+    assert install() == len(project_files)
+    assert board.resets == 1
+    for file in project_files:
+        assert (flash / file.path_on_board).read_bytes() == (
+            file.path_compiled.read_bytes()
+        )
+    # every temp file was moved in place.
+    assert not [path for path in flash.rglob("*") if path.suffix in (".tmp", ".z")]
+
+    assert install() == 0
+    assert board.resets == 2
+
+    # a file that changed on the board is sent again.
+    changed = project_files[0]
+    (flash / changed.path_on_board).write_bytes(b"corrupt")
+    assert install() == 1
+    assert (flash / changed.path_on_board).read_bytes() == (
+        changed.path_compiled.read_bytes()
+    )
+
+
+def test_failed_inflate_leaves_the_installed_file(
+    board, flash, project_files, monkeypatch
+):
+    mpy_code = cli.create_mpy_code(project_files)
+
+    def install():
+        return cli.install_board(
+            board.port, project_files, mpy_code, False, True, log=lambda msg: None
+        )
+
+    install()
+    changed = max(project_files, key=lambda file: file.size)
+    (flash / changed.path_on_board).write_bytes(b"old")
+
+    # the board runs out of flash halfway through inflating it.
+    read = fakeboard.DecompIO.read
+
+    def failing_read(self, size=-1):
+        if getattr(self, "_failed", False):
+            raise OSError(28, "ENOSPC")
+        self._failed = True
+        return read(self, size)
+
+    monkeypatch.setattr(fakeboard.DecompIO, "read", failing_read)
+    with pytest.raises(cli.BoardError):
+        install()
+    assert (flash / changed.path_on_board).read_bytes() == b"old"
+
+    monkeypatch.setattr(fakeboard.DecompIO, "read", read)
+    assert install() == 1
+    assert (flash / changed.path_on_board).read_bytes() == (
+        changed.path_compiled.read_bytes()
+    )
@@ -0,0 +1,53 @@
+from muro.muro import HeldButtons
+from muro.sharedstate import SharedState
+
+A, B = ("10.0.0.1", 1), ("10.0.0.2", 1)
+
+
+def merge(edges):
+    """The values of the merged "next" button, for ``(address, value)`` edges."""
+    held = HeldButtons()
+    values = []
+    for address, value in edges:
+        values += held.update(address, "next", value)
+    return values
+
+
+def test_one_remote_passes_through():
+    assert merge([(A, 1), (A, 0), (A, 1), (A, 0)]) == [1, 0, 1, 0]
+
+
+def test_latest_press_takes_over():
+    # B's press ends A's hold, and A's release doesn't end B's.
+    assert merge([(A, 1), (B, 1), (A, 0)]) == [1, 0, 1]
+    assert merge([(A, 1), (B, 1), (A, 0), (B, 0)]) == [1, 0, 1, 0]
+
+
+def test_press_after_lost_release_ends_the_last_hold():
+    assert merge([(A, 1), (A, 1), (A, 0)]) == [1, 0, 1, 0]
+
+
+def test_forgotten_remote_releases_its_buttons():
+    held = HeldButtons()
+    held.update(A, "next", 1)
+    held.update(B, "previous", 1)
+    assert held.forget(A) == ["next"]
+    assert held.forget(A) == []
+    assert held.update(A, "next", 0) == []
+
+
+def test_merged_presses_and_releases_alternate():
+    # as the seek handler counts taps by them. (every change is a new version)
+    shared = SharedState(["next"])
+    try:
+        held = HeldButtons()
+        edges = [(A, 1), (B, 1), (A, 0), (A, 1), (B, 0), (A, 0), (B, 0)]
+        for address, value in edges:
+            for merged in held.update(address, "next", value):
+                version = shared["next"].version
+                shared.set("next", merged, 0.0)
+                assert shared["next"].version == version + 1
+        assert shared["next"].value == 0
+    finally:
+        shared.close()
+        shared.unlink()
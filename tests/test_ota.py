@@ -0,0 +1,58 @@
+import hashlib
+
+import pytest
+
+from muro.common import protocol
+
+
+class FakePeer:
+    def __init__(self):
+        self.replies = []
+
+    def reply(self, msg, address):
+        self.replies.append(msg[protocol.HEADER_SIZE])
+
+
+def request(receiver, kind, body=b""):
+    msg = protocol.pack_header(protocol.VERSION, kind, 0, 0) + body
+    receiver._handle(msg, ("127.0.0.1", 1))
+    return receiver.peer.replies.pop()
+
+
+@pytest.fixture
+def receiver(flash):
+    from muro.micropython import ota
+
+    return ota.Receiver(FakePeer())
+
+
+@pytest.mark.parametrize(
+    "path",
+    [
+        "../main.py",
+        "muro/../../main.py",
+        "/main.py",
+        "muro//main.py",
+        "./main.py",
+        "muro/main.py ../main.py",
+        "main\n.py",
+        "",
+        "muro_ota/main.py",
+        "muro_ota_journal",
+    ],
+)
+def test_deploy_refuses_paths_outside_the_project(receiver, flash, path):
+    body = protocol.pack_deploy_file_body(1, hashlib.sha1(b"x").digest())
+    status = request(receiver, protocol.KIND_DEPLOY_FILE, body + path.encode())
+
+    assert status == protocol.DEPLOY_FAILED
+    assert not (flash / "muro_ota").exists()
+
+
+def test_deploy_stages_paths_in_the_project(receiver, flash):
+    body = protocol.pack_deploy_file_body(1, hashlib.sha1(b"x").digest())
+    status = request(receiver, protocol.KIND_DEPLOY_FILE, body + b"muro/main.py")
+
+    receiver._close()
+    assert status == protocol.DEPLOY_OK
+    assert (flash / "muro_ota" / "muro" / "main.py").exists()
@@ -0,0 +1,34 @@
+import random
+
+from muro.common import protocol
+
+
+def accept_all(tracker, seqs):
+    return [tracker.accept(seq) for seq in seqs]
+
+
+def test_seq_tracker_counts_lost_reordered_and_duplicate_frames():
+    tracker = protocol.SeqTracker()
+    assert accept_all(tracker, [10, 11, 13, 12, 13, 14]) == [
+        True,
+        True,
+        True,
+        False,
+        False,
+        True,
+    ]
+    assert (tracker.received, tracker.lost) == (4, 0)
+    assert (tracker.reordered, tracker.duplicates) == (1, 1)
+
+
+def test_seq_tracker_takes_a_rebooted_board_for_a_new_sequence():
+    # the board starts every boot at a random point, with the same address.
+    rng = random.Random(0)
+    for _ in range(100):
+        tracker = protocol.SeqTracker()
+        start = rng.getrandbits(30)
+        assert all(accept_all(tracker, range(start, start + 300)))
+
+        start = rng.getrandbits(30)
+        assert all(accept_all(tracker, range(start, start + 5)))
+        assert tracker.reordered == 0
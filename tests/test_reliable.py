@@ -0,0 +1,169 @@
+import random
+
+import pytest
+
+from muro.common import protocol, reliable
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(reliable, "ticks_ms", clock)
+    return clock
+
+
+class Link:
+    """
+    Carries the frames of a :py:class:`reliable.Sender` to a :py:class:`reliable.Receiver`,
+    and the acks back, dropping a ``loss`` fraction of both at random.
+
+    :param drop: (Optional) The items whose first transmission is dropped.
+    """
+
+    def __init__(self, clock, loss=0.0, drop=(), seed=0, **sender_kwargs):
+        self.clock = clock
+        self.loss = loss
+        self.drop = set(drop)
+        self.rng = random.Random(seed)
+
+        self.sender = reliable.Sender(self._in_transit_append, **sender_kwargs)
+        self.receiver = reliable.Receiver()
+        self.up = True
+        # items that never get through.
+        self.blocked = set()
+        self.delivered = []
+        self._in_transit = []
+
+    def _in_transit_append(self, frame):
+        self._in_transit.append(bytes(frame))
+
+    def send(self, item):
+        self.sender.send(protocol.KIND_BUTTON_EVENT, bytes((item,)))
+
+    def step(self, ms=5):
+        """Deliver the frames in transit, and poll the sender ``ms`` later."""
+        frames = self._in_transit[:]
+        self._in_transit.clear()
+
+        for frame in frames:
+            item = frame[-1]
+            if item in self.drop:
+                self.drop.discard(item)
+                continue
+            if not self.up or item in self.blocked or self.rng.random() < self.loss:
+                continue
+
+            _, seq, _ = protocol.check_header(frame)
+            ack, items = self.receiver.accept(
+                seq, item, protocol.unpack_reliable(frame)
+            )
+            self.delivered.extend(items)
+            if self.rng.random() >= self.loss:
+                self.sender.on_ack(ack)
+
+        self.clock.now += ms
+        self.sender.poll()
+
+    def settle(self, ms=10_000):
+        for _ in range(ms // 5):
+            self.step()
+            if not self.sender.in_flight and not self._in_transit:
+                return
+
+
+@pytest.mark.parametrize("loss", [0.0, 0.1, 0.3])
+def test_lossy_link_delivers_every_frame_in_order(clock, loss):
+    link = Link(clock, loss)
+    for item in range(200):
+        link.send(item)
+        for _ in range(4):
+            link.step()
+    link.settle()
+
+    assert link.delivered == list(range(200))
+    assert link.sender.in_flight == 0
+    assert link.sender.expired == 0
+    if loss:
+        assert link.sender.retransmits
+
+
+def test_lost_first_frame_is_delivered(clock):
+    # the receiver (e.g. a host that just started) never got the press.
+    link = Link(clock, drop=[0])
+    link.send(0)  # press
+    link.step()
+    link.send(1)  # release
+    link.settle()
+
+    assert link.delivered == [0, 1]
+    assert link.sender.in_flight == 0
+
+
+def test_receiver_restart(clock):
+    link = Link(clock)
+    link.send(0)
+    link.settle()
+
+    # the host restarts, and misses the next frame.
+    link.receiver = reliable.Receiver()
+    link.drop.add(1)
+    link.send(1)
+    link.step()
+    link.send(2)
+    link.settle()
+
+    assert link.delivered == [0, 1, 2]
+
+
+def test_sender_restart(clock):
+    link = Link(clock)
+    link.send(0)
+    link.settle()
+
+    # the board reboots, and starts a new sequence.
+    link.sender = reliable.Sender(link._in_transit_append)
+    link.send(1)
+    link.send(2)
+    link.settle()
+
+    assert link.delivered == [0, 1, 2]
+
+
+def test_frames_expire_while_receiver_is_down(clock):
+    link = Link(clock, lifetime=1000)
+    link.up = False
+    link.send(0)
+    link.send(1)
+    link.settle(2000)
+
+    assert link.sender.in_flight == 0
+    assert link.sender.expired == 2
+
+    link.up = True
+    link.send(2)
+    link.settle()
+    assert link.delivered == [2]
+
+
+def test_expired_frame_is_skipped(clock):
+    link = Link(clock, lifetime=1000)
+    link.send(0)
+    link.settle()
+
+    # the next frame never gets through, but the one after does.
+    link.blocked.add(1)
+    link.send(1)
+    link.step()
+    link.send(2)
+    link.settle()
+
+    assert link.delivered == [0, 2]
+    assert link.sender.expired == 1
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from muro import sharedstate
+from muro.sharedstate import SharedState
+
+
+@pytest.fixture
+def shared():
+    shared = SharedState(("volume", "pause"))
+    yield shared
+    shared.close()
+    shared.unlink()
+
+
+def set_within(shared, timeout, *args):
+    """Call ``shared.set`` in a thread, and return whether it returned in time."""
+    thread = threading.Thread(target=shared.set, args=args, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    return not thread.is_alive()
+
+
+def test_wait_wakes_up_on_a_change(shared):
+    fork = multiprocessing.get_context("fork")
+    queue = fork.SimpleQueue()
+
+    def waiter():
+        field = shared.wait("volume", 0, timeout=5)
+        queue.put((field, time.monotonic()))
+
+    process = fork.Process(target=waiter)
+    process.start()
+    time.sleep(0.1)
+    shared.set("volume", 42, 1.0)
+    set_at = time.monotonic()
+
+    field, woke_at = queue.get()
+    process.join()
+    assert field == sharedstate.Field(42, 1, 1.0)
+    # by the pipe, not the poll interval.
+    assert woke_at - set_at < sharedstate.POLL_INTERVAL / 2
+
+
+def test_wait_times_out(shared):
+    shared.set("volume", 1, 0.0)
+    assert shared.wait("volume", 0) == sharedstate.Field(1, 1, 0.0)
+    assert shared.wait("volume", 1, timeout=0.05) is None
+    # other keys don't wake it up.
+    shared.set("pause", 1, 0.0)
+    assert shared.wait("volume", 1, timeout=0.05) is None
+
+
+def test_writer_doesnt_wait_on_a_killed_waiter(shared):
+    fork = multiprocessing.get_context("fork")
+    process = fork.Process(target=shared.wait, args=("volume", 0))
+    process.start()
+    time.sleep(0.1)
+    os.kill(process.pid, signal.SIGKILL)
+    process.join()
+
+    for value in range(1, 4):
+        assert set_within(shared, 1, "volume", value, 0.0)
+    assert shared["volume"].version == 3
+
+
+def test_writer_doesnt_wait_on_a_busy_waiter(shared):
+    # far more changes than fit in the pipe, and no one reads them.
+    start = time.monotonic()
+    for value in range(100_000):
+        shared.set("volume", value + 1, 0.0)
+    assert time.monotonic() - start < 5
+
+    assert shared.wait("volume", 0).version == 100_000
+    # the pending wakeups don't make a waiter return early.
+    assert shared.wait("volume", 100_000, timeout=0.05) is None
@@ -0,0 +1,53 @@
+import time
+
+from muro.stats import stats
+from muro.util import Coalescer
+
+
+def test_coalescer_keeps_up_with_a_slow_backend():
+    delay, interval = 0.02, 0.01
+    applied = []
+
+    def apply(item):
+        time.sleep(delay)
+        applied.append((item, time.monotonic()))
+
+    count = 500
+    coalescer = Coalescer(apply, interval, name="test-slow")
+    sent_at = {}
+    for value in range(count):
+        sent_at[value] = time.monotonic()
+        coalescer.put((value, sent_at[value]))
+        time.sleep(0.001)
+    deadline = time.monotonic() + 1
+    while coalescer.applied + coalescer.dropped < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+    # the latest value wins, the rest is dropped rather than queued.
+    assert applied[-1][0][0] == count - 1
+    assert len(applied) < count / 4
+    values = [item[0] for item, _ in applied]
+    assert values == sorted(values)
+
+    # the value being applied, the pause, then the latest one (and some slack).
+    latencies = [t - sent_at[item[0]] for item, t in applied]
+    assert max(latencies) < 2 * delay + interval + 0.05
+
+    assert coalescer.applied == len(applied)
+    assert coalescer.applied + coalescer.dropped == count
+    assert stats.counters["test-slow applied"] == coalescer.applied
+    assert stats.counters["test-slow dropped"] == coalescer.dropped
+
+
+def test_coalescer_applies_every_value_of_a_fast_backend():
+    applied = []
+    coalescer = Coalescer(applied.append)
+    for value in range(20):
+        coalescer.put(value)
+        deadline = time.monotonic() + 1
+        while len(applied) <= value and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+    assert applied == list(range(20))
+    assert (coalescer.applied, coalescer.dropped) == (20, 0)